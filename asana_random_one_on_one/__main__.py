@@ -1,4 +1,21 @@
 import asana_random_one_on_one as oneonone
+from asana_random_one_on_one.best_of import DEFAULT_MATCH_BUDGET
+from asana_random_one_on_one.client import (
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_REQUEST_TIMEOUT,
+    DEFAULT_REQUESTS_PER_MINUTE,
+)
+from asana_random_one_on_one.config import (
+    DEFAULT_PROJECT_CONCURRENCY,
+    DEFAULT_WRITE_CONCURRENCY,
+)
+from asana_random_one_on_one.construct_matches import (
+    DEFAULT_HISTORY_WEEKS,
+    GREEDY,
+    STRATEGIES,
+)
+from asana_random_one_on_one.match_stats import PROFILERS
+from asana_random_one_on_one.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 import argparse
 
 if __name__ == "__main__":
@@ -33,6 +50,138 @@ if __name__ == "__main__":
         type=str,
         help="Accumulate errors encountered while running the script and create a task in a given project with a error report",
     )
+    parser.add_argument(
+        "--strategy",
+        choices=STRATEGIES,
+        default=GREEDY,
+        help="Algorithm used to match members. 'blossom' finds the largest possible number of valid matches. 'weighted' prefers members that haven't met for a long time and members of different teams",
+    )
+    parser.add_argument(
+        "--best-of",
+        type=int,
+        default=1,
+        help="Runs this many randomly seeded matchings of every project in parallel processes and keeps the one with the most valid pairs, fewest repeats, "
+        "last week's unmatched member matched and most cross team pairs",
+    )
+    parser.add_argument(
+        "--match-budget",
+        type=float,
+        default=DEFAULT_MATCH_BUDGET,
+        help="Seconds the matchings of --best-of may take, the ones not done by then are dropped",
+    )
+    parser.add_argument(
+        "--history-weeks",
+        type=int,
+        default=DEFAULT_HISTORY_WEEKS,
+        help="Number of previous weeks the weighted strategy avoids matching the same members again",
+    )
+    parser.add_argument(
+        "--history-path",
+        type=str,
+        help="Keep every week's matches in a local SQLite file at this path, instead of only last week's in the weekly task",
+    )
+    parser.add_argument(
+        "--rebuild-history",
+        action="store_true",
+        help="Rebuilds the last week of the --history-path store from the one on ones of its weekly task when the store is out of sync, e.g. after losing its file",
+    )
+    parser.add_argument(
+        "--write-concurrency",
+        type=int,
+        default=DEFAULT_WRITE_CONCURRENCY,
+        help="Maximum number of tasks created at the same time",
+    )
+    parser.add_argument(
+        "--use-batch-api",
+        action="store_true",
+        help="Group the tasks created into Asana batch requests of up to 10 tasks each",
+    )
+    parser.add_argument(
+        "--project-concurrency",
+        type=int,
+        default=DEFAULT_PROJECT_CONCURRENCY,
+        help="Maximum number of projects handled at the same time when running for multiple projects",
+    )
+    parser.add_argument(
+        "--requests-per-minute",
+        type=int,
+        default=DEFAULT_REQUESTS_PER_MINUTE,
+        help="Maximum number of requests sent to Asana per minute, shared by all workers",
+    )
+    parser.add_argument(
+        "--max-concurrent-requests",
+        type=int,
+        default=DEFAULT_MAX_CONCURRENCY,
+        help="Maximum number of requests in flight, lowered automatically when Asana throttles requests",
+    )
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        help="Number of keep-alive connections kept open to Asana, defaults to --max-concurrent-requests",
+    )
+    parser.add_argument(
+        "--request-timeout",
+        type=float,
+        default=DEFAULT_REQUEST_TIMEOUT,
+        help="Seconds to wait for Asana to respond to a request",
+    )
+    parser.add_argument(
+        "--metrics-path",
+        type=str,
+        help="Writes the number, latency, bytes and errors of requests per endpoint and project, the bytes of each read and the time spent per phase to this file at the end of the run. "
+        "In the Prometheus text format if the file name ends with .prom, JSON otherwise",
+    )
+    parser.add_argument(
+        "--profile-matching",
+        type=str,
+        choices=PROFILERS,
+        help="Profiles the matching of every project with cProfile (cpu) or tracemalloc (memory), shown in debug mode",
+    )
+    parser.add_argument(
+        "--plan",
+        type=str,
+        help="Fetches and matches every project and writes the one on ones to this plan file instead of to Asana",
+    )
+    parser.add_argument(
+        "--apply",
+        type=str,
+        help="Creates the one on ones of this plan file in Asana. Running it again after an interruption resumes where it stopped",
+    )
+    parser.add_argument(
+        "--member-mirror-path",
+        type=str,
+        help="SQLite file mirroring the member tasks of every project. Runs then only fetch the member tasks changed since the last run, using Asana's events",
+    )
+    parser.add_argument(
+        "--journal-path",
+        type=str,
+        help="SQLite file journaling every write of this week's one on ones. Running again after a crash or failed writes creates only what is missing",
+    )
+    parser.add_argument(
+        "--rematch",
+        action="store_true",
+        help="Repairs this week's one on ones for members who joined or left since they got created, instead of creating them",
+    )
+    parser.add_argument(
+        "--discover",
+        action="store_true",
+        help="Finds the projects to run for with a search of the workspace for the bot's tasks named --task-name, instead of listing all of the bot's tasks. "
+        "Needs a premium workspace",
+    )
+    parser.add_argument(
+        "--discovery-path",
+        type=str,
+        help="JSON file keeping the projects found by --discover and their sections between runs, so that only new or failed projects get their sections looked up. "
+        "Implies --discover",
+    )
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=DEFAULT_PAGE_SIZE,
+        help="Number of tasks per request when listing tasks, up to {}. The next page is fetched while the current one is processed".format(
+            MAX_PAGE_SIZE
+        ),
+    )
     parser.add_argument("--debug", action="store_true", help="Runs in debug mode")
     parser.add_argument(
         "--use-name-as-id",
@@ -46,8 +195,31 @@ if __name__ == "__main__":
         args.workspace_gid,
         user_gid=args.user_gid,
         task_name=args.task_name,
-        project_gid=args.project,
+        project_gid=args.project_gid,
         error_project_gid=args.error_project_gid,
         debug=args.debug,
         use_name_as_id=args.use_name_as_id,
+        strategy=args.strategy,
+        history_weeks=args.history_weeks,
+        history_path=args.history_path,
+        rebuild_history=args.rebuild_history,
+        write_concurrency=args.write_concurrency,
+        use_batch_api=args.use_batch_api,
+        project_concurrency=args.project_concurrency,
+        requests_per_minute=args.requests_per_minute,
+        max_concurrent_requests=args.max_concurrent_requests,
+        pool_size=args.pool_size,
+        request_timeout=args.request_timeout,
+        metrics_path=args.metrics_path,
+        profile_matching=args.profile_matching,
+        plan_path=args.plan,
+        apply_path=args.apply,
+        member_mirror_path=args.member_mirror_path,
+        page_size=args.page_size,
+        journal_path=args.journal_path,
+        rematch=args.rematch,
+        best_of=args.best_of,
+        match_budget=args.match_budget,
+        discover=args.discover,
+        discovery_path=args.discovery_path,
     )
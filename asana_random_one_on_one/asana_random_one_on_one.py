@@ -2,12 +2,101 @@
 from __future__ import print_function
 import random
 import argparse
+import itertools
 import json
+import os
+import threading
+import time
 from datetime import datetime, timedelta
-import asana
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from asana_random_one_on_one.config import Config
-from asana_random_one_on_one.construct_matches import ConstructMatches
+from asana.error import NotFoundError
+
+from asana_random_one_on_one.best_of import (
+    DEFAULT_MATCH_BUDGET,
+    MatchPool,
+    best_of_k_matches,
+)
+from asana_random_one_on_one.batch import (
+    BatchAction,
+    BatchWriter,
+    add_comment_action,
+    add_project_action,
+    create_subtask_action,
+    create_task_action,
+)
+from asana_random_one_on_one.client import (
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_REQUEST_TIMEOUT,
+    DEFAULT_REQUESTS_PER_MINUTE,
+    Client,
+    RateLimiter,
+)
+from asana_random_one_on_one.config import (
+    DEFAULT_PROJECT_CONCURRENCY,
+    DEFAULT_WRITE_CONCURRENCY,
+    Config,
+)
+from asana_random_one_on_one.construct_matches import (
+    DEFAULT_HISTORY_WEEKS,
+    GREEDY,
+    WEIGHTED,
+    ConstructMatches,
+)
+from asana_random_one_on_one.discovery import DiscoveryManifest, search_bot_tasks
+from asana_random_one_on_one.external_data import (
+    check_external_data_size,
+    decode_external_data,
+    encode_external_data,
+)
+from asana_random_one_on_one.match_history import (
+    MatchHistoryStore,
+    history_pointer,
+    match_checksum,
+    parse_history_pointer,
+)
+from asana_random_one_on_one.member_mirror import MemberMirror, sync_members_tasks
+from asana_random_one_on_one.member_profiles import compile_member_profiles
+from asana_random_one_on_one.member_table import MemberTable, day_number, is_away
+from asana_random_one_on_one.metrics import (
+    FETCH,
+    MATCH,
+    WRITE,
+    RunMetrics,
+    in_current_context,
+)
+from asana_random_one_on_one.pagination import (
+    DEFAULT_PAGE_SIZE,
+    check_page_size,
+    stream_collection,
+)
+from asana_random_one_on_one.pair_history import PairHistory, week_index, week_key
+from asana_random_one_on_one.plan import (
+    DONE,
+    FAILED,
+    PLANNED,
+    Plan,
+    ProjectPlan,
+    assignee_summary,
+)
+from asana_random_one_on_one.projections import (
+    BOT_TASK_PROJECTS,
+    BOT_TASKS,
+    DISCOVERY_TASKS,
+    LAST_WEEKLY_TASK,
+    MEMBER_TASKS,
+    ONE_ON_ONE_ASSIGNEES,
+    REMATCH_WEEKLY_TASKS,
+    SECTIONS,
+    WEEK_ONE_ON_ONES,
+    WEEKLY_TASKS_HISTORY,
+)
+from asana_random_one_on_one.write_journal import (
+    WriteJournal,
+    existing_subtasks,
+    subtask_key,
+    write_key,
+)
 
 
 def next_friday():
@@ -51,31 +140,40 @@ def member_name(m):
     return m["name"].strip()
 
 
-def prioritize_unmatched(config, members, unmatched_id):
+def prioritize_unmatched(profiles, unmatched_id):
     # Unmatched from last week gets priority
-    for i, member in enumerate(members):
-        if member_id(config)(member) == unmatched_id:
-            members.append(
-                members.pop(i)
+    for i, profile in enumerate(profiles):
+        if profile.member_id == unmatched_id:
+            profiles.append(
+                profiles.pop(i)
             )  # Put at the end of the list. Since we always pop, this member will be the first one to get a match.
             break
 
 
-def filter_by_frequency(members):
-    number_of_weeks = (datetime.now().date() - datetime(2019, 1, 1).date()).days // 7
-    switch = {
-        "Never": False,
-        "Every week": True,
-        "Every 2 weeks": number_of_weeks % 2 == 0,
-        "Every 3 weeks": number_of_weeks % 3 == 0,
-        "Every 4 weeks": number_of_weeks % 4 == 0,
-    }
+def participating_profiles(config, members_tasks):
+    """MemberProfiles of the members who take part this week, see filter_by_frequency"""
+    if isinstance(members_tasks, MemberTable):
+        # Checked while the table got loaded
+        return members_tasks.profiles(member_id(config), participating=True)
+    return filter_by_frequency(
+        compile_member_profiles(
+            members_tasks, member_id(config), get_custom_field_value
+        )
+    )
+
 
-    def _should_participate_this_week(member):
-        frequency = get_custom_field_value(member, "Frequency", "Every week")
-        return switch.get(frequency, False)
+def filter_by_frequency(profiles):
+    number_of_weeks = week_index(datetime.now().date())
+    return [p for p in profiles if p.participates(number_of_weeks)]
 
-    return [m for m in members if _should_participate_this_week(m)]
+
+def fetch_sections(config, project_gid):
+    with config.metrics.call_site(SECTIONS.name):
+        return list(
+            config.client.sections.find_by_project(
+                project_gid, opt_fields=SECTIONS.opt_fields
+            )
+        )
 
 
 def get_member_and_upcoming_sections(sections):
@@ -90,108 +188,516 @@ def get_member_and_upcoming_sections(sections):
     return members_section, upcoming_section
 
 
-def create_one_on_one_tasks(config, this_week_id, members_tasks, unmatched_member_task):
+def one_on_one_task(config, name1, name2):
+    return {
+        "name": "Random 1:1 for {} : {}".format(name1, name2),
+        "notes": "Start by finding a suitable date for your one on one and put it on the calendar",
+        "workspace": config.work_space_gid,
+    }
+
+
+def unmatched_task(config, unmatched_member):
+    return {
+        "name": "Random One on None {}".format(member_name(unmatched_member)),
+        "assignee": unmatched_member.get("gid"),
+        "due_on": datetime.now().strftime("%Y-%m-%d"),
+        "notes": "Unfortunately you did not get paired this week. \nDon't worry, you will get priority next week! :tada:",
+        "workspace": config.work_space_gid,
+    }
+
+
+def one_on_one_subtasks(config, one_on_one_id, member1, member2):
+    """:return: A (description, parent gid, data) for the subtask of each member of a one on one"""
     today_str = datetime.now().strftime("%Y-%m-%d")
     next_friday_str = next_friday().strftime("%Y-%m-%d")
 
-    def _create_one_on_one_subtask(one_on_one_id, assignee_id, name):
-        config.client.tasks.add_subtask(
+    def _subtask(assignee_id, name):
+        return {
+            "name": "Schedule a meet-up with {}".format(name),
+            "notes": "You have been matched for a random 1:1 with {}".format(name),
+            "assignee": assignee_id,
+            "start_on": today_str,
+            "due_on": next_friday_str,
+            "workspace": config.work_space_gid,
+        }
+
+    name1, name2 = member_name(member1), member_name(member2)
+    return [
+        (
+            "Schedule a meet-up for {} with {}".format(name1, name2),
             one_on_one_id,
-            {
-                "name": "Schedule a meet-up with {}".format(name),
-                "notes": "You have been matched for a random 1:1 with {}".format(name),
-                "assignee": assignee_id,
-                "start_on": today_str,
-                "due_on": next_friday_str,
-                "workspace": config.work_space_gid,
-            },
-        )
+            _subtask(member1.get("gid"), name2),
+        ),
+        (
+            "Schedule a meet-up for {} with {}".format(name2, name1),
+            one_on_one_id,
+            _subtask(member2.get("gid"), name1),
+        ),
+    ]
 
-    while len(members_tasks) > 1:
-        member1 = members_tasks.pop().get("assignee")
-        name1 = member_name(member1)
 
-        member2 = members_tasks.pop().get("assignee")
-        name2 = member_name(member2)
+class OneOnOneWriter(object):
+    def __init__(self, config, journal, this_week_id, resume):
+        """
+        Writes the tasks of a week's one on ones, through the journal if there is one. With resume
+        the subtasks an earlier run that stopped created already are found by listing the subtasks
+        of the weekly task and of its existing one on ones, and not created again.
 
-        one_on_one_task = config.client.tasks.add_subtask(
-            this_week_id,
-            {
-                "name": "Random 1:1 for {} : {}".format(name1, name2),
-                "notes": "Start by finding a suitable date for your one on one and put it on the calendar",
-                "workspace": config.work_space_gid,
-            },
+        :param journal: A WriteJournal, or None
+        """
+        self.config = config
+        self.journal = journal
+        # Parent gid to its existing_subtasks, only tasks that existed before this run are listed
+        self._existing = {}
+        self._existing_parents = {this_week_id} if resume else set()
+        self._lock = threading.Lock()
+
+    def existing(self, parent, data):
+        """:return: The gid of the subtask of parent an earlier run created already, or None"""
+        if parent not in self._existing_parents:
+            return None
+        with self._lock:
+            if parent not in self._existing:
+                self._existing[parent] = existing_subtasks(self.config.client, parent)
+            gid = self._existing[parent].get(subtask_key(parent, data))
+            if gid is not None:
+                # Some of its subtasks may be missing
+                self._existing_parents.add(gid)
+        return gid
+
+    def add_subtask(self, parent, data):
+        client = self.config.client
+        gid = self.existing(parent, data)
+        if gid is not None:
+            return {"gid": gid}
+        if self.journal is None:
+            return client.tasks.add_subtask(parent, data)
+        return self.journal.write(
+            client,
+            subtask_key(parent, data),
+            lambda: client.tasks.add_subtask(parent, data),
+            parent,
+            data,
         )
 
-        _create_one_on_one_subtask(
-            one_on_one_task.get("gid"), member1.get("gid"), name2
+    def post(self, path, data):
+        client = self.config.client
+        if self.journal is None:
+            return client.post(path, data)
+        return self.journal.write(
+            client,
+            write_key(BatchAction("post", path, data)),
+            lambda: client.post(path, data),
         )
-        _create_one_on_one_subtask(
-            one_on_one_task.get("gid"), member2.get("gid"), name1
+
+    def execute_batch(self, batch_writer, writes):
+        """
+        :param writes: A list of (description, parent gid or None, data, BatchAction)
+        :return: The result of each write like BatchWriter.execute, the tasks created already are
+         skipped and their gids returned
+        """
+        found = [
+            self.existing(parent, data) if parent is not None else None
+            for _, parent, data, _ in writes
+        ]
+        missing = [write for write, gid in zip(writes, found) if gid is None]
+        if not missing:
+            results = iter([])
+        elif self.journal is None:
+            results = iter(
+                batch_writer.execute([action for _, _, _, action in missing])
+            )
+        else:
+            results = iter(
+                self.journal.execute_batch(
+                    self.config.client,
+                    batch_writer,
+                    [(action, parent, data) for _, parent, data, action in missing],
+                )
+            )
+        return [{"gid": gid} if gid is not None else next(results) for gid in found]
+
+
+def create_one_on_one_tasks_in_batches(
+    config, writer, this_week_id, pairs, unmatched_member, actions
+):
+    """Like create_one_on_one_tasks, the tasks are created with config.use_batch_api"""
+    batch_writer = BatchWriter(config.client, config.write_concurrency)
+
+    # The one on one tasks are created first, their subtasks need their gids
+    tasks = [
+        one_on_one_task(config, member_name(m1), member_name(m2)) for m1, m2 in pairs
+    ]
+    if unmatched_member:
+        tasks.append(unmatched_task(config, unmatched_member))
+    first_writes = [
+        (data["name"], this_week_id, data, create_subtask_action(this_week_id, data))
+        for data in tasks
+    ]
+    first_writes.extend(
+        ("{} {}".format(a.method.upper(), a.relative_path), None, None, a)
+        for a in actions
+    )
+    results = writer.execute_batch(batch_writer, first_writes)
+
+    failures = []
+    subtasks = []
+    for i, (write, result) in enumerate(zip(first_writes, results)):
+        if isinstance(result, Exception):
+            failures.append((write[0], result))
+        elif i < len(pairs):
+            subtasks.extend(one_on_one_subtasks(config, result.get("gid"), *pairs[i]))
+    results = writer.execute_batch(
+        batch_writer,
+        [
+            (description, parent, data, create_subtask_action(parent, data))
+            for description, parent, data in subtasks
+        ],
+    )
+    failures.extend(
+        (description, result)
+        for (description, _, _), result in zip(subtasks, results)
+        if isinstance(result, Exception)
+    )
+    debug_print(config, "Batch requests", batch_writer.request_count)
+    return failures
+
+
+def create_one_on_one_tasks_concurrently(
+    config, writer, this_week_id, pairs, unmatched_member, actions
+):
+    """Like create_one_on_one_tasks, up to config.write_concurrency requests at a time"""
+    failures = []
+    # Requests made by the workers count towards the current project
+    add_subtask = in_current_context(writer.add_subtask)
+    post = in_current_context(writer.post)
+    with ThreadPoolExecutor(max_workers=config.write_concurrency) as executor:
+        one_on_one_tasks = {}
+        for member1, member2 in pairs:
+            future = executor.submit(
+                add_subtask,
+                this_week_id,
+                one_on_one_task(config, member_name(member1), member_name(member2)),
+            )
+            one_on_one_tasks[future] = (member1, member2)
+
+        subtasks = {}
+        if unmatched_member:
+            data = unmatched_task(config, unmatched_member)
+            subtasks[executor.submit(add_subtask, this_week_id, data)] = data["name"]
+        for action in actions:
+            future = executor.submit(post, action.relative_path, action.data)
+            subtasks[future] = "{} {}".format(
+                action.method.upper(), action.relative_path
+            )
+
+        # The subtasks of a one on one can only be created once its task exists
+        for future in as_completed(one_on_one_tasks):
+            member1, member2 = one_on_one_tasks[future]
+            try:
+                one_on_one_id = future.result().get("gid")
+            except Exception as e:
+                description = "Random 1:1 for {} : {}".format(
+                    member_name(member1), member_name(member2)
+                )
+                failures.append((description, e))
+                continue
+            for description, parent, data in one_on_one_subtasks(
+                config, one_on_one_id, member1, member2
+            ):
+                subtasks[executor.submit(add_subtask, parent, data)] = description
+
+        for future in as_completed(subtasks):
+            if future.exception() is not None:
+                failures.append((subtasks[future], future.exception()))
+
+    return failures
+
+
+def create_one_on_one_tasks_sequentially(
+    config, writer, this_week_id, pairs, unmatched_member, actions
+):
+    """Like create_one_on_one_tasks, one request at a time without a thread pool"""
+    failures = []
+
+    def _write(description, write, *args):
+        try:
+            return write(*args)
+        except Exception as e:
+            failures.append((description, e))
+
+    for member1, member2 in pairs:
+        data = one_on_one_task(config, member_name(member1), member_name(member2))
+        result = _write(data["name"], writer.add_subtask, this_week_id, data)
+        if result is None:
+            continue
+        for description, parent, data in one_on_one_subtasks(
+            config, result.get("gid"), member1, member2
+        ):
+            _write(description, writer.add_subtask, parent, data)
+    if unmatched_member:
+        data = unmatched_task(config, unmatched_member)
+        _write(data["name"], writer.add_subtask, this_week_id, data)
+    for action in actions:
+        _write(
+            "{} {}".format(action.method.upper(), action.relative_path),
+            writer.post,
+            action.relative_path,
+            action.data,
         )
+    return failures
 
-    if unmatched_member_task:
-        unmatched_member = unmatched_member_task.get("assignee")
-        name = member_name(unmatched_member)
-        config.client.tasks.add_subtask(
-            this_week_id,
-            {
-                "name": "Random One on None {}".format(name),
-                "assignee": unmatched_member.get("gid"),
-                "due_on": today_str,
-                "notes": "Unfortunately you did not get paired this week. \nDon't worry, you will get priority next week! :tada:",
-                "workspace": config.work_space_gid,
-            },
+
+def create_one_on_one_tasks(
+    config,
+    this_week_id,
+    members_tasks,
+    unmatched_member_task,
+    actions=(),
+    use_journal=True,
+    resume=False,
+):
+    """
+    Creates the one on one tasks for all matches, up to config.write_concurrency requests at a time.
+    A failed one on one doesn't stop the others from being created. With config.write_journal the
+    tasks created by an earlier run of this week are skipped.
+
+    :param actions: Other independent BatchActions to send along with the one on one tasks
+    :param use_journal: Whether to journal the writes in config.write_journal
+    :param resume: Skip the tasks an earlier run that stopped already created, found by listing the
+     subtasks of the weekly task and of its existing one on ones. Only needed without a journal.
+    :return: A list of (description, exception) for each task that could not be created
+    """
+    pairs = []
+    while len(members_tasks) > 1:
+        member1 = members_tasks.pop().get("assignee")
+        member2 = members_tasks.pop().get("assignee")
+        pairs.append((member1, member2))
+    unmatched_member = (
+        unmatched_member_task.get("assignee") if unmatched_member_task else None
+    )
+
+    writer = OneOnOneWriter(
+        config, config.write_journal if use_journal else None, this_week_id, resume
+    )
+    if config.use_batch_api:
+        create = create_one_on_one_tasks_in_batches
+    elif config.write_concurrency > 1:
+        create = create_one_on_one_tasks_concurrently
+    else:
+        create = create_one_on_one_tasks_sequentially
+    return create(config, writer, this_week_id, pairs, unmatched_member, actions)
+
+
+def load_pair_history(config, upcoming_section):
+    # The weekly tasks are listed newest first. A single paginated request gets the match data of the
+    # last weeks, instead of a find_by_id for each weekly task.
+    weekly_match_data = []
+    with config.metrics.call_site(WEEKLY_TASKS_HISTORY.name):
+        weekly_tasks = config.client.tasks.find_by_section(
+            upcoming_section, opt_fields=WEEKLY_TASKS_HISTORY.opt_fields
         )
+        for task in itertools.islice(weekly_tasks, config.history_weeks):
+            if task.get("external") and task["external"].get("data"):
+                created_on = datetime.fromisoformat(task["created_at"][:10]).date()
+                weekly_match_data.append(
+                    (
+                        week_key(created_on),
+                        decode_external_data(task["external"]["data"]),
+                    )
+                )
+    return PairHistory.from_weekly_match_data(weekly_match_data)
 
 
-def user_is_away(user):
-    now = datetime.now()
-    vacation_dates = user.get("vacation_dates")
-    vacation_start = vacation_dates.get("start_date")
-    vacation_end = vacation_dates.get("end_date")
+def rebuild_history_week(config, project_gid, week, weekly_task_gid, members_tasks):
+    """
+    Records a week's matches in config.history_store again, read from the one on ones of its weekly
+    task, e.g. after the store's file got lost. Weeks before it can't be rebuilt, their weekly tasks
+    only keep a pointer into the store.
+
+    :param members_tasks: The project's members tasks, see fetch_members_tasks
+    :return: Checksum of the rebuilt week
+    """
+    one_on_ones, unmatched = week_one_on_ones(config, weekly_task_gid, members_tasks)
+    get_id = member_id(config)
+    ids = {m["assignee"]["gid"]: get_id(m) for m in members_tasks}
+    pairs = [
+        [ids.get(a["gid"], a["gid"]) for a in assignees]
+        for assignees, _, _ in one_on_ones
+        if len(assignees) == 2
+    ]
+    unmatched_id = (
+        ids.get(unmatched[0]["gid"], unmatched[0]["gid"]) if unmatched else None
+    )
+    return config.history_store.record_week(
+        project_gid, week, pairs, unmatched_id, replace=True
+    )
+
+
+def weekly_task_week(task, default):
+    """:return: The week a weekly task was created, see pair_history.week_key"""
+    if task and task.get("created_at"):
+        return week_key(datetime.fromisoformat(task["created_at"][:10]).date())
+    return default
 
-    if vacation_start is None:  # not away
-        return False
 
-    start_date = datetime.fromisoformat(vacation_start)
-    end_date = (
-        datetime.fromisoformat(vacation_end) if vacation_end is not None else None
+def migrate_history_store(config, project_gid, pointer, week):
+    """
+    Moves the project's weeks in config.history_store to week_key if they were recorded before it,
+    see MatchHistoryStore.migrate.
+
+    :param pointer: The history pointer of the project's last weekly task, or None
+    :param week: The week that weekly task was created, see weekly_task_week
+    :return: The pointer with the week the store now has it under
+    """
+    store = config.history_store
+    if not store.is_legacy(project_gid):
+        return pointer
+    # The last weekly task's pointer has the week it was recorded under before week_key
+    shift = week - pointer[0] if pointer is not None else 0
+    store.migrate(project_gid, shift)
+    debug_print(
+        config,
+        "Moved the weeks of project {} in the match history store by {}".format(
+            project_gid, shift
+        ),
+    )
+    return (week, pointer[1]) if pointer is not None else None
+
+
+def load_matches_from_history_store(
+    config,
+    project_gid,
+    last_run_data,
+    last_run_week,
+    last_run_gid=None,
+    members_tasks=(),
+):
+    """
+    :param last_run_data: The external data of the last weekly task
+    :param last_run_week: The week the last weekly task was created, see pair_history.week_key
+    :param last_run_gid: The last weekly task, its week is rebuilt from it with config.rebuild_history
+    :param members_tasks: The project's members tasks, see fetch_members_tasks
+    :return: The previous match data of the project, read from config.history_store
+    """
+    store = config.history_store
+    pointer = migrate_history_store(
+        config, project_gid, parse_history_pointer(last_run_data), last_run_week
     )
+    if pointer is None:
+        last_week = store.last_week(project_gid)
+        if last_run_data and (last_week is None or last_week < last_run_week):
+            # Matches are still kept in the weekly task, e.g. of a run without the store, they are
+            # newer than the store's
+            store.import_match_data(project_gid, last_run_week, last_run_data)
+        elif last_run_data:
+            debug_print(config, "Ignoring match data in weekly task", project_gid)
+    else:
+        week, checksum = pointer
+        if store.checksum(project_gid, week) != checksum:
+            if not (config.rebuild_history and last_run_gid):
+                raise Exception(
+                    "Match history store {} is out of sync with the last weekly task, "
+                    "run with --rebuild-history to rebuild its last week".format(
+                        store.path
+                    )
+                )
+            rebuilt = rebuild_history_week(
+                config, project_gid, week, last_run_gid, members_tasks
+            )
+            debug_print(
+                config,
+                "Rebuilt week {} of the match history store for project {}{}".format(
+                    week,
+                    project_gid,
+                    "" if rebuilt == checksum else ", its one on ones changed since",
+                ),
+            )
+    return store.match_data(project_gid)
+
 
+def user_is_away(user):
+    vacation_dates = user.get("vacation_dates")
     # Only filter if a user is away for the whole week
-    return start_date <= now and (end_date is None or end_date >= next_friday())
+    return is_away(
+        day_number(vacation_dates.get("start_date")),
+        day_number(vacation_dates.get("end_date")),
+        datetime.now().toordinal(),
+        next_friday().toordinal(),
+    )
+
+
+def fetch_members_tasks(config, members_section, project_gid=None):
+    """
+    :param project_gid: Project of the members section, needed to read it from config.member_mirror
+    :return: A MemberTable of the member tasks of members that are assigned, not completed and not
+     away, marked with whether they take part this week
+    """
+    with config.metrics.call_site(MEMBER_TASKS.name):
+        if config.member_mirror is not None and project_gid is not None:
+            members_tasks = sync_members_tasks(
+                config.client,
+                config.member_mirror,
+                project_gid,
+                members_section,
+                MEMBER_TASKS.opt_fields,
+                config.page_size,
+            )
+        else:
+            members_tasks = stream_collection(
+                config.client,
+                "/sections/{}/tasks".format(members_section),
+                {},
+                config.page_size,
+                opt_fields=MEMBER_TASKS.opt_fields,
+            )
 
+        # Unassigned, completed and away members are dropped as their pages arrive
+        today = datetime.now()
+        return MemberTable(
+            members_tasks,
+            today.toordinal(),
+            next_friday().toordinal(),
+            week_index(today.date()),
+        )
 
-def generate_random_one_on_one(config, project_gid, members_section, upcoming_section):
+
+def plan_random_one_on_one(
+    config, project_gid, members_section, upcoming_section, members_tasks=None
+):
+    """
+    Fetches what's needed and matches the project's members, without writing anything to Asana.
+
+    :param members_tasks: The project's members tasks if already fetched, see fetch_members_tasks
+    :return: A ProjectPlan, or None if there is nothing to do this week
+    """
     debug_print(config, "Generating random one on one for project", project_gid)
-    opt_fields = [
-        "assignee",
-        "name",
-        "completed",
-        "custom_fields",
-        "assignee.vacation_dates",
-        "assignee.name",
-    ]
-    members_tasks = config.client.tasks.find_by_section(
-        members_section, opt_fields=opt_fields
-    )
+    if config.write_journal is not None:
+        # An earlier run of this week died or failed while writing the one on ones
+        project_plan = config.write_journal.project_plan(project_gid)
+        if (
+            project_plan is not None
+            and project_plan.status != DONE
+            and project_plan.weekly_task_name
+            == "[{}] weeks Random 1:1".format(config.week_number)
+        ):
+            debug_print(config, "Resuming this weeks one on ones", project_gid)
+            project_plan.status = PLANNED
+            project_plan.error = None
+            return project_plan
+    phase_started = time.monotonic()
+    if members_tasks is None:
+        members_tasks = fetch_members_tasks(config, members_section, project_gid)
 
-    members_tasks = [
-        member
-        for member in members_tasks
-        if member.get("assignee") is not None
-        and not member.get("completed")
-        and not user_is_away(member.get("assignee"))
-    ]  # Filter out unassigned member tasks and completed tasks
-    members_tasks = filter_by_frequency(members_tasks)
+    # Custom fields are only read once, when loading the member tasks
+    profiles = participating_profiles(config, members_tasks)
 
-    if not len(members_tasks):
+    if not len(profiles):
         # No members in this project.
-        debug_print(config, "No members in project", members_tasks)
+        debug_print(config, "No members in project", profiles)
         return
 
-    random.shuffle(members_tasks)
+    random.shuffle(profiles)
 
     this_weeks_name = "[{}] weeks Random 1:1".format(config.week_number)
 
@@ -199,8 +705,14 @@ def generate_random_one_on_one(config, project_gid, members_section, upcoming_se
     #  - see if we have already scheduled '1 on 1's for this week (allows safe reruns)
     #  - ensure last week unmatched gets prioritized
     #  - ensure that same matches don't happen
-    last_run = next(config.client.tasks.find_by_section(upcoming_section), None)
-    last_run = config.client.tasks.find_by_id(last_run.get("gid")) if last_run else None
+    with config.metrics.call_site(LAST_WEEKLY_TASK.name):
+        last_run = next(
+            config.client.tasks.find_by_section(
+                upcoming_section, opt_fields=LAST_WEEKLY_TASK.opt_fields, item_limit=1
+            ),
+            None,
+        )
+    last_run_week = weekly_task_week(last_run, config.week_key - 1)
 
     if last_run and last_run["name"] == this_weeks_name:
         debug_print(
@@ -208,138 +720,763 @@ def generate_random_one_on_one(config, project_gid, members_section, upcoming_se
             "1on1s have been scheduled for this week already",
             last_run.get("gid"),
         )
+        config.metrics.record_phase(FETCH, time.monotonic() - phase_started)
         return
 
     last_run_matches = {}
-    if last_run and last_run.get("external"):
-        last_run_matches = json.loads(last_run["external"]["data"])
+    if last_run and last_run.get("external") and last_run["external"].get("data"):
+        last_run_matches = decode_external_data(last_run["external"]["data"])
+    if config.history_store:
+        last_run_matches = load_matches_from_history_store(
+            config,
+            project_gid,
+            last_run_matches,
+            last_run_week,
+            last_run.get("gid") if last_run else None,
+            members_tasks,
+        )
 
     if last_run_matches.get("unmatched"):
-        prioritize_unmatched(config, members_tasks, last_run_matches["unmatched"])
+        prioritize_unmatched(profiles, last_run_matches["unmatched"])
 
-    debug_print(config, "Creating matches for: ", [m["name"] for m in members_tasks])
-    matches = ConstructMatches(
-        members_tasks, last_run_matches, member_id(config), get_custom_field_value
+    pair_history = None
+    if config.strategy == WEIGHTED and config.history_store:
+        pair_history = config.history_store.pair_history(
+            project_gid, since_week=config.week_key - config.history_weeks
+        )
+    elif config.strategy == WEIGHTED:
+        pair_history = load_pair_history(config, upcoming_section)
+        debug_print(config, "Pairs in match history: {}".format(len(pair_history)))
+
+    debug_print(config, "Creating matches for: ", [p.member["name"] for p in profiles])
+    config.metrics.record_phase(FETCH, time.monotonic() - phase_started)
+    phase_started = time.monotonic()
+    options = dict(
+        strategy=config.strategy,
+        pair_history=pair_history,
+        week=config.week_key,
+        history_weeks=config.history_weeks,
+        profiler=config.profile_matching,
     )
-    matches.construct_matches()
+    if config.best_of > 1:
+        matches, score, scored = best_of_k_matches(
+            profiles,
+            last_run_matches,
+            member_id(config),
+            get_custom_field_value,
+            config.best_of,
+            config.match_budget,
+            config.match_pool,
+            **options,
+        )
+        stats = matches.stats
+        debug_print(
+            config,
+            "Best of {} matchings for project {}: {}".format(
+                scored, project_gid, score
+            ),
+        )
+    else:
+        matches = ConstructMatches(
+            profiles,
+            last_run_matches,
+            member_id(config),
+            get_custom_field_value,
+            **options,
+        )
+        stats = matches.construct_matches()
+    config.metrics.record_phase(MATCH, time.monotonic() - phase_started)
     debug_print(config, [m["name"] for m in matches.matched_members])
     debug_print(config, "Last run matches: {}".format(last_run_matches))
     debug_print(config, "This run matches: {}".format(matches.match_data))
+    debug_print(config, "Match stats for project {}: {}".format(project_gid, stats))
+    if stats.profile:
+        debug_print(
+            config,
+            "Match profile for project {}:\n{}".format(project_gid, stats.profile),
+        )
+    config.metrics.record_match_stats(stats.to_dict())
 
-    this_week = config.client.tasks.create_in_workspace(
-        config.work_space_gid,
-        {
-            "name": this_weeks_name,
-            "notes": "Check your :one: on :one: from below",
-            "external": {"data": json.dumps(matches.match_data)},
-        },
+    this_weeks_pairs = list(
+        zip(
+            [p.member_id for p in matches.matched_profiles[::2]],
+            [p.member_id for p in matches.matched_profiles[1::2]],
+        )
     )
-    params = {"project": project_gid}
+    this_weeks_unmatched = matches.match_data.get("unmatched")
+    external_data = matches.match_data
+    if config.history_store:
+        # The weekly task only keeps a checksum of the matches, they live in the store
+        external_data = history_pointer(
+            config.week_key, match_checksum(this_weeks_pairs, this_weeks_unmatched)
+        )
+    encoded = encode_external_data(external_data)
+    debug_print(
+        config,
+        "External data of project {}: {} characters encoded, {} as JSON".format(
+            project_gid, len(encoded), len(json.dumps(external_data))
+        ),
+    )
+    # Checked before anything gets written
+    check_external_data_size(encoded, project_gid)
+
+    # Paired up the same way create_one_on_one_tasks does
+    members = list(matches.matched_members)
+    pairs = []
+    while len(members) > 1:
+        pairs.append(
+            [
+                assignee_summary(members.pop().get("assignee")),
+                assignee_summary(members.pop().get("assignee")),
+            ]
+        )
+    unmatched_member = matches.unmatched_member
     location = (
         {"insert_before": last_run.get("gid")}
         if last_run
         else {"section": upcoming_section}
     )
-    params.update(location)
-    config.client.tasks.add_project(this_week.get("gid"), params=params)
+    return ProjectPlan(
+        project_gid,
+        this_weeks_name,
+        location,
+        external_data,
+        matches.match_data,
+        pairs,
+        (
+            assignee_summary(unmatched_member.get("assignee"))
+            if unmatched_member
+            else None
+        ),
+        [list(pair) for pair in this_weeks_pairs],
+        this_weeks_unmatched,
+    )
+
+
+def weekly_task_data(project_plan):
+    return {
+        "name": project_plan.weekly_task_name,
+        "notes": "Check your :one: on :one: from below",
+        "external": {"data": encode_external_data(project_plan.external_data)},
+    }
+
+
+def apply_project_plan(config, project_plan, save=None):
+    """
+    Writes a project's planned one on ones to Asana, the weekly task is only created if the plan
+    doesn't have one yet. When it has one, an earlier apply stopped and the one on ones it created
+    are skipped, by the journal if there is one or by listing them otherwise. Sets the plan's status.
+
+    :param save: Called once the weekly task got created
+    :raises Exception: If any of the one on one tasks could not be created
+    """
+    journal = config.write_journal
+    phase_started = time.monotonic()
+    if journal is not None:
+        journal.save_plan(project_plan)
+    resume = journal is None and project_plan.weekly_task_gid is not None
+    if project_plan.weekly_task_gid is None:
+        this_week = config.client.tasks.create_in_workspace(
+            config.work_space_gid, weekly_task_data(project_plan)
+        )
+        project_plan.weekly_task_gid = this_week.get("gid")
+        if journal is not None:
+            journal.save_plan(project_plan)
+        if save is not None:
+            save()
+    if config.history_store:
+        config.history_store.record_week(
+            project_plan.project_gid,
+            config.week_key,
+            project_plan.member_id_pairs,
+            project_plan.unmatched_id,
+        )
+    params = {"project": project_plan.project_gid}
+    params.update(project_plan.location)
+    actions = []
+    add_project = add_project_action(project_plan.weekly_task_gid, params)
+    if config.use_batch_api:
+        # Sent along with the first batch of one on one tasks
+        actions.append(add_project)
+    elif journal is not None:
+        journal.write(
+            config.client,
+            write_key(add_project),
+            lambda: config.client.tasks.add_project(
+                project_plan.weekly_task_gid, params=params
+            ),
+        )
+    else:
+        config.client.tasks.add_project(project_plan.weekly_task_gid, params=params)
 
     # Create the tasks
-    create_one_on_one_tasks(
-        config, this_week.get("gid"), matches.matched_members, matches.unmatched_member
+    failures = create_one_on_one_tasks(
+        config,
+        project_plan.weekly_task_gid,
+        project_plan.members_tasks(),
+        project_plan.unmatched_member_task(),
+        actions=actions,
+        resume=resume,
+    )
+    config.metrics.record_phase(WRITE, time.monotonic() - phase_started)
+    if failures:
+        debug_print(config, "Failed to create tasks", failures)
+        project_plan.status = FAILED
+        project_plan.error = (
+            "Could not create {} of this weeks one on one tasks: {}".format(
+                len(failures),
+                "; ".join("{} ({})".format(task, e) for task, e in failures),
+            )
+        )
+        if journal is not None:
+            journal.save_plan(project_plan)
+        raise Exception(project_plan.error)
+    project_plan.status = DONE
+    if journal is not None:
+        journal.save_plan(project_plan)
+
+
+def generate_random_one_on_one(
+    config, project_gid, members_section, upcoming_section, members_tasks=None
+):
+    """
+    :param members_tasks: The project's members tasks if already fetched, see fetch_members_tasks
+    """
+    project_plan = plan_random_one_on_one(
+        config, project_gid, members_section, upcoming_section, members_tasks
     )
+    if project_plan is not None:
+        apply_project_plan(config, project_plan)
+
+
+ONE_ON_ONE_PREFIX = "Random 1:1 for "
+UNMATCHED_PREFIX = "Random One on None "
 
 
-def run_for_a_single_project(config, project_id):
-    sections = [s for s in config.client.sections.find_by_project(project_id)]
-    members_section, upcoming_section = get_member_and_upcoming_sections(sections)
-    if members_section and upcoming_section:
-        generate_random_one_on_one(
+def week_one_on_ones(config, this_week_id, members_tasks):
+    """
+    Reads the one on ones of a week from the subtasks of its weekly task. The members of a one on one
+    are found by the names in its name, only one on ones naming members that aren't in members_tasks
+    or that share their name with another member need their own subtasks to be listed.
+
+    :param members_tasks: The project's members tasks, see fetch_members_tasks
+    :return: (one on ones, unmatched). The one on ones as a list of (assignees, gid, completed), where
+     assignees are the ones of the one on one's subtasks. The unmatched member as (assignee, gid), or None.
+    """
+    by_name = {}
+    for member in members_tasks:
+        by_name.setdefault(member_name(member["assignee"]), []).append(
+            member["assignee"]
+        )
+
+    one_on_ones = []
+    unmatched = None
+    with config.metrics.call_site(WEEK_ONE_ON_ONES.name):
+        for task in config.client.tasks.get_subtasks_for_task(
+            this_week_id, opt_fields=WEEK_ONE_ON_ONES.opt_fields
+        ):
+            if task["name"].startswith(UNMATCHED_PREFIX) and task.get("assignee"):
+                unmatched = (task["assignee"], task["gid"])
+            elif task["name"].startswith(ONE_ON_ONE_PREFIX):
+                names = task["name"][len(ONE_ON_ONE_PREFIX) :].split(" : ")
+                assignees = [by_name.get(name, []) for name in names]
+                if len(names) == 2 and all(len(a) == 1 for a in assignees):
+                    assignees = [a[0] for a in assignees]
+                else:
+                    with config.metrics.call_site(ONE_ON_ONE_ASSIGNEES.name):
+                        assignees = [
+                            subtask["assignee"]
+                            for subtask in config.client.tasks.get_subtasks_for_task(
+                                task["gid"], opt_fields=ONE_ON_ONE_ASSIGNEES.opt_fields
+                            )
+                            if subtask.get("assignee")
+                        ]
+                one_on_ones.append((assignees, task["gid"], task.get("completed")))
+    return one_on_ones, unmatched
+
+
+def rematch_random_one_on_one(
+    config, project_gid, members_section, upcoming_section, members_tasks=None
+):
+    """
+    Repairs this week's one on ones after members joined or left the project since they got created,
+    see ConstructMatches.repair_matches. Only the one on ones that changed are deleted and created,
+    one on ones that were already completed are left alone.
+
+    :param members_tasks: The project's members tasks if already fetched, see fetch_members_tasks
+    :return: (number of tasks deleted, number of one on ones created)
+    """
+    debug_print(
+        config, "Repairing this weeks random one on one for project", project_gid
+    )
+    if members_tasks is None:
+        members_tasks = fetch_members_tasks(config, members_section, project_gid)
+
+    this_weeks_name = "[{}] weeks Random 1:1".format(config.week_number)
+    with config.metrics.call_site(REMATCH_WEEKLY_TASKS.name):
+        weekly_tasks = list(
+            itertools.islice(
+                config.client.tasks.find_by_section(
+                    upcoming_section,
+                    opt_fields=REMATCH_WEEKLY_TASKS.opt_fields,
+                    item_limit=2,
+                ),
+                2,
+            )
+        )
+    if not weekly_tasks or weekly_tasks[0]["name"] != this_weeks_name:
+        raise Exception("This weeks one on ones have not been created yet")
+    this_week, last_week = (weekly_tasks + [None])[:2]
+    # The matches are recorded under the week the weekly task was created, a rematch on another day
+    # repairs that week
+    week = weekly_task_week(this_week, config.week_key)
+
+    def _match_data(task):
+        if task and task.get("external") and task["external"].get("data"):
+            return decode_external_data(task["external"]["data"])
+        return {}
+
+    week_match_data = _match_data(this_week)
+    last_week_matches = _match_data(last_week)
+    if config.history_store:
+        migrate_history_store(
+            config, project_gid, parse_history_pointer(week_match_data), week
+        )
+        week_match_data = config.history_store.match_data(project_gid)
+        last_week_matches = config.history_store.match_data(
+            project_gid, before_week=week
+        )
+    elif parse_history_pointer(week_match_data) is not None:
+        raise Exception("This weeks matches are kept in a match history store")
+
+    one_on_ones, unmatched = week_one_on_ones(config, this_week["gid"], members_tasks)
+    get_id = member_id(config)
+    ids = {m["assignee"]["gid"]: get_id(m) for m in members_tasks}
+
+    def _key(assignees):
+        # Members who left are kept by their assignee gid, so that their pairs are never kept
+        return frozenset(ids.get(a["gid"], a["gid"]) for a in assignees)
+
+    # Members of completed one on ones already met, they are left out of the repair
+    completed = [_key(a) for a, _, done in one_on_ones if done and len(a) == 2]
+    met = set().union(*completed)
+    profiles = [
+        p
+        for p in participating_profiles(config, members_tasks)
+        if p.member_id not in met
+    ]
+    random.shuffle(profiles)
+    unmatched_id = _key([unmatched[0]]) if unmatched else None
+    if unmatched_id is not None:
+        prioritize_unmatched(profiles, next(iter(unmatched_id)))
+
+    open_one_on_ones = {
+        _key(a): gid for a, gid, done in one_on_ones if not (done and len(a) == 2)
+    }
+    matches = ConstructMatches(
+        profiles,
+        last_week_matches,
+        get_id,
+        get_custom_field_value,
+        week=week,
+        profiler=config.profile_matching,
+    )
+    phase_started = time.monotonic()
+    stats = matches.repair_matches(
+        [tuple(key) for key in open_one_on_ones if len(key) == 2],
+        week_match_data,
+    )
+    config.metrics.record_phase(MATCH, time.monotonic() - phase_started)
+    debug_print(config, "Rematch stats for project {}: {}".format(project_gid, stats))
+
+    pairs = list(zip(matches.matched_profiles[::2], matches.matched_profiles[1::2]))
+    keys = {frozenset([p1.member_id, p2.member_id]) for p1, p2 in pairs}
+    deleted = [gid for key, gid in open_one_on_ones.items() if key not in keys]
+    added = []
+    for p1, p2 in pairs:
+        if frozenset([p1.member_id, p2.member_id]) not in open_one_on_ones:
+            added.extend([p2.member, p1.member])
+    new_unmatched = matches.unmatched_member
+    unmatched_changed = (
+        _key([new_unmatched["assignee"]]) if new_unmatched else None
+    ) != unmatched_id
+    if unmatched and unmatched_changed:
+        deleted.append(unmatched[1])
+    debug_print(
+        config,
+        "Deleting {} and creating {} one on ones".format(len(deleted), len(added) // 2),
+    )
+
+    if not config.history_store:
+        # Checked before anything gets written
+        check_external_data_size(encode_external_data(matches.match_data), project_gid)
+
+    phase_started = time.monotonic()
+    for gid in deleted:
+        config.client.tasks.delete(gid)
+    # The journal keeps the tasks of the first run of the week, a rematch may create a task again
+    # that it deleted before. A rematch that got interrupted reads what was written from Asana.
+    failures = create_one_on_one_tasks(
+        config,
+        this_week["gid"],
+        added,
+        new_unmatched if unmatched_changed else None,
+        use_journal=False,
+    )
+
+    external_data = matches.match_data
+    if config.history_store:
+        member_id_pairs = [[p1.member_id, p2.member_id] for p1, p2 in pairs]
+        member_id_pairs.extend(list(key) for key in completed)
+        checksum = config.history_store.record_week(
+            project_gid,
+            week,
+            member_id_pairs,
+            external_data.get("unmatched"),
+            replace=True,
+        )
+        external_data = history_pointer(week, checksum)
+    if external_data != _match_data(this_week):
+        config.client.tasks.update(
+            this_week["gid"],
+            {"external": {"data": encode_external_data(external_data)}},
+        )
+    config.metrics.record_phase(WRITE, time.monotonic() - phase_started)
+    if failures:
+        raise Exception(
+            "Could not create {} of the rematched one on one tasks: {}".format(
+                len(failures),
+                "; ".join("{} ({})".format(task, e) for task, e in failures),
+            )
+        )
+    return len(deleted), len(added) // 2
+
+
+def run_for_a_single_project(config, project_id, plan=None, rematch=False):
+    """
+    :param plan: A Plan to add the project's plan to instead of writing the one on ones to Asana
+    :param rematch: Repair this week's one on ones instead of creating them, see rematch_random_one_on_one
+    """
+    with config.metrics.project(project_id):
+        sections = fetch_sections(config, project_id)
+        members_section, upcoming_section = get_member_and_upcoming_sections(sections)
+        if not (members_section and upcoming_section):
+            raise Exception("Missing required sections 'Members' and 'Upcoming'")
+        if rematch:
+            rematch_random_one_on_one(
+                config, project_id, members_section, upcoming_section
+            )
+            return
+        if plan is None:
+            generate_random_one_on_one(
+                config, project_id, members_section, upcoming_section
+            )
+            return
+        project_plan = plan_random_one_on_one(
             config, project_id, members_section, upcoming_section
         )
+        if project_plan is not None:
+            plan.add(project_plan)
+
+
+ERROR_MESSAGE = ":anguished: Could not create this weeks one on one! Reason:\n{}."
+
+
+def comment_error(config, gid, error, comments):
+    """
+    Comments the error on the task assigned to the bot. With the batch API the comment is added to
+    comments instead, to be sent along with the error report.
+    """
+    debug_print(config, gid, error)
+    if config.use_batch_api:
+        comments.append(add_comment_action(gid, {"text": error}))
     else:
-        raise Exception("Missing required sections 'Members' and 'Upcoming'")
+        config.client.tasks.add_comment(gid, {"text": error})
 
 
-def run_for_all_projects(config):
+def run_for_all_projects(config, plan=None, rematch=False):
+    """
+    :param plan: A Plan to add every project's plan to instead of writing the one on ones to Asana.
+     Errors are kept in the plan too, they are reported when the plan gets applied.
+    :param rematch: Repair this week's one on ones instead of creating them, see rematch_random_one_on_one
+    """
     # errors will get created as tasks in the "Random one on one Bot (1:1 Feedback)" project
     errors = {}
 
-    # Find all the tasks assigned to the random 1:1 bot across all projects
-    tasks = config.client.tasks.find_all(
-        params={
-            "assignee": config.user_gid,
-            "workspace": config.work_space_gid,
-            "completed_since": "now",
-        }
-    )
-    projects_finished = {}
-    error_msg = ":anguished: Could not create this weeks one on one! Reason:\n{}."
+    manifest = config.discovery_manifest
+    if config.discover:
+        # Only the bot's tasks with the expected name are found, along with their projects
+        listing = DISCOVERY_TASKS
+        tasks = search_bot_tasks(
+            config.client,
+            config.work_space_gid,
+            config.user_gid,
+            config.manage_one_on_one_project_expected_task_name,
+            DISCOVERY_TASKS.opt_fields,
+        )
+    else:
+        # Find all the tasks assigned to the random 1:1 bot across all projects. The bot can have
+        # lots of tasks, they are checked as their pages arrive instead of being fetched all at once.
+        listing = BOT_TASKS
+        tasks = stream_collection(
+            config.client,
+            "/tasks",
+            {
+                "assignee": config.user_gid,
+                "workspace": config.work_space_gid,
+                "completed_since": "now",
+            },
+            config.page_size,
+            opt_fields=BOT_TASKS.opt_fields,
+        )
+    # With the batch API the comments are sent along with the error report
+    comments = []
 
     def report_error_to_task(gid, msg):
-        error = error_msg.format(msg)
-        debug_print(config, gid, error)
-        config.client.tasks.add_comment(gid, {"text": error})
+        if manifest is not None:
+            # Looked up again next time
+            manifest.forget(next((p for p, t in projects.items() if t == gid), None))
+        error = ERROR_MESSAGE.format(msg)
         errors[gid] = error
+        if plan is None:
+            comment_error(config, gid, error, comments)
 
-    for task in tasks:
-        # Make sure that bot should be managing 1:1 tasks in this project. Safeguarded by a named
-        # task assigned to the bot.
-        if task["name"] == config.manage_one_on_one_project_expected_task_name:
-            task_detailed = config.client.tasks.find_by_id(task["gid"])
-            if len(task_detailed["projects"]) > 1:
-                report_error_to_task(
-                    task["gid"],
-                    "Task lives in more than 1 project.\n"
-                    "If someone completes this task it would stop one on ones from happening in all those projects.\n"
-                    "Please, only have one task assigned to me per project",
-                )
-            elif len(task_detailed["projects"]) == 0:
-                report_error_to_task(
-                    task["gid"], "Task doesn't live inside a project :mag:"
-                )
-            else:
-                project_gid = task_detailed["projects"].pop()["gid"]
-                if projects_finished.get(project_gid):
+    # Project gid to the gid of the task assigned to the bot in that project
+    projects = {}
+    # Only the listing's pages count towards the call site, the error comments are writes
+    with config.metrics.call_site(listing.name):
+        for task in tasks:
+            # Make sure that bot should be managing 1:1 tasks in this project. Safeguarded by a named
+            # task assigned to the bot.
+            if task["name"] == config.manage_one_on_one_project_expected_task_name:
+                task_detailed = task
+                if "projects" not in task:
+                    with config.metrics.call_site(BOT_TASK_PROJECTS.name):
+                        task_detailed = config.client.tasks.find_by_id(
+                            task["gid"], opt_fields=BOT_TASK_PROJECTS.opt_fields
+                        )
+                if len(task_detailed["projects"]) > 1:
                     report_error_to_task(
                         task["gid"],
-                        "Already generated this weeks one on one for this project, do I have 2 tasks in this project? :thinking_face:",
+                        "Task lives in more than 1 project.\n"
+                        "If someone completes this task it would stop one on ones from happening in all those projects.\n"
+                        "Please, only have one task assigned to me per project",
                     )
-                    continue
-                sections = [
-                    s for s in config.client.sections.find_by_project(project_gid)
-                ]
-                members_section, upcoming_section = get_member_and_upcoming_sections(
-                    sections
-                )
-                if members_section and upcoming_section:
-                    generate_random_one_on_one(
-                        config, project_gid, members_section, upcoming_section
+                elif len(task_detailed["projects"]) == 0:
+                    report_error_to_task(
+                        task["gid"], "Task doesn't live inside a project :mag:"
                     )
-                    projects_finished[project_gid] = True
                 else:
-                    report_error_to_task(
-                        task["gid"],
-                        "Missing required sections 'Members' and 'Upcoming'",
+                    project_gid = task_detailed["projects"].pop()["gid"]
+                    if projects.get(project_gid):
+                        report_error_to_task(
+                            task["gid"],
+                            "Already generated this weeks one on one for this project, do I have 2 tasks in this project? :thinking_face:",
+                        )
+                        continue
+                    projects[project_gid] = task["gid"]
+
+    if manifest is not None:
+        manifest.retain(projects)
+
+    def _fetch_project(project_gid):
+        with config.metrics.phase(FETCH):
+            known = (
+                manifest.sections(project_gid, projects[project_gid])
+                if manifest is not None
+                else None
+            )
+            if known is not None:
+                members_section, upcoming_section = known
+                try:
+                    members_tasks = fetch_members_tasks(
+                        config, members_section, project_gid
                     )
-    if len(errors):
-        report_errors(config, errors)
+                    return project_gid, members_section, upcoming_section, members_tasks
+                except NotFoundError:
+                    # The members section got deleted since, its sections are looked up again
+                    manifest.forget(project_gid)
+            sections = fetch_sections(config, project_gid)
+            members_section, upcoming_section = get_member_and_upcoming_sections(
+                sections
+            )
+            if not (members_section and upcoming_section):
+                raise Exception("Missing required sections 'Members' and 'Upcoming'")
+            if manifest is not None:
+                manifest.record(
+                    project_gid,
+                    projects[project_gid],
+                    members_section,
+                    upcoming_section,
+                )
+            members_tasks = fetch_members_tasks(config, members_section, project_gid)
+        return project_gid, members_section, upcoming_section, members_tasks
+
+    def _generate(project_gid, members_section, upcoming_section, members_tasks):
+        if rematch:
+            rematch_random_one_on_one(
+                config, project_gid, members_section, upcoming_section, members_tasks
+            )
+            return
+        if plan is None:
+            generate_random_one_on_one(
+                config, project_gid, members_section, upcoming_section, members_tasks
+            )
+            return
+        project_plan = plan_random_one_on_one(
+            config, project_gid, members_section, upcoming_section, members_tasks
+        )
+        if project_plan is not None:
+            project_plan.task_gid = projects[project_gid]
+            plan.add(project_plan)
 
+    # An error in one project is reported to its task and doesn't stop the other projects
+    with ThreadPoolExecutor(max_workers=config.project_concurrency) as executor:
+        fetched = [
+            executor.submit(config.metrics.in_project(gid, _fetch_project), gid)
+            for gid in projects
+        ]
+        ready = []
+        for project_gid, future in zip(projects, fetched):
+            try:
+                ready.append(future.result())
+            except Exception as e:
+                report_error_to_task(projects[project_gid], e)
 
-def report_errors(config, errors):
-    if not config.error_project_gid:
-        return
+        # Largest projects first, so that a large project doesn't end up running alone at the end
+        ready.sort(key=lambda project: len(project[3]), reverse=True)
+        generated = [
+            executor.submit(config.metrics.in_project(project[0], _generate), *project)
+            for project in ready
+        ]
+        for project, future in zip(ready, generated):
+            try:
+                future.result()
+            except Exception as e:
+                report_error_to_task(projects[project[0]], e)
+
+    if plan is not None:
+        plan.errors.update(errors)
+    elif len(errors):
+        report_errors(config, errors, actions=comments)
+
+
+def apply_plan(config, plan, plan_path=None):
+    """
+    Writes the one on ones of a Plan to Asana and reports the errors it ran into. Progress is saved
+    to plan_path as it goes, so that applying it again resumes where it stopped. Projects that
+    failed are not retried, some of their one on ones may have been created.
+    """
+    if plan.week_key != config.week_key or plan.week_number != config.week_number:
+        raise Exception(
+            "The plan was made for week {} but this is week {}".format(
+                plan.week_number, config.week_number
+            )
+        )
+    this_weeks_name = "[{}] weeks Random 1:1".format(config.week_number)
+    for project_plan in plan.pending():
+        if project_plan.weekly_task_name != this_weeks_name:
+            raise Exception(
+                "The plan of project {} is for the weekly task {} but this week's is {}".format(
+                    project_plan.project_gid,
+                    project_plan.weekly_task_name,
+                    this_weeks_name,
+                )
+            )
+
+    def _save():
+        if plan_path:
+            plan.save(plan_path)
 
-    error_list = ""
-    for gid, err in errors.items():
-        error_list += f'\n <li><a data-asana-gid="{gid}" /> - {err}</li>'
-    config.client.tasks.create_in_workspace(
-        config.work_space_gid,
-        {
+    errors = {}
+    comments = []
+    if not plan.errors_reported:
+        for gid, error in plan.errors.items():
+            errors[gid] = error
+            comment_error(config, gid, error, comments)
+
+    pending = plan.pending()
+    new = [p for p in pending if p.weekly_task_gid is None]
+    if config.use_batch_api and new:
+        # The weekly tasks of all projects in as few requests as possible
+        results = BatchWriter(config.client, config.write_concurrency).execute(
+            [
+                create_task_action(
+                    dict(weekly_task_data(p), workspace=config.work_space_gid)
+                )
+                for p in new
+            ]
+        )
+        for project_plan, result in zip(new, results):
+            if isinstance(result, Exception):
+                # Tried again on its own by apply_project_plan
+                debug_print(config, "Failed to create weekly task", result)
+            else:
+                project_plan.weekly_task_gid = result.get("gid")
+        _save()
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=config.project_concurrency) as executor:
+        futures = {
+            executor.submit(
+                config.metrics.in_project(p.project_gid, apply_project_plan),
+                config,
+                p,
+                _save,
+            ): p
+            for p in pending
+        }
+        for future in as_completed(futures):
+            project_plan = futures[future]
+            if future.exception() is not None:
+                project_plan.status = FAILED
+                project_plan.error = str(future.exception())
+                if project_plan.task_gid:
+                    error = ERROR_MESSAGE.format(project_plan.error)
+                    errors[project_plan.task_gid] = error
+                    comment_error(config, project_plan.task_gid, error, comments)
+                else:
+                    failed.append(project_plan)
+            _save()
+
+    if len(errors):
+        report_errors(config, errors, actions=comments)
+    plan.errors_reported = True
+    _save()
+    if failed:
+        raise Exception(
+            "Could not apply the plan of {}".format(
+                "; ".join("{} ({})".format(p.project_gid, p.error) for p in failed)
+            )
+        )
+
+
+def report_errors(config, errors, actions=()):
+    """
+    :param errors: A dict of task gid to error message
+    :param actions: Other BatchActions to send along with the error report when using the batch API
+    """
+    actions = list(actions)
+    if config.error_project_gid:
+        error_list = ""
+        for gid, err in errors.items():
+            error_list += f'\n <li><a data-asana-gid="{gid}" /> - {err}</li>'
+        error_report = {
             "name": f"Errors creating random one on ones in week [{config.week_number}]",
             "html_notes": f"<body><em>Encountered error in these 1:1 projects:</em> <ul>{error_list}</ul></body>",
             "projects": [config.error_project_gid],
-        },
-    )
+        }
+        if config.use_batch_api:
+            error_report["workspace"] = config.work_space_gid
+            actions.append(create_task_action(error_report))
+        else:
+            config.client.tasks.create_in_workspace(config.work_space_gid, error_report)
+
+    if actions:
+        results = BatchWriter(config.client, config.write_concurrency).execute(actions)
+        for result in results:
+            if isinstance(result, Exception):
+                debug_print(config, "Failed to report error", result)
 
 
 def main(
@@ -351,8 +1488,41 @@ def main(
     error_project_gid=None,
     debug=False,
     use_name_as_id=False,
+    strategy=GREEDY,
+    history_weeks=DEFAULT_HISTORY_WEEKS,
+    history_path=None,
+    rebuild_history=False,
+    write_concurrency=DEFAULT_WRITE_CONCURRENCY,
+    use_batch_api=False,
+    project_concurrency=DEFAULT_PROJECT_CONCURRENCY,
+    requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+    max_concurrent_requests=DEFAULT_MAX_CONCURRENCY,
+    pool_size=None,
+    request_timeout=DEFAULT_REQUEST_TIMEOUT,
+    base_url=None,
+    metrics_path=None,
+    profile_matching=None,
+    plan_path=None,
+    apply_path=None,
+    member_mirror_path=None,
+    page_size=DEFAULT_PAGE_SIZE,
+    journal_path=None,
+    rematch=False,
+    best_of=1,
+    match_budget=DEFAULT_MATCH_BUDGET,
+    discover=False,
+    discovery_path=None,
 ):
 
+    if plan_path and apply_path:
+        raise Exception("Either plan or apply a plan, not both")
+    if rematch and (plan_path or apply_path):
+        raise Exception("A rematch can't be planned or applied")
+    check_page_size(page_size)
+    if best_of < 1:
+        raise Exception("Need at least one matching to keep the best of")
+    if rebuild_history and not history_path:
+        raise Exception("Rebuilding the match history needs a history path")
     if any([user_gid, task_name]):
         if project_gid:
             raise Exception(
@@ -362,8 +1532,32 @@ def main(
             raise Exception("Missing user_gid needed to discover projects")
         if not task_name:
             raise Exception("Missing task_name needed to discover projects")
+    elif discover or discovery_path:
+        raise Exception("Discovering projects needs user_gid and task_name")
 
-    asana_client = asana.Client.access_token(pat)
+    # Every request of every worker goes through the same rate limiter
+    rate_limiter = RateLimiter(requests_per_minute, max_concurrent_requests)
+    asana_client = Client.access_token(pat)
+    asana_client.rate_limiter = rate_limiter
+    metrics = RunMetrics()
+    asana_client.metrics = metrics
+    if base_url:
+        # e.g. a FakeAsanaServer for benchmarks
+        asana_client.options["base_url"] = base_url
+    # One connection for every request that can be in flight
+    pool_size = pool_size or max_concurrent_requests
+    asana_client.configure_pool(pool_size, request_timeout)
+    history_store = MatchHistoryStore(history_path) if history_path else None
+    # Workers of the best of K matchings of all projects, at most one per core
+    match_pool = (
+        MatchPool(min(best_of - 1, os.cpu_count() or 1)) if best_of > 1 else None
+    )
+    member_mirror = MemberMirror(member_mirror_path) if member_mirror_path else None
+    discovery_manifest = (
+        DiscoveryManifest(discovery_path, work_space_gid, user_gid, task_name)
+        if discovery_path
+        else None
+    )
     config = Config(
         asana_client,
         work_space_gid,
@@ -372,9 +1566,74 @@ def main(
         error_project_gid,
         debug,
         use_name_as_id,
+        strategy=strategy,
+        history_weeks=history_weeks,
+        history_store=history_store,
+        rebuild_history=rebuild_history,
+        write_concurrency=write_concurrency,
+        use_batch_api=use_batch_api,
+        project_concurrency=project_concurrency,
+        pool_size=pool_size,
+        request_timeout=request_timeout,
+        metrics=metrics,
+        profile_matching=profile_matching,
+        member_mirror=member_mirror,
+        page_size=page_size,
+        best_of=best_of,
+        match_budget=match_budget,
+        match_pool=match_pool,
+        discover=discover or discovery_manifest is not None,
+        discovery_manifest=discovery_manifest,
     )
+    if journal_path:
+        config.write_journal = WriteJournal(journal_path, config.week_key)
+        config.write_journal.prune()
 
-    if project_gid:
-        run_for_a_single_project(config, project_gid)
-    else:
-        run_for_all_projects(config)
+    try:
+        if apply_path:
+            apply_plan(config, Plan.load(apply_path), apply_path)
+        elif plan_path:
+            plan = Plan(config.week_number, config.week_key)
+            if project_gid:
+                run_for_a_single_project(config, project_gid, plan)
+            else:
+                run_for_all_projects(config, plan)
+            plan.save(plan_path)
+        elif project_gid:
+            run_for_a_single_project(config, project_gid, rematch=rematch)
+        else:
+            run_for_all_projects(config, rematch=rematch)
+    finally:
+        debug_print(
+            config,
+            "Seconds waiting for rate limiter: {:.2f}, throttled {} times, ended at concurrency {}".format(
+                rate_limiter.wait_time,
+                rate_limiter.throttled_count,
+                rate_limiter.concurrency,
+            ),
+        )
+        summary = metrics.to_dict()
+        debug_print(
+            config,
+            "Requests: {}, seconds per phase: {}".format(
+                summary["requests"], summary["phases"]
+            ),
+        )
+        if member_mirror:
+            debug_print(
+                config,
+                "Member syncs: {} incremental, {} full".format(
+                    member_mirror.incremental_syncs, member_mirror.full_syncs
+                ),
+            )
+            member_mirror.close()
+        if config.write_journal:
+            config.write_journal.close()
+        if history_store:
+            history_store.close()
+        if match_pool:
+            match_pool.close()
+        if discovery_manifest:
+            discovery_manifest.save()
+        if metrics_path:
+            metrics.write(metrics_path)
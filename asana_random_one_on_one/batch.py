@@ -0,0 +1,105 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from asana_random_one_on_one.metrics import in_current_context
+
+# Asana accepts at most 10 actions in a single /batch request
+MAX_BATCH_ACTIONS = 10
+
+
+class BatchActionError(Exception):
+    def __init__(self, action, status_code, body):
+        errors = (body or {}).get("errors") or [{}]
+        super(BatchActionError, self).__init__(
+            "{} {} failed with {}: {}".format(
+                action.method.upper(),
+                action.relative_path,
+                status_code,
+                errors[0].get("message"),
+            )
+        )
+        self.action = action
+        self.status_code = status_code
+        self.body = body
+
+
+class BatchAction(object):
+    __slots__ = ("method", "relative_path", "data")
+
+    def __init__(self, method, relative_path, data=None):
+        self.method = method
+        self.relative_path = relative_path
+        self.data = data
+
+    def to_dict(self):
+        action = {"method": self.method, "relative_path": self.relative_path}
+        if self.data is not None:
+            action["data"] = self.data
+        return action
+
+
+def create_subtask_action(parent_gid, data):
+    return BatchAction("post", "/tasks/{}/subtasks".format(parent_gid), data)
+
+
+def create_task_action(data):
+    return BatchAction("post", "/tasks", data)
+
+
+def add_project_action(task_gid, data):
+    return BatchAction("post", "/tasks/{}/addProject".format(task_gid), data)
+
+
+def add_comment_action(task_gid, data):
+    return BatchAction("post", "/tasks/{}/stories".format(task_gid), data)
+
+
+class BatchWriter(object):
+    def __init__(self, client, concurrency=1, batch_size=MAX_BATCH_ACTIONS):
+        """
+        Sends independent actions to Asana's /batch endpoint, batch_size actions per request.
+
+        :param client: An asana.Client
+        :param concurrency: Number of batch requests sent at the same time
+        """
+        self.client = client
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.request_count = 0
+
+    def _send(self, actions):
+        try:
+            # asana.Client doesn't register its BatchAPI resource, post to the endpoint directly
+            results = self.client.post(
+                "/batch", {"actions": [action.to_dict() for action in actions]}
+            )
+        except Exception as e:
+            # The whole batch failed, every action in it failed
+            return [e] * len(actions)
+        return [
+            (
+                result["body"]["data"]
+                if 200 <= result["status_code"] < 300
+                else BatchActionError(action, result["status_code"], result.get("body"))
+            )
+            for action, result in zip(actions, results)
+        ]
+
+    def execute(self, actions):
+        """
+        Actions in a single call can't depend on each other, actions that need the result of another
+        action have to be executed in a later call.
+
+        :param actions: A list of BatchActions
+        :return: A list with the result data of each action, or the exception it failed with
+        """
+        batches = [
+            actions[i : i + self.batch_size]
+            for i in range(0, len(actions), self.batch_size)
+        ]
+        self.request_count += len(batches)
+        if len(batches) <= 1 or self.concurrency <= 1:
+            results = [self._send(batch) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                results = list(executor.map(in_current_context(self._send), batches))
+        return [result for batch in results for result in batch]
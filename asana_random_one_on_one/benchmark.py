@@ -0,0 +1,107 @@
+"""
+Runs the bot for all projects of a generated workspace against a local FakeAsanaServer and reports
+the wall time and the requests it made.
+
+    python3 -m asana_random_one_on_one.benchmark --projects 200 --latency 0.05
+"""
+
+import argparse
+import json
+import os
+import time
+
+import asana_random_one_on_one as oneonone
+from asana_random_one_on_one.client import DEFAULT_REQUESTS_PER_MINUTE
+from asana_random_one_on_one.fake_asana import FakeAsanaServer, generate_workspace
+
+TASK_NAME = "Random one on one"
+BOT_GID = "bot"
+
+
+def run_benchmark(
+    projects=10,
+    members=(5, 50),
+    latency=0.0,
+    throttle_every=0,
+    retry_after=0,
+    seed=0,
+    **main_options
+):
+    """
+    :param main_options: Passed on to asana_random_one_on_one.main, e.g. use_batch_api
+    :return: A dict with the wall time in seconds, request counts per route and total
+    """
+    asana = generate_workspace(
+        projects=projects,
+        members=members,
+        bot_gid=BOT_GID,
+        task_name=TASK_NAME,
+        seed=seed,
+    )
+    # The fake server is plain http on localhost
+    os.environ.setdefault("OAUTHLIB_INSECURE_TRANSPORT", "1")
+    with FakeAsanaServer(
+        asana, latency=latency, throttle_every=throttle_every, retry_after=retry_after
+    ) as server:
+        started = time.monotonic()
+        oneonone.main(
+            "fake-pat",
+            asana.workspace_gid,
+            user_gid=BOT_GID,
+            task_name=TASK_NAME,
+            base_url=server.base_url,
+            **main_options
+        )
+        wall_time = time.monotonic() - started
+
+    return {
+        "projects": projects,
+        "wall_time": round(wall_time, 3),
+        "requests": sum(server.request_counts.values()),
+        "throttled": server.throttled_count,
+        "bytes": server.bytes_sent,
+        "requests_per_route": {
+            "{} {}".format(method, route): count
+            for (method, route), count in sorted(server.request_counts.items())
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark a run for all projects against a local fake Asana"
+    )
+    parser.add_argument("--projects", type=int, default=10)
+    parser.add_argument("--min-members", type=int, default=5)
+    parser.add_argument("--max-members", type=int, default=50)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds each request takes"
+    )
+    parser.add_argument(
+        "--throttle-every",
+        type=int,
+        default=0,
+        help="Answer every nth request with 429 Too Many Requests",
+    )
+    parser.add_argument("--retry-after", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--write-concurrency", type=int, default=8)
+    parser.add_argument("--project-concurrency", type=int, default=1)
+    parser.add_argument(
+        "--requests-per-minute", type=int, default=DEFAULT_REQUESTS_PER_MINUTE
+    )
+    parser.add_argument("--use-batch-api", action="store_true")
+    args = parser.parse_args()
+    report = run_benchmark(
+        projects=args.projects,
+        members=(args.min_members, args.max_members),
+        latency=args.latency,
+        throttle_every=args.throttle_every,
+        retry_after=args.retry_after,
+        seed=args.seed,
+        write_concurrency=args.write_concurrency,
+        project_concurrency=args.project_concurrency,
+        use_batch_api=args.use_batch_api,
+        requests_per_minute=args.requests_per_minute,
+    )
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,242 @@
+import multiprocessing
+import os
+import random
+import threading
+import time
+
+from asana_random_one_on_one.construct_matches import ConstructMatches
+from asana_random_one_on_one.member_profiles import (
+    NO_TEAM_CODE,
+    MemberProfile,
+    compatible_profiles,
+)
+
+# Seconds the other matchings of a best of K matching get, the first one always completes
+DEFAULT_MATCH_BUDGET = 10.0
+
+
+class MatchScore(object):
+    def __init__(
+        self, pairs=0, valid_pairs=0, repeats=0, cross_team_pairs=0, prioritized=True
+    ):
+        """
+        How good a week's matches are. Scores are compared by key, the first difference decides.
+
+        :param pairs: Number of pairs
+        :param valid_pairs: Pairs with compatible match preferences that didn't get matched last time
+        :param repeats: Pairs that got matched last time as well
+        :param cross_team_pairs: Pairs of members from different teams
+        :param prioritized: Whether last time's unmatched member didn't end up unmatched again
+        """
+        self.pairs = pairs
+        self.valid_pairs = valid_pairs
+        self.repeats = repeats
+        self.cross_team_pairs = cross_team_pairs
+        self.prioritized = prioritized
+
+    @property
+    def key(self):
+        return (
+            self.valid_pairs,
+            -self.repeats,
+            self.prioritized,
+            self.cross_team_pairs,
+        )
+
+    @property
+    def cross_team_ratio(self):
+        return self.cross_team_pairs / self.pairs if self.pairs else 0.0
+
+    def to_dict(self):
+        return {
+            "pairs": self.pairs,
+            "valid_pairs": self.valid_pairs,
+            "repeats": self.repeats,
+            "cross_team_ratio": round(self.cross_team_ratio, 3),
+            "prioritized": self.prioritized,
+        }
+
+    def __str__(self):
+        return " ".join(
+            "{}={}".format(key, value) for key, value in self.to_dict().items()
+        )
+
+
+def score_matches(matches, unmatched_id=None):
+    """
+    :param matches: A ConstructMatches that constructed its matches
+    :param unmatched_id: Id of last time's unmatched member, see prioritize_unmatched
+    :return: The MatchScore of the matches
+    """
+    score = MatchScore()
+    profiles = matches.matched_profiles
+    for p1, p2 in zip(profiles[::2], profiles[1::2]):
+        score.pairs += 1
+        repeat = matches.got_matched_last_time(p1, p2)
+        score.repeats += repeat
+        score.valid_pairs += not repeat and compatible_profiles(p1, p2)
+        score.cross_team_pairs += (
+            p1.team != NO_TEAM_CODE and p2.team != NO_TEAM_CODE and p1.team != p2.team
+        )
+    unmatched = matches.unmatched_profile
+    score.prioritized = not (
+        unmatched_id and unmatched is not None and unmatched.member_id == unmatched_id
+    )
+    return score
+
+
+def seeded_matches(
+    profiles, previous_matches, member_id, get_custom_field_value, seed, **options
+):
+    """
+    A ConstructMatches of the profiles shuffled with the given seed, which also seeds its random
+    choices. Last time's unmatched member keeps its priority.
+
+    :param options: Other ConstructMatches arguments, e.g. strategy
+    """
+    rng = random.Random(seed)
+    profiles = list(profiles)
+    rng.shuffle(profiles)
+    unmatched_id = previous_matches.get("unmatched")
+    for i, profile in enumerate(profiles):
+        if unmatched_id and profile.member_id == unmatched_id:
+            profiles.append(profiles.pop(i))
+            break
+    return ConstructMatches(
+        profiles,
+        previous_matches,
+        member_id,
+        get_custom_field_value,
+        rng=rng,
+        **options
+    )
+
+
+def _score_seed(profiles, previous_matches, seed, options, deadline):
+    # Runs in a worker process, the profiles are compiled so member_id is never called. A matching
+    # that only gets its turn after the budget ran out, e.g. behind other projects', is skipped.
+    if time.time() > deadline:
+        return seed, None
+    matches = seeded_matches(profiles, previous_matches, None, None, seed, **options)
+    matches.construct_matches()
+    return seed, score_matches(matches, previous_matches.get("unmatched"))
+
+
+def _pool(processes):
+    # The parent runs threads, e.g. to prefetch pages, forking it could deadlock the workers
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context(
+        "forkserver" if "forkserver" in methods else "spawn"
+    ).Pool(processes)
+
+
+class MatchPool(object):
+    def __init__(self, processes=None):
+        """
+        Worker processes shared by the best of K matchings of a run, so that projects matched at the
+        same time don't each start workers of their own. The workers get started by the first
+        matching that needs them, that time counts against its budget.
+
+        :param processes: Number of worker processes, defaults to one per core
+        """
+        self.processes = processes or os.cpu_count() or 1
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def apply_async(self, func, args):
+        with self._lock:
+            if self._pool is None:
+                self._pool = _pool(self.processes)
+            return self._pool.apply_async(func, args)
+
+    def close(self):
+        """Terminates the workers, along with matchings still running"""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool.join()
+                self._pool = None
+
+
+def best_of_k_matches(
+    profiles,
+    previous_matches,
+    member_id,
+    get_custom_field_value,
+    k,
+    budget=DEFAULT_MATCH_BUDGET,
+    pool=None,
+    **options
+):
+    """
+    Runs k independently seeded matchings of the members and keeps the one with the best MatchScore.
+    The first matching uses the profiles in the given order and runs in this process, the others
+    run in a MatchPool meanwhile. Matchings not done within budget seconds are dropped, the ones
+    that haven't started by then are skipped by the workers. The best one gets constructed again in
+    this process from its seed, the workers only send back scores.
+
+    :param profiles: MemberProfiles in priority order, see ConstructMatches
+    :param k: Number of matchings
+    :param pool: The run's MatchPool, defaults to one of its own with one worker per core up to
+        k - 1, terminated when done
+    :param options: Other ConstructMatches arguments, e.g. strategy
+    :return: (the ConstructMatches of the best matches, its MatchScore, number of matchings scored)
+    """
+    deadline = time.monotonic() + budget
+    unmatched_id = previous_matches.get("unmatched")
+    own_pool = None
+    results = []
+    if k > 1:
+        # Workers don't need the member tasks, only what matching compares
+        compiled = [
+            MemberProfile(None, p.index, p.member_id, p.team, p.preference, p.frequency)
+            for p in profiles
+        ]
+        worker_options = dict(options, profiler=None)
+        if pool is None:
+            pool = own_pool = MatchPool(min(k - 1, os.cpu_count() or 1))
+        # Workers are other processes, they only share the wall clock
+        worker_deadline = time.time() + budget
+        results = [
+            pool.apply_async(
+                _score_seed,
+                (compiled, previous_matches, seed, worker_options, worker_deadline),
+            )
+            for seed in range(1, k)
+        ]
+    try:
+        best = ConstructMatches(
+            profiles, previous_matches, member_id, get_custom_field_value, **options
+        )
+        best.construct_matches()
+        best_score = score_matches(best, unmatched_id)
+        best_seed = None
+        scored = 1
+        for result in results:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                seed, score = result.get(remaining)
+            except multiprocessing.TimeoutError:
+                break
+            if score is None:
+                continue
+            scored += 1
+            if score.key > best_score.key:
+                best_seed, best_score = seed, score
+    finally:
+        if own_pool is not None:
+            own_pool.close()
+
+    if best_seed is not None:
+        best = seeded_matches(
+            profiles,
+            previous_matches,
+            member_id,
+            get_custom_field_value,
+            best_seed,
+            **options
+        )
+        best.construct_matches()
+    return best, best_score, scored
@@ -0,0 +1,90 @@
+from collections import deque
+
+
+def maximum_matching(count, neighbors, order=None):
+    """
+    Maximum-cardinality matching of a general graph using Edmonds' blossom algorithm.
+
+    :param count: Number of vertices, vertices are 0..count-1
+    :param neighbors: A function that takes a vertex and returns an iterable of its neighbors.
+     The graph must be undirected, if a is a neighbor of b then b is a neighbor of a.
+    :param order: Vertices in the order they should get a match, defaults to 0..count-1. A vertex that
+     got matched stays matched, so earlier vertices are preferred when not everyone can get a match.
+    :return: A list where item v is the vertex matched with v, or -1 if v is unmatched
+    """
+    order = range(count) if order is None else order
+    mate = [-1] * count
+
+    # A greedy matching first, so that the blossom search only starts from the few vertices left
+    for v in order:
+        if mate[v] == -1:
+            for to in neighbors(v):
+                if to != v and mate[to] == -1:
+                    mate[v], mate[to] = to, v
+                    break
+
+    for root in order:
+        if mate[root] != -1:
+            continue
+        v, parent = _find_augmenting_path(count, neighbors, mate, root)
+        # Flip the matched and unmatched edges along the path ending in v
+        while v != -1:
+            pv = parent[v]
+            ppv = mate[pv]
+            mate[v], mate[pv] = pv, v
+            v = ppv
+    return mate
+
+
+def _find_augmenting_path(count, neighbors, mate, root):
+    used = [False] * count
+    parent = [-1] * count
+    base = list(range(count))
+
+    def lowest_common_ancestor(a, b):
+        seen = [False] * count
+        while True:
+            a = base[a]
+            seen[a] = True
+            if mate[a] == -1:
+                break
+            a = parent[mate[a]]
+        while True:
+            b = base[b]
+            if seen[b]:
+                return b
+            b = parent[mate[b]]
+
+    def mark_path(v, b, child, blossom):
+        while base[v] != b:
+            blossom[base[v]] = blossom[base[mate[v]]] = True
+            parent[v] = child
+            child = mate[v]
+            v = parent[mate[v]]
+
+    used[root] = True
+    queue = deque([root])
+    while queue:
+        v = queue.popleft()
+        for to in neighbors(v):
+            if base[v] == base[to] or mate[v] == to:
+                continue
+            if to == root or (mate[to] != -1 and parent[mate[to]] != -1):
+                # Found an odd cycle, contract it into a blossom
+                current_base = lowest_common_ancestor(v, to)
+                blossom = [False] * count
+                mark_path(v, current_base, to, blossom)
+                mark_path(to, current_base, v, blossom)
+                for i in range(count):
+                    if blossom[base[i]]:
+                        base[i] = current_base
+                        if not used[i]:
+                            used[i] = True
+                            queue.append(i)
+            elif parent[to] == -1:
+                parent[to] = v
+                if mate[to] == -1:
+                    return to, parent
+                used[mate[to]] = True
+                queue.append(mate[to])
+    return -1, parent
@@ -0,0 +1,182 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+import asana
+import requests
+from asana import error
+from requests.adapters import HTTPAdapter
+
+# Asana allows 1500 requests per minute for paid workspaces
+DEFAULT_REQUESTS_PER_MINUTE = 1500
+# Asana allows 15 concurrent write requests per user
+DEFAULT_MAX_CONCURRENCY = 15
+# Seconds to wait for Asana to respond before giving up on a request
+DEFAULT_REQUEST_TIMEOUT = 30
+
+
+class RateLimiter(object):
+    def __init__(
+        self,
+        requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+    ):
+        """
+        Token bucket shared by every worker using the same client, with a limit on requests in flight.
+        The limit on requests in flight is halved every time Asana throttles a request and grows back
+        by one after every max_concurrency successful requests.
+        """
+        self.rate = requests_per_minute / 60.0
+        self.burst = max(1, min(max_concurrency, requests_per_minute))
+        self.max_concurrency = max_concurrency
+        self.concurrency = max_concurrency
+        self.in_flight = 0
+        self.throttled_count = 0
+        # Total seconds requests spent waiting for the limiter
+        self.wait_time = 0.0
+
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    def _refill(self, now):
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._last_refill) * self.rate
+        )
+        self._last_refill = now
+
+    def acquire(self):
+        started = time.monotonic()
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    delay = self._paused_until - now
+                elif self.in_flight >= self.concurrency:
+                    delay = None
+                elif self._tokens < 1:
+                    delay = (1 - self._tokens) / self.rate
+                else:
+                    break
+                self._condition.wait(delay)
+            self._tokens -= 1
+            self.in_flight += 1
+            self.wait_time += time.monotonic() - started
+
+    def release(self, throttled=False):
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.concurrency = max(1, self.concurrency // 2)
+                self._successes = 0
+            else:
+                self._successes += 1
+                if (
+                    self._successes >= self.max_concurrency
+                    and self.concurrency < self.max_concurrency
+                ):
+                    self.concurrency += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
+    def pause(self, seconds):
+        """Stops every worker from sending requests for the given number of seconds"""
+        with self._condition:
+            self.throttled_count += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._condition.notify_all()
+
+
+class Client(asana.Client):
+    """
+    asana.Client that sends every request through a shared RateLimiter and handles Asana's
+    rate limit responses itself, honoring their Retry-After header. Every response is recorded in
+    the optional RunMetrics.
+    """
+
+    def __init__(
+        self, session=None, auth=None, rate_limiter=None, metrics=None, **options
+    ):
+        super(Client, self).__init__(session=session, auth=auth, **options)
+        self.rate_limiter = rate_limiter
+        self.metrics = metrics
+        self.session.hooks["response"].append(self._record_response)
+
+    def _record_response(self, response, *args, **kwargs):
+        if self.metrics is None:
+            return
+        base_path = urlparse(self.options["base_url"]).path
+        path = urlparse(response.request.url).path
+        if path.startswith(base_path):
+            path = path[len(base_path) :]
+        self.metrics.record_request(
+            response.request.method,
+            path,
+            response.elapsed.total_seconds(),
+            len(response.content),
+            error=response.status_code >= 400,
+        )
+
+    def _send(self, method, path, **options):
+        started = time.monotonic()
+        try:
+            return super(Client, self).request(method, path, **options)
+        except requests.exceptions.RequestException:
+            # No response to record, e.g. a timeout
+            if self.metrics is not None:
+                self.metrics.record_request(
+                    method, path, time.monotonic() - started, error=True
+                )
+            raise
+
+    def configure_pool(self, pool_size, timeout=None):
+        """
+        Keeps up to pool_size keep-alive connections open, so that TLS handshakes aren't paid for
+        every request. Workers wait for a free connection instead of opening extra ones.
+
+        :param pool_size: Should match the maximum number of requests in flight
+        :param timeout: Seconds to wait for a response, None to wait forever
+        """
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, pool_block=True
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(
+            {"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"}
+        )
+        self.options["timeout"] = timeout
+
+    def request(self, method, path, **options):
+        if self.rate_limiter is None:
+            return self._send(method, path, **options)
+
+        max_retries = self._merge_options(options)["max_retries"]
+        options["max_retries"] = 0
+        retry_count = 0
+        while True:
+            self.rate_limiter.acquire()
+            try:
+                result = self._send(method, path, **options)
+            except error.RateLimitEnforcedError as e:
+                self.rate_limiter.release(throttled=True)
+                if retry_count >= max_retries:
+                    raise e
+                self.rate_limiter.pause(e.retry_after or 0)
+                retry_count += 1
+                continue
+            except error.RetryableAsanaError as e:
+                self.rate_limiter.release()
+                if retry_count >= max_retries:
+                    raise e
+                time.sleep(self.RETRY_DELAY * (self.RETRY_BACKOFF**retry_count))
+                retry_count += 1
+                continue
+            except Exception:
+                self.rate_limiter.release()
+                raise
+            self.rate_limiter.release()
+            return result
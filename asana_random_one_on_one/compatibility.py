@@ -0,0 +1,131 @@
+from asana_random_one_on_one.member_profiles import (
+    NO_TEAM_CODE,
+    PREFERENCE_OTHER_TEAMS,
+    PREFERENCE_SAME_TEAM,
+    compatible_profiles,
+)
+
+
+def lowest_bit(mask):
+    """Returns the position of the lowest set bit in mask, or -1 if no bit is set"""
+    return (mask & -mask).bit_length() - 1
+
+
+def bits(mask):
+    """Yields the positions of all set bits in mask, lowest first"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class CompatibilityIndex(object):
+    def __init__(self, profiles, id_codes, previous_match_codes):
+        """
+        Packed bitset per member of the members it can be matched with. Bit j of row i is set when
+        profiles i and j have compatible match preferences and did not get matched last time.
+
+        Members with the same team and preference share a bucket row, the members they have
+        compatible match preferences with. Searching for a match only needs that bucket row, the
+        few members excluded by last time's matches are skipped one by one. Rows of single members
+        are only built for the strategies that need them, they take n² bits for n members.
+
+        :param profiles: A list of MemberProfiles, where each profile's index is its position in the list
+        :param id_codes: Interned member id for each profile
+        :param previous_match_codes: Interned member id of each profile's previous match, -1 for none
+        """
+        self._profiles = profiles
+        self._id_codes = id_codes
+        self._previous_match_codes = previous_match_codes
+        self._rows = [None] * len(profiles)
+        self._preference_rows = {}
+
+        # Members grouped by team and preference, used to build rows for a whole group at once
+        self._no_team = 0
+        self._teamed_only_same_team = 0
+        self._teams = {}
+        self._teams_only_other_teams = {}
+        # Indexes of members grouped by interned id and by interned id of previous match. Kept as
+        # lists, a bitset with a single high bit set takes as much memory as a whole row.
+        self._by_id = {}
+        self._by_previous_match = {}
+        for p in profiles:
+            bit = 1 << p.index
+            if p.team == NO_TEAM_CODE:
+                self._no_team |= bit
+            else:
+                self._teams[p.team] = self._teams.get(p.team, 0) | bit
+                if p.preference == PREFERENCE_SAME_TEAM:
+                    self._teamed_only_same_team |= bit
+                elif p.preference == PREFERENCE_OTHER_TEAMS:
+                    self._teams_only_other_teams[p.team] = (
+                        self._teams_only_other_teams.get(p.team, 0) | bit
+                    )
+            self._by_id.setdefault(id_codes[p.index], []).append(p.index)
+            previous = previous_match_codes[p.index]
+            if previous != -1:
+                self._by_previous_match.setdefault(previous, []).append(p.index)
+        self._all = (1 << len(profiles)) - 1
+        self._teamed = self._all & ~self._no_team
+
+    def _preference_row(self, team, preference):
+        """Members with compatible match preferences for any member of the given team and preference"""
+        key = (team, preference)
+        row = self._preference_rows.get(key)
+        if row is not None:
+            return row
+
+        if team == NO_TEAM_CODE:
+            row = self._all
+        else:
+            row = self._no_team
+            same_team = self._teams.get(team, 0)
+            if preference != PREFERENCE_OTHER_TEAMS:
+                row |= same_team & ~self._teams_only_other_teams.get(team, 0)
+            if preference != PREFERENCE_SAME_TEAM:
+                row |= self._teamed & ~same_team & ~self._teamed_only_same_team
+        self._preference_rows[key] = row
+        return row
+
+    def row(self, profile):
+        """Bitset of the members that profile can be matched with"""
+        row = self._rows[profile.index]
+        if row is None:
+            row = self._preference_row(profile.team, profile.preference)
+            for index in (
+                [profile.index]
+                + self._by_id.get(self._previous_match_codes[profile.index], [])
+                + self._by_previous_match.get(self._id_codes[profile.index], [])
+            ):
+                row &= ~(1 << index)
+            self._rows[profile.index] = row
+        return row
+
+    def _excluded(self, profile, index):
+        """Whether the member with the given index is profile itself or got matched with it last time"""
+        return (
+            index == profile.index
+            or self._id_codes[index] == self._previous_match_codes[profile.index]
+            or self._previous_match_codes[index] == self._id_codes[profile.index]
+        )
+
+    def can_be_matched(self, p1, p2):
+        # Inlined _excluded, this is called for every member looking at every match to break up
+        i, j = p1.index, p2.index
+        return (
+            i != j
+            and self._id_codes[j] != self._previous_match_codes[i]
+            and self._previous_match_codes[j] != self._id_codes[i]
+            and compatible_profiles(p1, p2)
+        )
+
+    def first_match(self, profile, candidates):
+        """Lowest index in the candidates bitset that profile can be matched with, or -1"""
+        mask = self._preference_row(profile.team, profile.preference) & candidates
+        while mask:
+            low = mask & -mask
+            index = low.bit_length() - 1
+            if not self._excluded(profile, index):
+                return index
+            mask ^= low
+        return -1
@@ -1,5 +1,16 @@
 from datetime import datetime, timedelta
 
+from asana_random_one_on_one.best_of import DEFAULT_MATCH_BUDGET
+from asana_random_one_on_one.construct_matches import GREEDY, DEFAULT_HISTORY_WEEKS
+from asana_random_one_on_one.metrics import RunMetrics
+from asana_random_one_on_one.pagination import DEFAULT_PAGE_SIZE
+from asana_random_one_on_one.pair_history import week_key
+
+# Number of tasks created at the same time when creating this weeks one on ones
+DEFAULT_WRITE_CONCURRENCY = 8
+# Number of projects handled at the same time when running for all projects
+DEFAULT_PROJECT_CONCURRENCY = 1
+
 
 class Config(object):
     def __init__(
@@ -11,13 +22,72 @@ class Config(object):
         error_project_gid,
         debug,
         use_name_as_id,
+        strategy=GREEDY,
+        history_weeks=DEFAULT_HISTORY_WEEKS,
+        history_store=None,
+        rebuild_history=False,
+        write_concurrency=DEFAULT_WRITE_CONCURRENCY,
+        use_batch_api=False,
+        project_concurrency=DEFAULT_PROJECT_CONCURRENCY,
+        pool_size=None,
+        request_timeout=None,
+        metrics=None,
+        profile_matching=None,
+        member_mirror=None,
+        page_size=DEFAULT_PAGE_SIZE,
+        write_journal=None,
+        best_of=1,
+        match_budget=DEFAULT_MATCH_BUDGET,
+        match_pool=None,
+        discover=False,
+        discovery_manifest=None,
     ):
         self.client = client
         self.user_gid = user_gid
         self.work_space_gid = work_space_gid
         self.manage_one_on_one_project_expected_task_name = task_name
         self.error_project_gid = error_project_gid
-        self.week_number = datetime.now().isocalendar()[1]
+        today = datetime.now().date()
+        # ISO week number, in the name of this week's weekly task
+        self.week_number = today.isocalendar()[1]
+        # The same week as week_number, but it doesn't wrap around every year, see week_key
+        self.week_key = week_key(today)
+        # Matching strategy passed to ConstructMatches
+        self.strategy = strategy
+        # Number of previous weeks the weighted strategy takes into account
+        self.history_weeks = history_weeks
+        # Optional MatchHistoryStore, keeps all weeks of matches instead of the weekly task
+        self.history_store = history_store
+        # Rebuild the last week of a history_store that's out of sync from its weekly task
+        self.rebuild_history = rebuild_history
+        # Maximum number of concurrent requests when creating tasks
+        self.write_concurrency = write_concurrency
+        # Group writes into Asana /batch requests
+        self.use_batch_api = use_batch_api
+        # Maximum number of projects handled at the same time
+        self.project_concurrency = project_concurrency
+        # Number of keep-alive connections the client keeps open and seconds it waits for a response
+        self.pool_size = pool_size
+        self.request_timeout = request_timeout
+        # Requests and phase times of this run
+        self.metrics = metrics if metrics is not None else RunMetrics()
+        # One of match_stats.PROFILERS to profile the matching of every project with
+        self.profile_matching = profile_matching
+        # Optional MemberMirror, member tasks are then synced from the projects' events
+        self.member_mirror = member_mirror
+        # Items per request when listing tasks, up to pagination.MAX_PAGE_SIZE
+        self.page_size = page_size
+        # Optional WriteJournal, lets a rerun resume the writes of a run that died
+        self.write_journal = write_journal
+        # Number of randomized matchings to keep the best of, and seconds they may take, see best_of
+        self.best_of = best_of
+        self.match_budget = match_budget
+        # Optional MatchPool the best of K matchings of every project share
+        self.match_pool = match_pool
+        # Find the projects to run for with a search of the workspace, see discovery
+        self.discover = discover
+        # Optional DiscoveryManifest, keeps the sections of the discovered projects between runs
+        self.discovery_manifest = discovery_manifest
 
         # Debug stuff
         self.debug = debug
@@ -1,93 +1,182 @@
+import random
+import time
+from datetime import datetime
+
+from asana_random_one_on_one.blossom import maximum_matching
+from asana_random_one_on_one.compatibility import CompatibilityIndex, bits
+from asana_random_one_on_one.match_stats import MatchStats
+from asana_random_one_on_one.member_pool import MemberPool
+from asana_random_one_on_one.member_profiles import (
+    NO_TEAM_CODE,
+    MemberProfile,
+    compatible_profiles,
+    compile_member_profile,
+    compile_member_profiles,
+)
+from asana_random_one_on_one.pair_history import week_key
+from asana_random_one_on_one.weighted_matching import (
+    greedy_weighted_matching,
+    sparse_candidates,
+)
+
+# Greedily matches members in order, breaking up earlier matches when a member has no valid match left
+GREEDY = "greedy"
+# Finds the largest possible number of valid matches with Edmonds' blossom algorithm
+BLOSSOM = "blossom"
+# Prefers pairs that have not met for a long time and pairs from different teams
+WEIGHTED = "weighted"
+STRATEGIES = [GREEDY, BLOSSOM, WEIGHTED]
+
+# Weighted strategy: how many weeks back meeting again is penalized
+DEFAULT_HISTORY_WEEKS = 8
+# Weighted strategy: extra weight for matching members of different teams
+CROSS_TEAM_BONUS = 0.5
+# Weighted strategy: number of random candidates considered for each member
+CANDIDATES_PER_MEMBER = 32
+
+
 class ConstructMatches(object):
-    def __init__(self, members, previous_matches, member_id, get_custom_field_value):
+    def __init__(
+        self,
+        members,
+        previous_matches,
+        member_id,
+        get_custom_field_value,
+        strategy=GREEDY,
+        pair_history=None,
+        week=None,
+        history_weeks=DEFAULT_HISTORY_WEEKS,
+        profiler=None,
+        rng=None,
+    ):
         """
-        :param members: A list of members objects.
+        :param members: A list of members objects, or of MemberProfiles compiled from them.
         :param previous_matches: A dict of ids for members. Contains id:id and an optional unmatched:id.
          Where id:id represents matches between ids of members.
-        {"A": "B", "B": "C", unmatched: "D"} means A's last match was B but B's last match was C, and D was last unmatched member
+        {"A": "B", "B": "C", unmatched: "D"} means A's last match was B but B's last match was C, and D was last
+         unmatched member
         :param member_id: A function that can take in a member and return an id for that member
+        :param strategy: One of STRATEGIES, the algorithm used to construct the matches
+        :param pair_history: Used by the weighted strategy, an object with last_met(id1, id2) returning the
+         last week the two members got matched or None. See PairHistory.
+        :param week: The current week, see pair_history.week_key. Defaults to this week.
+        :param history_weeks: Used by the weighted strategy, pairs that met within this many weeks are penalized
+        :param profiler: One of match_stats.PROFILERS to profile construct_matches with, see stats
+        :param rng: A random.Random for the random choices of the weighted strategy, defaults to the
+         random module
         """
-        self.members = members
+        if strategy not in STRATEGIES:
+            raise Exception("Unknown matching strategy '{}'".format(strategy))
+        compile_started = time.perf_counter()
+        # Counters and phase times, see MatchStats
+        self.stats = MatchStats()
+        self.stats.strategy = strategy
+        self.profiler = profiler
+        self.strategy = strategy
+        self.pair_history = pair_history
+        self.week = week_key(datetime.now().date()) if week is None else week
+        self.history_weeks = history_weeks
+        self.rng = rng if rng is not None else random
         self.previous_match_data = previous_matches
         self.member_id = member_id
         self._get_custom_field_value = get_custom_field_value
+        # Profiles of all members, indexed by their position in this list
+        self.profiles = compile_member_profiles(
+            members, member_id, get_custom_field_value
+        )
+        # Profiles still available for a match. Since profiles are always taken from the end of the
+        # list, the highest available index is the next member to get a match.
+        self.pool = MemberPool(len(self.profiles))
 
-        # List of members objects that have been matched. [A, B, C, D] is a match of A:B and C:D
-        self.matched_members = []
+        # Ids are interned so that previous matches can be compared as integers
+        id_codes = {}
+        self._id_codes = [
+            id_codes.setdefault(p.member_id, len(id_codes)) for p in self.profiles
+        ]
+        self._previous_match_codes = [
+            id_codes.get(previous_matches.get(p.member_id), -1) for p in self.profiles
+        ]
+        # Built once per run, every partner search is a bit operation on this index
+        self.compatibility = CompatibilityIndex(
+            self.profiles, self._id_codes, self._previous_match_codes
+        )
+
+        # List of profiles that have been matched. [A, B, C, D] is a match of A:B and C:D
+        self.matched_profiles = []
         # Updated version of previous_match_data with new matches and unmatched member
         self.match_data = {}
-        # A member object that didn't get any match
-        self.unmatched_member = None
+        # A profile that didn't get any match
+        self.unmatched_profile = None
+        self.stats.members = len(self.profiles)
+        self.stats.phase_times["compile"] = time.perf_counter() - compile_started
 
-    def got_matched_last_time(self, member1, member2):
-        m_id1, m_id2 = self.member_id(member1), self.member_id(member2)
-        return (
-            self.previous_match_data.get(m_id1) == m_id2
-            or self.previous_match_data.get(m_id2) == m_id1
-        )
+    @property
+    def matched_members(self):
+        # List of members objects that have been matched. [A, B, C, D] is a match of A:B and C:D
+        return [p.member for p in self.matched_profiles]
 
-    def compatible_match_preferences(self, member1, member2):
-        """Checks if match preferences between 2 given members are compatible"""
+    @property
+    def unmatched_member(self):
+        # A member object that didn't get any match
+        return self.unmatched_profile.member if self.unmatched_profile else None
 
-        no_team = "None (default)"
-        m1_team = self._get_custom_field_value(member1, "Team", no_team)
-        m2_team = self._get_custom_field_value(member2, "Team", no_team)
-        m1_team = None if m1_team == no_team else m1_team
-        m2_team = None if m2_team == no_team else m2_team
+    def _profile(self, member):
+        if isinstance(member, MemberProfile):
+            return member
+        return compile_member_profile(
+            member, -1, self.member_id, self._get_custom_field_value
+        )
 
-        if m1_team is None or m2_team is None:
-            # Preferences require a Team field to be set on both members in order to compare
-            # Teams with Preferences
-            return True
+    def take(self, index):
+        """Removes the profile with the given index from the available members and returns it"""
+        self.pool.take(index)
+        return self.profiles[index]
 
-        no_preference = "No preference (default)"
-        only_same_team_preference = "Only match with same team"
-        only_other_teams_preference = "Only match with other teams"
+    def pop(self):
+        """Removes the last available member and returns it"""
+        return self.profiles[self.pool.pop()]
 
-        m1_preference = self._get_custom_field_value(
-            member1, "Match Preference", no_preference
-        )
-        m2_preference = self._get_custom_field_value(
-            member2, "Match Preference", no_preference
+    def got_matched_last_time(self, p1, p2):
+        return (
+            self._previous_match_codes[p1.index] == self._id_codes[p2.index]
+            or self._previous_match_codes[p2.index] == self._id_codes[p1.index]
         )
-        m1_preference = None if m1_preference == no_preference else m1_preference
-        m2_preference = None if m2_preference == no_preference else m2_preference
-
-        if m1_preference is None and m2_preference is None:
-            return True  # Both members have no preferences and are therefor a suitable match
-
-        # We now know that both members have set their Team field and at least one of them
-        # has any preference. Lets find out if any Preference makes this an incompatible match
-        are_on_same_team = m1_team == m2_team
-        if are_on_same_team and only_other_teams_preference not in [
-            m1_preference,
-            m2_preference,
-        ]:
-            return True  # Team members that are ok with being matched with other team members
-        if not are_on_same_team and only_same_team_preference not in [
-            m1_preference,
-            m2_preference,
-        ]:
-            return True  # Not team members that are ok with being matched outside of their team
 
-        return False
+    def compatible_match_preferences(self, member1, member2):
+        """Checks if match preferences between 2 given members are compatible"""
+        return compatible_profiles(self._profile(member1), self._profile(member2))
 
     def can_be_matched(self, m1, m2):
         # Check if 2 members did not get matched last time and have compatible match preferences
-        return not self.got_matched_last_time(
-            m1, m2
-        ) and self.compatible_match_preferences(m1, m2)
+        self.stats.can_be_matched += 1
+        return self.compatibility.can_be_matched(m1, m2)
+
+    def pair_weight(self, p1, p2):
+        """Weight of matching 2 compatible members in the weighted strategy, higher is better"""
+        weight = 1.0
+        if p1.team != NO_TEAM_CODE and p2.team != NO_TEAM_CODE and p1.team != p2.team:
+            weight += CROSS_TEAM_BONUS
+        if self.pair_history is not None and self.history_weeks > 0:
+            last_met = self.pair_history.last_met(p1.member_id, p2.member_id)
+            if last_met is not None:
+                # Meeting last week costs the full weight, history_weeks ago a fraction of it
+                weeks_ago = max(self.week - last_met, 1)
+                weight -= (
+                    max(self.history_weeks - weeks_ago + 1, 0) / self.history_weeks
+                )
+        return weight
 
     def match(self, m1, m2):
-        self.matched_members.extend([m1, m2])
-        self.match_data[self.member_id(m2)] = self.member_id(m1)
-        self.match_data[self.member_id(m1)] = self.member_id(m2)
+        self.matched_profiles.extend([m1, m2])
+        self.match_data[m2.member_id] = m1.member_id
+        self.match_data[m1.member_id] = m2.member_id
 
     def find_and_create_valid_match_for_member(self, m1):
-        for i, m2 in enumerate(self.members):
-            if self.can_be_matched(m1, m2):
-                self.match(m1, self.members.pop(i))
-                return True
+        self.stats.first_match += 1
+        i = self.compatibility.first_match(m1, self.pool.mask)
+        if i != -1:
+            self.match(m1, self.take(i))
+            return True
         return False
 
     def try_to_break_up_and_create_a_new_match(self, m1, m2, m3):
@@ -105,45 +194,137 @@ class ConstructMatches(object):
 
         :return: True if new matches were made, False otherwise
         """
+        self.stats.break_up_attempts += 1
         if self.can_be_matched(m1, m2):
-            for i, m4 in enumerate(self.members):
-                if self.can_be_matched(m3, m4):
-                    self.match(m1, m2)
-                    self.match(m3, m4)
-                    self.members.pop(i)  # Remove m4 from members since it got matched
-                    return True
+            self.stats.first_match += 1
+            i = self.compatibility.first_match(m3, self.pool.mask)
+            if i != -1:
+                self.match(m1, m2)
+                # Remove m4 from members since it got matched
+                self.match(m3, self.take(i))
+                self.stats.break_up_successes += 1
+                return True
         return False
 
     def find_and_create_match_that_breaks_up_and_rematches_member(self, m1):
         # m1 is an unmatched member trying to break up an existing match and match with either
         # of the two, if the remaining one can match with another unmatched member
-        for i, x in enumerate(self.matched_members):
+        for i, x in enumerate(self.matched_profiles):
             # We only need every other matched member since they come in pairs
             if i % 2 == 1:
                 continue
-            m2 = self.matched_members[i]
-            m3 = self.matched_members[i + 1]
+            m2 = self.matched_profiles[i]
+            m3 = self.matched_profiles[i + 1]
             # First we try and see if m1 can match with m2 and then if m1 can match with m3
             # If either is possible we break up the match for m2:m3
             if self.try_to_break_up_and_create_a_new_match(
                 m1, m2, m3
             ) or self.try_to_break_up_and_create_a_new_match(m1, m3, m2):
                 # Break up this match since they got matched with m1 and another available member
-                self.matched_members.pop(i + 1)
-                self.matched_members.pop(i)
+                self.matched_profiles.pop(i + 1)
+                self.matched_profiles.pop(i)
                 return True
         return False
 
-    def construct_matches(self):
-        if len(self.members) == 2:
+    def construct_maximum_matches(self):
+        # Members are matched in the same priority order as the greedy strategy, from the end
+        order = range(len(self.profiles) - 1, -1, -1)
+
+        def neighbors(i):
+            self.stats.row_lookups += 1
+            return bits(self.compatibility.row(self.profiles[i]))
+
+        with self.stats.phase("augment"):
+            mate = maximum_matching(len(self.profiles), neighbors, order)
+        unmatchable = []
+        for i in order:
+            if i not in self.pool:
+                continue
+            member1 = self.take(i)
+            if mate[i] != -1:
+                self.match(member1, self.take(mate[i]))
+            else:
+                unmatchable.append(member1)
+
+        self.match_unmatchable(unmatchable)
+
+    def construct_weighted_matches(self):
+        order = range(len(self.profiles) - 1, -1, -1)
+        candidates = {}
+        with self.stats.phase("candidates"):
+            for i in order:
+                self.stats.row_lookups += 1
+                row = self.compatibility.row(self.profiles[i])
+                candidates[i] = sparse_candidates(
+                    row, len(self.profiles), CANDIDATES_PER_MEMBER, self.rng
+                )
+
+        # Like the greedy strategy the first member gets to pick its match
+        first = len(self.profiles) - 1
+        weighted_started = time.perf_counter()
+        if candidates.get(first):
+            member1 = self.take(first)
+            best = max(
+                candidates[first],
+                key=lambda j: self.pair_weight(member1, self.profiles[j]),
+            )
+            self.match(member1, self.take(best))
+
+        edges = [
+            (self.pair_weight(self.profiles[i], self.profiles[j]), i, j)
+            for i in order
+            if i in self.pool
+            for j in candidates[i]
+            if j in self.pool
+        ]
+        mate = greedy_weighted_matching(len(self.profiles), edges)
+        for i in order:
+            if i in self.pool and mate[i] != -1:
+                self.match(self.take(i), self.take(mate[i]))
+        self.stats.phase_times["weighted"] = time.perf_counter() - weighted_started
+
+        # None of the sampled candidates were left for these members, look at all members instead and
+        # break up a match if needed
+        unmatchable = []
+        for i in order:
+            if i in self.pool:
+                member1 = self.take(i)
+                if not (
+                    self.find_and_create_valid_match_for_member(member1)
+                    or self.find_and_create_match_that_breaks_up_and_rematches_member(
+                        member1
+                    )
+                ):
+                    unmatchable.append(member1)
+
+        self.match_unmatchable(unmatchable)
+
+    def match_unmatchable(self, unmatchable):
+        """
+        :param unmatchable: Profiles in priority order that no valid match exists for between any of them.
+
+        Like the greedy strategy we rather want some than none, so they get matched with each other and
+        the lowest priority member becomes the odd one out.
+        """
+        if len(unmatchable) % 2 == 1:
+            self.unmatched_profile = unmatchable.pop()
+        for i in range(0, len(unmatchable), 2):
+            self.match(unmatchable[i], unmatchable[i + 1])
+            self.stats.fallback_pairings += 1
+
+    def construct_greedy_matches(self):
+        if len(self.pool) == 2:
             # only 2 members, lets match them
-            self.match(self.members.pop(), self.members.pop())
-        if len(self.members) == 1:
-            self.unmatched_member = self.members.pop()
+            self.match(self.pop(), self.pop())
+        if len(self.pool) == 1:
+            self.unmatched_profile = self.pop()
+        self.match_available_members()
 
-        while len(self.members):
-            member1 = self.members.pop()  # Lets match this member with someone
-            if len(self.members):
+    def match_available_members(self):
+        """Greedily matches the available members in priority order, see construct_greedy_matches"""
+        while len(self.pool):
+            member1 = self.pop()  # Lets match this member with someone
+            if len(self.pool):
                 # We try to match with any of the remaining members
                 if self.find_and_create_valid_match_for_member(member1):
                     continue
@@ -153,12 +334,14 @@ class ConstructMatches(object):
                 ):
                     continue
                 # Edge case, no valid match can be made between the last two and the rest so they get matched
-                elif len(self.members) == 1:
-                    self.match(member1, self.members.pop())
+                elif len(self.pool) == 1:
+                    self.match(member1, self.pop())
+                    self.stats.fallback_pairings += 1
                 # Edge case, no valid match can be made for this member and remaining members. Matching with unmatched
-                elif self.unmatched_member is not None:
-                    self.match(member1, self.unmatched_member)
-                    self.unmatched_member = None
+                elif self.unmatched_profile is not None:
+                    self.match(member1, self.unmatched_profile)
+                    self.unmatched_profile = None
+                    self.stats.fallback_pairings += 1
                 else:
                     # This member is not viable for any matches
                     # Can happen due to low member count, frequency differences, match preferences
@@ -167,31 +350,71 @@ class ConstructMatches(object):
                     #   * getting matched with the next unmatchable member
                     #   * getting matched with the last member
                     #   * becoming the odd one out
-                    self.unmatched_member = member1
+                    self.unmatched_profile = member1
             else:
                 # Odd one out
-                if self.unmatched_member is not None:
+                if self.unmatched_profile is not None:
                     # The unmatched member was involved in all possible matches.
                     # Lets match the last one with the unmatched since we rather want some than none
-                    self.match(member1, self.unmatched_member)
-                    self.unmatched_member = None
+                    self.match(member1, self.unmatched_profile)
+                    self.unmatched_profile = None
+                    self.stats.fallback_pairings += 1
                 else:
                     # Last one standing, gets priority next week.
-                    self.unmatched_member = member1
+                    self.unmatched_profile = member1
+
+    def construct_matches(self):
+        """:return: The MatchStats of constructing the matches, also kept in stats"""
+        with self.stats.profiled(self.profiler), self.stats.phase("match"):
+            if self.strategy == BLOSSOM:
+                self.construct_maximum_matches()
+            elif self.strategy == WEIGHTED:
+                self.construct_weighted_matches()
+            else:
+                self.construct_greedy_matches()
+        self.finalize_match_data(self.previous_match_data)
+        return self.stats
+
+    def repair_matches(self, pairs, match_data):
+        """
+        Repairs a week's matches after members joined or left, instead of matching everyone again.
+        Pairs of members that are both still here are kept. The members left without a match, the
+        week's unmatched member, the partners of members who left and the members who joined, get
+        matched in priority order like the greedy strategy does, breaking up and rewiring a kept pair
+        when no valid match is left for them.
+
+        :param pairs: The week's matches as (id, id), including the ones of members who left
+        :param match_data: The week's match data, updated with the repaired matches
+        :return: The MatchStats of repairing the matches, also kept in stats
+        """
+        with self.stats.profiled(self.profiler), self.stats.phase("match"):
+            index_by_id = {p.member_id: p.index for p in self.profiles}
+            for m_id1, m_id2 in pairs:
+                if m_id1 in index_by_id and m_id2 in index_by_id:
+                    self.match(
+                        self.take(index_by_id[m_id1]), self.take(index_by_id[m_id2])
+                    )
+            self.match_available_members()
+        self.finalize_match_data(match_data)
+        return self.stats
 
+    def finalize_match_data(self, previous_match_data):
+        """Merges this run's matches and unmatched member into the given match data"""
+        finalize_started = time.perf_counter()
         # Don't overwrite previous matches for members not getting matches this week
-        tmp = self.previous_match_data.copy()
+        tmp = previous_match_data.copy()
         tmp.update(self.match_data)
         self.match_data = tmp
 
-        if self.unmatched_member:
+        if self.unmatched_profile:
             # There is a problem here. If the previous unmatched member was not a part of this weeks
             # matches, due to frequency, it will be overwritten by this weeks unmatched member
             # https://github.com/Asana/random-one-on-one/issues/1
-            self.match_data["unmatched"] = self.member_id(self.unmatched_member)
+            self.match_data["unmatched"] = self.unmatched_profile.member_id
         elif self.match_data.get("unmatched") in [
-            self.member_id(m) for m in self.matched_members
+            p.member_id for p in self.matched_profiles
         ]:
             # Unmatched from previous matches got matched. So no one will receive priority next week
             self.match_data["unmatched"] = ""
         # Here we let the unmatched data stay the same from previous matches
+        self.stats.phase_times["finalize"] = time.perf_counter() - finalize_started
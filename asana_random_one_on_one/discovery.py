@@ -0,0 +1,129 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+# Asana's task search returns at most 100 tasks and has no next page, see search_bot_tasks
+SEARCH_LIMIT = 100
+# Finest step of Asana's creation times
+CREATED_AT_TICK = timedelta(milliseconds=1)
+
+
+def parse_created_at(created_at):
+    """:return: The datetime of an Asana timestamp, e.g. 2024-01-01T12:00:00.000Z"""
+    return datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+
+
+def _after(created_at):
+    """:return: The timestamp one tick after created_at, so that it's included in created_at.before"""
+    after = parse_created_at(created_at) + CREATED_AT_TICK
+    return after.strftime("%Y-%m-%dT%H:%M:%S.") + "{:03d}Z".format(
+        after.microsecond // 1000
+    )
+
+
+def search_bot_tasks(client, workspace_gid, user_gid, task_name, opt_fields):
+    """
+    Yields the incomplete tasks assigned to the bot whose name or description contains task_name,
+    with a single search request per SEARCH_LIMIT tasks instead of a listing of every task assigned
+    to the bot. Searches after the first one go on from the creation time of the last task found,
+    newest first. created_at.before excludes that time, so the search goes on from one tick after
+    it and the tasks found twice are dropped. Otherwise tasks created at the same time as the last
+    one would be skipped.
+
+    Asana's search index lags behind a bit, a task assigned to the bot a few seconds ago may not be
+    found yet.
+
+    :param opt_fields: Fields of the tasks, created_at is needed to go on with the next search
+    """
+    query = {
+        "assignee.any": user_gid,
+        "completed": "false",
+        "text": task_name,
+        "sort_by": "created_at",
+        "sort_ascending": "false",
+    }
+    seen = set()
+    while True:
+        tasks = list(
+            client.tasks.search_tasks_for_workspace(
+                workspace_gid, query, page_size=SEARCH_LIMIT, opt_fields=opt_fields
+            )
+        )
+        found = 0
+        for task in tasks:
+            if task["gid"] not in seen:
+                seen.add(task["gid"])
+                found += 1
+                yield task
+        # A full page of tasks created at the same time can't be gone past
+        if len(tasks) < SEARCH_LIMIT or not found:
+            return
+        query["created_at.before"] = _after(tasks[-1]["created_at"])
+
+
+class DiscoveryManifest(object):
+    def __init__(self, path, workspace_gid, user_gid, task_name):
+        """
+        The projects the bot manages and the gids of their Members and Upcoming sections, as found
+        by the last run. Kept in a JSON file between runs, so that the sections of a project are
+        only looked up again when the bot's task in it changed or the project failed. A manifest
+        of another workspace, bot or task name is ignored.
+
+        :param path: Path of the JSON file, created when saved
+        """
+        self.path = path
+        self.key = {
+            "workspace": workspace_gid,
+            "user": user_gid,
+            "task_name": task_name,
+        }
+        # Project gid to {"task": bot task gid, "members": section gid, "upcoming": section gid}
+        self.projects = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                manifest = json.load(f)
+            if manifest.get("key") == self.key:
+                self.projects = manifest["projects"]
+
+    def sections(self, project_gid, task_gid):
+        """:return: (members section gid, upcoming section gid) of the project, or None if not known"""
+        with self._lock:
+            project = self.projects.get(project_gid)
+        if project is None or project["task"] != task_gid:
+            return None
+        return project["members"], project["upcoming"]
+
+    def record(self, project_gid, task_gid, members_section, upcoming_section):
+        with self._lock:
+            self.projects[project_gid] = {
+                "task": task_gid,
+                "members": members_section,
+                "upcoming": upcoming_section,
+            }
+
+    def forget(self, project_gid):
+        """Drops a project, e.g. after it failed, so that its sections get looked up again"""
+        with self._lock:
+            self.projects.pop(project_gid, None)
+
+    def retain(self, project_gids):
+        """Drops the projects the bot doesn't manage anymore"""
+        with self._lock:
+            self.projects = {
+                gid: project
+                for gid, project in self.projects.items()
+                if gid in project_gids
+            }
+
+    def save(self):
+        """Replaces the file at once, so that it's never left half written"""
+        with self._lock:
+            content = json.dumps(
+                {"key": self.key, "projects": self.projects}, indent=2, sort_keys=True
+            )
+        tmp_path = "{}.tmp".format(self.path)
+        with open(tmp_path, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, self.path)
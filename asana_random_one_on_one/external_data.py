@@ -0,0 +1,103 @@
+import base64
+import itertools
+import json
+import zlib
+
+from asana_random_one_on_one.match_history import HISTORY_POINTER_KEY
+
+# Characters Asana keeps in a task's external data
+EXTERNAL_DATA_LIMIT = 32768
+# Prefix of match data in the compact encoding, bumped when the encoding changes. Match data written
+# before is plain JSON.
+COMPACT_PREFIX = "m1:"
+
+
+def _numeric(member_id):
+    return (
+        member_id.isdigit() and member_id.isascii() and str(int(member_id)) == member_id
+    )
+
+
+def _indexes(match_data):
+    """:return: (sorted member ids, flat index pairs of mutual matches, flat index pairs of the rest)"""
+    ids = set()
+    for m_id1, m_id2 in match_data.items():
+        if m_id1 != "unmatched":
+            ids.update([m_id1, m_id2])
+        elif m_id2:
+            ids.add(m_id2)
+    # Asana gids sort by their number, so that they can be kept as differences to the one before
+    ids = sorted(
+        ids, key=lambda m_id: (len(m_id), m_id) if _numeric(m_id) else (0, m_id)
+    )
+    index = {member_id: i for i, member_id in enumerate(ids)}
+    pairs = []
+    one_way = []
+    for m_id1, m_id2 in match_data.items():
+        if m_id1 == "unmatched":
+            continue
+        if match_data.get(m_id2) == m_id1:
+            # Kept once, from one of the two members
+            if m_id1 <= m_id2:
+                pairs.extend([index[m_id1], index[m_id2]])
+        else:
+            one_way.extend([index[m_id1], index[m_id2]])
+    return ids, pairs, one_way
+
+
+def encode_external_data(data):
+    """
+    Encodes a weekly task's external data. Match data, see ConstructMatches.match_data, keeps every
+    member id once along with the indexes of the pairs, compressed and base64 wrapped, since it
+    grows with every member who ever got matched. Member ids that are gids are kept as numbers.
+    Other data, like a history_pointer, stays JSON.
+
+    :return: The encoded data
+    """
+    if HISTORY_POINTER_KEY in data or not all(
+        isinstance(value, str) for value in data.values()
+    ):
+        return json.dumps(data)
+    ids, pairs, one_way = _indexes(data)
+    unmatched = data.get("unmatched")
+    unmatched = ids.index(unmatched) if unmatched else unmatched
+    if ids and all(_numeric(m_id) for m_id in ids):
+        # Gids, e.g. the assignees', are kept as the differences between consecutive gids
+        numbers = [int(m_id) for m_id in ids]
+        deltas = numbers[:1] + [b - a for a, b in zip(numbers, numbers[1:])]
+        compact = [deltas, pairs, one_way, unmatched, 1]
+    else:
+        compact = [ids, pairs, one_way, unmatched, 0]
+    payload = json.dumps(compact, separators=(",", ":")).encode()
+    return COMPACT_PREFIX + base64.b64encode(zlib.compress(payload, 9)).decode()
+
+
+def decode_external_data(encoded):
+    """:return: The external data of a weekly task, in the compact encoding or the plain JSON of older weeks"""
+    if not encoded.startswith(COMPACT_PREFIX):
+        return json.loads(encoded)
+    ids, pairs, one_way, unmatched, numeric = json.loads(
+        zlib.decompress(base64.b64decode(encoded[len(COMPACT_PREFIX) :]))
+    )
+    if numeric:
+        ids = [str(number) for number in itertools.accumulate(ids)]
+    data = {}
+    for i in range(0, len(pairs), 2):
+        data[ids[pairs[i]]] = ids[pairs[i + 1]]
+        data[ids[pairs[i + 1]]] = ids[pairs[i]]
+    for i in range(0, len(one_way), 2):
+        data[ids[one_way[i]]] = ids[one_way[i + 1]]
+    if unmatched is not None:
+        data["unmatched"] = ids[unmatched] if isinstance(unmatched, int) else unmatched
+    return data
+
+
+def check_external_data_size(encoded, project_gid):
+    """:raises Exception: If the encoded external data is larger than Asana keeps"""
+    if len(encoded) > EXTERNAL_DATA_LIMIT:
+        raise Exception(
+            "Match data of project {} takes {} characters, more than the {} a weekly task can keep. "
+            "Keep the matches in a match history store instead".format(
+                project_gid, len(encoded), EXTERNAL_DATA_LIMIT
+            )
+        )
@@ -0,0 +1,596 @@
+"""
+Local stand-in for the parts of the Asana API the bot uses, for load and latency benchmarking
+without touching production Asana. See benchmark.py.
+"""
+
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from asana_random_one_on_one.discovery import parse_created_at
+
+MAX_PAGE_SIZE = 100
+
+
+def project_fields(obj, opt_fields):
+    """
+    :param obj: An Asana object
+    :param opt_fields: A list of dotted field paths, or None for every field
+    :return: The object with only the requested fields and its gid
+    """
+    if opt_fields is None or not isinstance(obj, dict):
+        return obj
+    nested = {}
+    for field in opt_fields:
+        name, _, rest = field.partition(".")
+        nested.setdefault(name, [])
+        if rest:
+            nested[name].append(rest)
+    result = {"gid": obj["gid"]} if "gid" in obj else {}
+    for name, rest in nested.items():
+        if name not in obj:
+            continue
+        value = obj[name]
+        if rest and isinstance(value, list):
+            value = [project_fields(item, rest) for item in value]
+        elif rest:
+            value = project_fields(value, rest)
+        result[name] = value
+    return result
+
+
+class FakeAsana(object):
+    """In memory workspace: tasks, sections, projects and the events of their changes"""
+
+    def __init__(self, workspace_gid="1"):
+        self.workspace_gid = workspace_gid
+        self.tasks = {}
+        self.sections = {}
+        self.projects = {}
+        self.stories = []
+        # (project gid, event) of every change to a task in a project, in order
+        self.events = []
+        # Bumped to expire every sync token handed out before
+        self._sync_epoch = 0
+        self._gids = itertools.count(1000)
+        self._lock = threading.RLock()
+
+    def _gid(self):
+        return str(next(self._gids))
+
+    def create_task(self, data, parent=None):
+        with self._lock:
+            task = {
+                "gid": self._gid(),
+                "name": data.get("name", ""),
+                "notes": data.get("notes", ""),
+                "completed": data.get("completed", False),
+                "assignee": None,
+                "custom_fields": data.get("custom_fields", []),
+                "projects": [],
+                "memberships": [],
+                "external": data.get("external"),
+                "created_at": datetime.utcnow().isoformat() + "Z",
+                "parent": {"gid": parent} if parent else None,
+            }
+            assignee = data.get("assignee")
+            if isinstance(assignee, dict):
+                task["assignee"] = assignee
+            elif assignee:
+                task["assignee"] = {"gid": assignee, "name": assignee}
+            self.tasks[task["gid"]] = task
+            for project_gid in data.get("projects", []):
+                self.add_project(task["gid"], {"project": project_gid})
+            return task
+
+    def create_section(self, project_gid, name):
+        with self._lock:
+            section = {"gid": self._gid(), "name": name, "tasks": []}
+            self.sections[section["gid"]] = section
+            self.projects.setdefault(project_gid, {"gid": project_gid, "sections": []})
+            self.projects[project_gid]["sections"].append(section["gid"])
+            return section
+
+    def create_project(self):
+        with self._lock:
+            project_gid = self._gid()
+            self.projects[project_gid] = {"gid": project_gid, "sections": []}
+            return project_gid
+
+    def add_project(self, task_gid, data):
+        with self._lock:
+            task = self.tasks[task_gid]
+            project_gid = data["project"]
+            section_gid = data.get("section")
+            if data.get("insert_before"):
+                section_gid = self._section_of(data["insert_before"])
+                tasks = self.sections[section_gid]["tasks"]
+                tasks.insert(tasks.index(data["insert_before"]), task_gid)
+            elif data.get("insert_after"):
+                section_gid = self._section_of(data["insert_after"])
+                tasks = self.sections[section_gid]["tasks"]
+                tasks.insert(tasks.index(data["insert_after"]) + 1, task_gid)
+            else:
+                if section_gid is None:
+                    section_gid = self.projects[project_gid]["sections"][0]
+                self.sections[section_gid]["tasks"].append(task_gid)
+            task["projects"].append({"gid": project_gid})
+            task["memberships"].append(
+                {
+                    "project": {"gid": project_gid},
+                    "section": {
+                        "gid": section_gid,
+                        "name": self.sections[section_gid]["name"],
+                    },
+                }
+            )
+            self._emit_event(task_gid, "added", {"gid": project_gid})
+            return {}
+
+    def remove_project(self, task_gid, project_gid):
+        with self._lock:
+            task = self.tasks[task_gid]
+            self._emit_event(task_gid, "removed", {"gid": project_gid})
+            for section_gid in self.projects[project_gid]["sections"]:
+                if task_gid in self.sections[section_gid]["tasks"]:
+                    self.sections[section_gid]["tasks"].remove(task_gid)
+            task["projects"] = [p for p in task["projects"] if p["gid"] != project_gid]
+            task["memberships"] = [
+                m for m in task["memberships"] if m["project"]["gid"] != project_gid
+            ]
+
+    def update_task(self, task_gid, data):
+        with self._lock:
+            self.tasks[task_gid].update(data)
+            self._emit_event(task_gid, "changed")
+            return self.tasks[task_gid]
+
+    def delete_task(self, task_gid):
+        """Deletes the task along with its subtasks"""
+        with self._lock:
+            self._emit_event(task_gid, "deleted")
+            for subtask in self.subtasks(task_gid):
+                self.delete_task(subtask["gid"])
+            for section in self.sections.values():
+                if task_gid in section["tasks"]:
+                    section["tasks"].remove(task_gid)
+            del self.tasks[task_gid]
+            return {}
+
+    def _emit_event(self, task_gid, action, parent=None):
+        for project in self.tasks[task_gid]["projects"]:
+            self.events.append(
+                (
+                    project["gid"],
+                    {
+                        "action": action,
+                        "resource": {"gid": task_gid, "resource_type": "task"},
+                        "parent": parent,
+                    },
+                )
+            )
+
+    def sync_token(self):
+        """:return: A sync token for the events from now on"""
+        with self._lock:
+            return "{}:{}".format(self._sync_epoch, len(self.events))
+
+    def expire_sync_tokens(self):
+        """Makes every sync token handed out so far invalid, like Asana does after a while"""
+        with self._lock:
+            self._sync_epoch += 1
+
+    def events_since(self, resource_gid, sync, limit=MAX_PAGE_SIZE):
+        """
+        :return: (up to limit events of the resource since the sync token, new sync token, has more),
+         or None if the sync token is invalid
+        """
+        with self._lock:
+            epoch, _, position = (sync or "").partition(":")
+            if epoch != str(self._sync_epoch) or not position.isdigit():
+                return None
+            events = []
+            position = int(position)
+            while position < len(self.events) and len(events) < limit:
+                project_gid, event = self.events[position]
+                if project_gid == resource_gid:
+                    events.append(event)
+                position += 1
+            sync = "{}:{}".format(self._sync_epoch, position)
+            return events, sync, position < len(self.events)
+
+    def _section_of(self, task_gid):
+        for section_gid, section in self.sections.items():
+            if task_gid in section["tasks"]:
+                return section_gid
+        raise KeyError(task_gid)
+
+    def add_comment(self, task_gid, data):
+        with self._lock:
+            story = {"gid": self._gid(), "target": task_gid, "text": data.get("text")}
+            self.stories.append(story)
+            return story
+
+    def subtasks(self, task_gid):
+        return [
+            t
+            for t in self.tasks.values()
+            if t["parent"] is not None and t["parent"]["gid"] == task_gid
+        ]
+
+    def search_tasks(self, query):
+        """
+        Tasks matching the filters of Asana's workspace task search that the bot uses, at most one
+        page of them and no next page, like Asana.
+
+        :param query: Query parameters, e.g. {"assignee.any": "bot", "text": "1:1"}
+        """
+        with self._lock:
+            tasks = list(self.tasks.values())
+        assignees = query.get("assignee.any")
+        if assignees is not None:
+            assignees = assignees.split(",")
+            tasks = [
+                t for t in tasks if t["assignee"] and t["assignee"]["gid"] in assignees
+            ]
+        if "completed" in query:
+            completed = query["completed"] == "true"
+            tasks = [t for t in tasks if t["completed"] == completed]
+        if "text" in query:
+            text = query["text"].lower()
+            tasks = [
+                t
+                for t in tasks
+                if text in t["name"].lower() or text in t["notes"].lower()
+            ]
+        if "created_at.before" in query:
+            before = parse_created_at(query["created_at.before"])
+            tasks = [t for t in tasks if parse_created_at(t["created_at"]) < before]
+        tasks.sort(
+            key=lambda t: t[query.get("sort_by", "created_at")],
+            reverse=query.get("sort_ascending") != "true",
+        )
+        return tasks[: min(int(query.get("limit", MAX_PAGE_SIZE)), MAX_PAGE_SIZE)]
+
+
+def generate_workspace(
+    projects=10,
+    members=(5, 50),
+    teams=5,
+    bot_gid="bot",
+    task_name="Random one on one",
+    vacation_ratio=0.05,
+    seed=0,
+):
+    """
+    :param projects: Number of random one on one projects, each managed by a task assigned to bot_gid
+    :param members: (min, max) number of member tasks in each project
+    :return: A FakeAsana
+    """
+    rng = random.Random(seed)
+    asana = FakeAsana()
+    user_ids = itertools.count(1)
+    frequencies = ["Every week"] * 6 + ["Every 2 weeks", "Every 4 weeks", "Never"]
+    preferences = [None] * 6 + [
+        "Only match with same team",
+        "Only match with other teams",
+    ]
+    for _ in range(projects):
+        project_gid = asana.create_project()
+        about_section = asana.create_section(project_gid, "About")
+        members_section = asana.create_section(project_gid, "Members")
+        asana.create_section(project_gid, "Upcoming")
+        for _ in range(rng.randint(*members)):
+            user_gid = "u{}".format(next(user_ids))
+            away = rng.random() < vacation_ratio
+            preference = rng.choice(preferences)
+            custom_fields = [
+                {
+                    "gid": "cf_team",
+                    "name": "Team",
+                    "enum_value": {"name": "Team {}".format(rng.randrange(teams))},
+                },
+                {
+                    "gid": "cf_preference",
+                    "name": "Match Preference",
+                    "enum_value": {"name": preference} if preference else None,
+                },
+                {
+                    "gid": "cf_frequency",
+                    "name": "Frequency",
+                    "enum_value": {"name": rng.choice(frequencies)},
+                },
+            ]
+            member = asana.create_task(
+                {
+                    "name": "Member {}".format(user_gid),
+                    "assignee": {
+                        "gid": user_gid,
+                        "name": "User {}".format(user_gid),
+                        "vacation_dates": {
+                            "start_date": "2019-01-01" if away else None,
+                            "end_date": None,
+                        },
+                    },
+                    "custom_fields": custom_fields,
+                }
+            )
+            asana.add_project(
+                member["gid"],
+                {"project": project_gid, "section": members_section["gid"]},
+            )
+        bot_task = asana.create_task({"name": task_name, "assignee": bot_gid})
+        asana.add_project(
+            bot_task["gid"], {"project": project_gid, "section": about_section["gid"]}
+        )
+    return asana
+
+
+class FakeAsanaServer(object):
+    def __init__(self, asana, latency=0.0, throttle_every=0, retry_after=1):
+        """
+        HTTP server answering the Asana API requests the bot makes from a FakeAsana.
+
+        :param latency: Seconds each request takes
+        :param throttle_every: Every nth request is answered with 429 Too Many Requests, 0 never
+        :param retry_after: Retry-After seconds of throttled requests
+        """
+        self.asana = asana
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        # Requests per (method, route)
+        self.request_counts = Counter()
+        self.throttled_count = 0
+        self.bytes_sent = 0
+        self._requests = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately, with Nagle's algorithm every response
+            # would wait for the client's delayed ACK
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server._handle(self, "get")
+
+            def do_POST(self):
+                server._handle(self, "post")
+
+            def do_PUT(self):
+                server._handle(self, "put")
+
+            def do_DELETE(self):
+                server._handle(self, "delete")
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _handle(self, handler, method):
+        url = urlparse(handler.path)
+        query = parse_qs(url.query)
+        length = int(handler.headers.get("Content-Length") or 0)
+        body = json.loads(handler.rfile.read(length) or b"{}") if length else {}
+        path = re.sub(r"^/api/1\.0", "", url.path)
+
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            count = next(self._requests)
+            throttled = self.throttle_every and count % self.throttle_every == 0
+            if throttled:
+                self.throttled_count += 1
+        if throttled:
+            return self._respond(
+                handler,
+                429,
+                {"errors": [{"message": "Rate limit enforced"}]},
+                {"Retry-After": str(self.retry_after)},
+            )
+
+        try:
+            route, status, payload = self.route(method, path, query, body)
+        except KeyError as e:
+            route, status, payload = (
+                path,
+                404,
+                {"errors": [{"message": "Not found: {}".format(e)}]},
+            )
+        with self._lock:
+            self.request_counts[(method.upper(), route)] += 1
+        self._respond(handler, status, payload)
+
+    def _respond(self, handler, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(data)
+        with self._lock:
+            self.bytes_sent += len(data)
+
+    def _page(self, items, query, path, opt_fields):
+        limit = min(int(query.get("limit", [MAX_PAGE_SIZE])[0]), MAX_PAGE_SIZE)
+        offset = int(query.get("offset", ["0"])[0])
+        page = items[offset : offset + limit]
+        next_page = None
+        if offset + limit < len(items):
+            next_page = {"offset": str(offset + limit), "path": path, "uri": path}
+        return {
+            "data": [project_fields(item, opt_fields) for item in page],
+            "next_page": next_page,
+        }
+
+    def route(self, method, path, query, body):
+        """:return: (route name, status code, response payload)"""
+        asana = self.asana
+        opt_fields = None
+        if "opt_fields" in query:
+            opt_fields = [
+                f for value in query["opt_fields"] for f in value.split(",") if f
+            ]
+        data = body.get("data", {})
+        parts = path.strip("/").split("/")
+
+        if method == "post" and parts == ["batch"]:
+            results = []
+            for action in data["actions"]:
+                try:
+                    route, status, payload = self.route(
+                        action["method"],
+                        action["relative_path"],
+                        {},
+                        {"data": action.get("data", {})},
+                    )
+                except KeyError as e:
+                    # Each action fails on its own
+                    status, payload = 404, {
+                        "errors": [{"message": "Not found: {}".format(e)}]
+                    }
+                results.append({"status_code": status, "body": payload, "headers": {}})
+            return "/batch", 200, {"data": results}
+
+        if method == "get" and parts == ["tasks"]:
+            assignee = query.get("assignee", [None])[0]
+            tasks = [
+                t
+                for t in asana.tasks.values()
+                if t["assignee"]
+                and t["assignee"]["gid"] == assignee
+                and not t["completed"]
+            ]
+            return "/tasks", 200, self._page(tasks, query, path, opt_fields)
+        if method == "post" and parts == ["tasks"]:
+            return "/tasks", 201, {"data": asana.create_task(data)}
+        if method == "get" and len(parts) == 2 and parts[0] == "tasks":
+            task = asana.tasks[parts[1]]
+            return "/tasks/{gid}", 200, {"data": project_fields(task, opt_fields)}
+        if method == "put" and len(parts) == 2 and parts[0] == "tasks":
+            return "/tasks/{gid}", 200, {"data": asana.update_task(parts[1], data)}
+        if method == "delete" and len(parts) == 2 and parts[0] == "tasks":
+            return "/tasks/{gid}", 200, {"data": asana.delete_task(parts[1])}
+        if (
+            method == "get"
+            and len(parts) == 3
+            and parts[:1] + parts[2:]
+            == [
+                "tasks",
+                "subtasks",
+            ]
+        ):
+            asana.tasks[parts[1]]
+            return (
+                "/tasks/{gid}/subtasks",
+                200,
+                self._page(asana.subtasks(parts[1]), query, path, opt_fields),
+            )
+        if method == "post" and len(parts) == 3 and parts[0] == "tasks":
+            if parts[2] == "subtasks":
+                asana.tasks[parts[1]]
+                task = asana.create_task(data, parent=parts[1])
+                return "/tasks/{gid}/subtasks", 201, {"data": task}
+            if parts[2] == "addProject":
+                return (
+                    "/tasks/{gid}/addProject",
+                    200,
+                    {"data": asana.add_project(parts[1], data)},
+                )
+            if parts[2] == "stories":
+                asana.tasks[parts[1]]
+                return (
+                    "/tasks/{gid}/stories",
+                    201,
+                    {"data": asana.add_comment(parts[1], data)},
+                )
+        if method == "get" and parts == ["events"]:
+            limit = min(int(query.get("limit", [MAX_PAGE_SIZE])[0]), MAX_PAGE_SIZE)
+            result = asana.events_since(
+                query["resource"][0], query.get("sync", [None])[0], limit
+            )
+            if result is None:
+                return (
+                    "/events",
+                    412,
+                    {
+                        "errors": [{"message": "Sync token invalid or too old"}],
+                        "sync": asana.sync_token(),
+                    },
+                )
+            events, sync, has_more = result
+            return "/events", 200, {"data": events, "sync": sync, "has_more": has_more}
+        if method == "get" and len(parts) == 3 and parts[0] == "sections":
+            tasks = [asana.tasks[gid] for gid in asana.sections[parts[1]]["tasks"]]
+            return (
+                "/sections/{gid}/tasks",
+                200,
+                self._page(tasks, query, path, opt_fields),
+            )
+        if method == "get" and len(parts) == 3 and parts[0] == "projects":
+            sections = [
+                {"gid": gid, "name": asana.sections[gid]["name"]}
+                for gid in asana.projects[parts[1]]["sections"]
+            ]
+            return (
+                "/projects/{gid}/sections",
+                200,
+                self._page(sections, query, path, opt_fields),
+            )
+        if method == "get" and parts[:1] + parts[2:] == [
+            "workspaces",
+            "tasks",
+            "search",
+        ]:
+            return (
+                "/workspaces/{gid}/tasks/search",
+                200,
+                {
+                    "data": [
+                        project_fields(task, opt_fields)
+                        for task in asana.search_tasks(
+                            {name: values[0] for name, values in query.items()}
+                        )
+                    ]
+                },
+            )
+        if method == "post" and len(parts) == 3 and parts[0] == "workspaces":
+            return "/workspaces/{gid}/tasks", 201, {"data": asana.create_task(data)}
+        raise KeyError(path)
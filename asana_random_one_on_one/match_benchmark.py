@@ -0,0 +1,350 @@
+"""
+Benchmarks ConstructMatches on synthetic member populations and compares the results with stored
+baselines, see `make bench`.
+
+    python3 -m asana_random_one_on_one.match_benchmark --baseline benchmarks/construct_matches.json
+    python3 -m asana_random_one_on_one.match_benchmark --baseline benchmarks/construct_matches.json --update
+
+Only the deterministic results, the number of compatibility checks and break ups, the peak memory and
+the invalid matches, fail the comparison. Timings are the fastest of a few runs and are reported, they
+only fail it with --check-time since a single machine's wall clock is too noisy to gate on.
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+
+from asana_random_one_on_one.construct_matches import (
+    BLOSSOM,
+    GREEDY,
+    WEIGHTED,
+    ConstructMatches,
+)
+from asana_random_one_on_one.member_profiles import (
+    MATCH_PREFERENCE_FIELD,
+    TEAM_FIELD,
+)
+
+SAME_TEAM = "Only match with same team"
+OTHER_TEAMS = "Only match with other teams"
+
+# Runs of each scenario, the fastest one counts
+DEFAULT_REPEATS = 3
+
+# A result regresses when it's this many times worse than its baseline...
+TIME_TOLERANCE = 2.0
+MEMORY_TOLERANCE = 1.5
+CHECKS_TOLERANCE = 1.1
+# ...and worse by more than these, so that noise in tiny scenarios doesn't count
+TIME_SLACK = 0.05
+MEMORY_SLACK = 1024 * 1024
+
+# size: Number of members
+# teams: Number of teams members are spread over, 0 for no teams
+# same_team: Fraction of members only matching with their team
+# other_teams: Fraction of members only matching with other teams
+# previous: Fraction of members that got matched last week
+# adversarial: Members are laid out so that the greedy strategy runs out of valid matches and has to
+#  break up matches, see adversarial_members
+# strategies: The strategies to benchmark the scenario with
+Scenario = namedtuple(
+    "Scenario",
+    [
+        "name",
+        "size",
+        "teams",
+        "same_team",
+        "other_teams",
+        "previous",
+        "adversarial",
+        "strategies",
+    ],
+)
+
+ALL_STRATEGIES = (GREEDY, BLOSSOM, WEIGHTED)
+# The blossom strategy takes minutes on large or adversarial populations
+FAST_STRATEGIES = (GREEDY, WEIGHTED)
+
+SCENARIOS = [
+    Scenario("tiny", 10, 2, 0.1, 0.1, 1.0, False, ALL_STRATEGIES),
+    Scenario("no_teams", 1000, 0, 0, 0, 1.0, False, ALL_STRATEGIES),
+    Scenario("mixed_100", 100, 5, 0.2, 0.2, 1.0, False, ALL_STRATEGIES),
+    Scenario("mixed_1k", 1000, 10, 0.1, 0.3, 1.0, False, ALL_STRATEGIES),
+    Scenario("mixed_10k", 10000, 50, 0.1, 0.3, 0.5, False, FAST_STRATEGIES),
+    Scenario("mixed_100k", 100000, 200, 0.1, 0.3, 1.0, False, (GREEDY,)),
+    Scenario("same_team_heavy_1k", 1000, 20, 0.8, 0, 1.0, False, ALL_STRATEGIES),
+    Scenario("break_up_100", 100, 0, 0, 0, 0, True, ALL_STRATEGIES),
+    Scenario("break_up_1k", 1000, 0, 0, 0, 0, True, FAST_STRATEGIES),
+    Scenario("break_up_3k", 3000, 0, 0, 0, 0, True, FAST_STRATEGIES),
+]
+
+
+def member(name, team=None, preference=None):
+    return {
+        "name": name,
+        "custom_fields": [
+            {"name": TEAM_FIELD, "enum_value": {"name": team} if team else None},
+            {
+                "name": MATCH_PREFERENCE_FIELD,
+                "enum_value": {"name": preference} if preference else None,
+            },
+        ],
+    }
+
+
+def random_previous_matches(members, fraction, rng):
+    """Pairs up a random fraction of the members as last week's matches"""
+    names = [m["name"] for m in members]
+    rng.shuffle(names)
+    names = names[: int(len(names) * fraction) // 2 * 2]
+    previous_matches = {}
+    for i in range(0, len(names), 2):
+        previous_matches[names[i]] = names[i + 1]
+        previous_matches[names[i + 1]] = names[i]
+    return previous_matches
+
+
+def adversarial_members(size):
+    """
+    Members are matched from the end of the list, with the valid match lowest in the list. The
+    members at the end only match with other teams and take the members without a team first, then
+    the members at the start. What is left only matches with other teams but is all in the same
+    team, so every remaining member has to break up a match, and once the matches with members
+    without a team are used up the break ups fail after going through every match.
+    """
+    no_team = size // 20
+    majority = size * 3 // 5
+    minority = size - no_team - majority
+    return (
+        [member("n{}".format(i)) for i in range(no_team)]
+        + [member("a{}".format(i), "A", OTHER_TEAMS) for i in range(majority)]
+        + [member("b{}".format(i), "B", OTHER_TEAMS) for i in range(minority)]
+    )
+
+
+def generate_population(scenario, seed=0):
+    """:return: (members, previous_matches)"""
+    rng = random.Random(seed)
+    if scenario.adversarial:
+        members = adversarial_members(scenario.size)
+    else:
+        members = []
+        for i in range(scenario.size):
+            team = (
+                "Team {}".format(rng.randrange(scenario.teams))
+                if scenario.teams
+                else None
+            )
+            r = rng.random()
+            if r < scenario.same_team:
+                preference = SAME_TEAM
+            elif r < scenario.same_team + scenario.other_teams:
+                preference = OTHER_TEAMS
+            else:
+                preference = None
+            members.append(member(str(i), team, preference))
+    return members, random_previous_matches(members, scenario.previous, rng)
+
+
+def get_custom_field_value(member, name, default=None):
+    for field in member["custom_fields"]:
+        if field["name"] == name and field["enum_value"]:
+            return field["enum_value"]["name"]
+    return default
+
+
+class CountingCompatibility(object):
+    """Wraps a CompatibilityIndex and counts the compatibility checks made through it"""
+
+    def __init__(self, compatibility):
+        self._compatibility = compatibility
+        self.checks = 0
+
+    def row(self, profile):
+        self.checks += 1
+        return self._compatibility.row(profile)
+
+    def can_be_matched(self, p1, p2):
+        self.checks += 1
+        return self._compatibility.can_be_matched(p1, p2)
+
+    def first_match(self, profile, candidates):
+        self.checks += 1
+        return self._compatibility.first_match(profile, candidates)
+
+
+def run_once(members, previous_matches, strategy, seed):
+    # The weighted strategy samples candidates with the global random
+    random.seed(seed)
+    matcher = ConstructMatches(
+        members,
+        previous_matches,
+        lambda m: m["name"],
+        get_custom_field_value,
+        strategy=strategy,
+        week=0,
+    )
+    counting = CountingCompatibility(matcher.compatibility)
+    matcher.compatibility = counting
+
+    stats = matcher.construct_matches()
+    invalid = sum(
+        1
+        for i in range(0, len(matcher.matched_profiles), 2)
+        if not counting._compatibility.can_be_matched(
+            matcher.matched_profiles[i], matcher.matched_profiles[i + 1]
+        )
+    )
+    return {
+        "checks": counting.checks,
+        "break_up_attempts": stats.break_up_attempts,
+        "break_up_successes": stats.break_up_successes,
+        "fallback_pairings": stats.fallback_pairings,
+        "matches": len(matcher.matched_profiles) // 2,
+        "invalid_matches": invalid,
+    }
+
+
+def run_scenario(
+    scenario, strategy, seed=0, measure_memory=True, repeats=DEFAULT_REPEATS
+):
+    """
+    :param repeats: Number of timed runs, they all give the same counters
+    :return: A dict with the seconds the fastest run took, peak memory in bytes of a separate traced
+     run and the counters of run_once
+    """
+    members, previous_matches = generate_population(scenario, seed)
+    times = []
+    for _ in range(max(repeats, 1)):
+        started = time.perf_counter()
+        result = run_once(members, previous_matches, strategy, seed)
+        times.append(time.perf_counter() - started)
+    result["time"] = round(min(times), 4)
+    if measure_memory:
+        # Tracing slows everything down, so memory is measured in a separate run
+        tracemalloc.start()
+        try:
+            run_once(members, previous_matches, strategy, seed)
+            result["peak_memory"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def run_suite(
+    scenarios=SCENARIOS,
+    max_size=None,
+    seed=0,
+    measure_memory=True,
+    repeats=DEFAULT_REPEATS,
+):
+    """:return: A dict of "scenario/strategy" to the result of run_scenario"""
+    results = {}
+    for scenario in scenarios:
+        if max_size is not None and scenario.size > max_size:
+            continue
+        for strategy in scenario.strategies:
+            results["{}/{}".format(scenario.name, strategy)] = run_scenario(
+                scenario, strategy, seed, measure_memory, repeats
+            )
+    return results
+
+
+def regressions(results, baseline, check_time=False):
+    """
+    :param check_time: Whether a slower time is a regression too, see the module docstring
+    :return: A list of messages for each result that got worse than its baseline
+    """
+    limits = [
+        ("peak_memory", MEMORY_TOLERANCE, MEMORY_SLACK),
+        ("checks", CHECKS_TOLERANCE, 0),
+        ("break_up_attempts", CHECKS_TOLERANCE, 0),
+    ]
+    if check_time:
+        limits.insert(0, ("time", TIME_TOLERANCE, TIME_SLACK))
+    messages = []
+    for key, result in sorted(results.items()):
+        expected = baseline.get(key)
+        if expected is None:
+            continue
+        for field, tolerance, slack in limits:
+            if field not in result or field not in expected:
+                continue
+            if result[field] > max(
+                expected[field] * tolerance, expected[field] + slack
+            ):
+                messages.append(
+                    "{} {}: {} (baseline {})".format(
+                        key, field, result[field], expected[field]
+                    )
+                )
+        if result["invalid_matches"] > expected.get("invalid_matches", 0):
+            messages.append(
+                "{} invalid_matches: {} (baseline {})".format(
+                    key, result["invalid_matches"], expected.get("invalid_matches", 0)
+                )
+            )
+    return messages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ConstructMatches")
+    parser.add_argument(
+        "--baseline", type=str, help="JSON file with the baseline results"
+    )
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="Write the results to the baseline file instead of comparing",
+    )
+    parser.add_argument(
+        "--max-size", type=int, help="Skip scenarios with more members than this"
+    )
+    parser.add_argument("--no-memory", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=DEFAULT_REPEATS,
+        help="Timed runs of each scenario, the fastest one counts",
+    )
+    parser.add_argument(
+        "--check-time",
+        action="store_true",
+        help="Also fail when a scenario got a lot slower than its baseline",
+    )
+    args = parser.parse_args()
+
+    results = run_suite(
+        max_size=args.max_size,
+        seed=args.seed,
+        measure_memory=not args.no_memory,
+        repeats=args.repeats,
+    )
+    for key, result in sorted(results.items()):
+        print(
+            "{:<32} {:>9.4f}s {:>9.1f}MB {:>10} checks {:>8} break ups".format(
+                key,
+                result["time"],
+                result.get("peak_memory", 0) / 1024 / 1024,
+                result["checks"],
+                result["break_up_attempts"],
+            )
+        )
+
+    if args.baseline and args.update:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+    elif args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        messages = regressions(results, baseline, args.check_time)
+        if messages:
+            print("Regressions:\n" + "\n".join(messages))
+            sys.exit(1)
+        print("No regressions")
@@ -0,0 +1,207 @@
+import hashlib
+import sqlite3
+import threading
+
+from asana_random_one_on_one.pair_history import PairHistory, match_data_pairs, pair_key
+
+HISTORY_POINTER_KEY = "history_store"
+# Bumped when the meaning of the stored weeks changes, see MatchHistoryStore.migrate
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    project TEXT NOT NULL,
+    week INTEGER NOT NULL,
+    member1 TEXT NOT NULL,
+    member2 TEXT NOT NULL,
+    PRIMARY KEY (project, week, member1, member2)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS matches_by_pair ON matches (project, member1, member2, week);
+CREATE TABLE IF NOT EXISTS weeks (
+    project TEXT NOT NULL,
+    week INTEGER NOT NULL,
+    unmatched TEXT,
+    checksum TEXT NOT NULL,
+    PRIMARY KEY (project, week)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS legacy_projects (
+    project TEXT NOT NULL PRIMARY KEY
+) WITHOUT ROWID;
+"""
+
+
+def match_checksum(pairs, unmatched):
+    """Short checksum of a week's matches, stored in the weekly task to detect an out of sync store"""
+    digest = hashlib.sha1()
+    for m_id1, m_id2 in sorted(pair_key(m_id1, m_id2) for m_id1, m_id2 in pairs):
+        digest.update("{}:{};".format(m_id1, m_id2).encode())
+    digest.update("unmatched:{}".format(unmatched or "").encode())
+    return digest.hexdigest()[:16]
+
+
+def history_pointer(week, checksum):
+    """The data kept in the weekly task's external data when matches are kept in a MatchHistoryStore"""
+    return {HISTORY_POINTER_KEY: {"week": week, "checksum": checksum}}
+
+
+def parse_history_pointer(external_data):
+    """:return: (week, checksum) if the external data is a pointer into a MatchHistoryStore, otherwise None"""
+    pointer = external_data.get(HISTORY_POINTER_KEY)
+    if not isinstance(pointer, dict):
+        return None
+    return pointer["week"], pointer["checksum"]
+
+
+class MatchHistoryStore(object):
+    def __init__(self, path):
+        """
+        Local SQLite store of every week's matches, keyed by project, week and member pair.
+        Each week is appended, nothing is rewritten.
+
+        :param path: Path of the database file, created if it doesn't exist
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+            self._connection.executescript(_SCHEMA)
+            if version < 1:
+                # Weeks of a store from before week_key, they get migrated project by project
+                self._connection.execute(
+                    "INSERT OR IGNORE INTO legacy_projects SELECT DISTINCT project FROM weeks"
+                )
+            self._connection.execute("PRAGMA user_version = {}".format(SCHEMA_VERSION))
+
+    def close(self):
+        self._connection.close()
+
+    def record_week(self, project, week, pairs, unmatched, replace=False):
+        """
+        :param project: Project gid
+        :param week: See pair_history.week_key
+        :param pairs: The (id, id) matches made this week
+        :param unmatched: Id of the member with priority next week, see ConstructMatches.match_data
+        :param replace: Replace the matches recorded for the week, e.g. after they got repaired
+        :return: Checksum of the week
+        """
+        pairs = [pair_key(m_id1, m_id2) for m_id1, m_id2 in pairs]
+        checksum = match_checksum(pairs, unmatched)
+        with self._lock, self._connection:
+            if replace:
+                self._connection.execute(
+                    "DELETE FROM matches WHERE project = ? AND week = ?",
+                    (project, week),
+                )
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO matches VALUES (?, ?, ?, ?)",
+                [(project, week, m_id1, m_id2) for m_id1, m_id2 in pairs],
+            )
+            self._connection.execute(
+                "INSERT OR REPLACE INTO weeks VALUES (?, ?, ?, ?)",
+                (project, week, unmatched, checksum),
+            )
+        return checksum
+
+    def import_match_data(self, project, week, match_data):
+        """Seeds the store from the JSON match data kept in weekly tasks before there was a store"""
+        return self.record_week(
+            project, week, match_data_pairs(match_data), match_data.get("unmatched")
+        )
+
+    def is_legacy(self, project):
+        """Whether the project's weeks were recorded by pair_history.week_index, see migrate"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT 1 FROM legacy_projects WHERE project = ?", (project,)
+            ).fetchone()
+        return row is not None
+
+    def migrate(self, project, shift):
+        """
+        Moves the weeks of a project recorded by pair_history.week_index to its week_key. Those weeks
+        run Tuesday to Monday, a week recorded on a Monday is one week_key later, on other days it's
+        the same. The bot runs on the same day every week, so every week moves like the last one.
+
+        :param shift: week_key minus week_index of the project's last weekly task, 0 or 1
+        """
+        with self._lock, self._connection:
+            for table in ["matches", "weeks"]:
+                # Through negative weeks, so that no two rows share a key in between
+                self._connection.execute(
+                    "UPDATE {} SET week = -week - 1 - ? WHERE project = ?".format(
+                        table
+                    ),
+                    (shift, project),
+                )
+                self._connection.execute(
+                    "UPDATE {} SET week = -week - 1 WHERE project = ? AND week < 0".format(
+                        table
+                    ),
+                    (project,),
+                )
+            self._connection.execute(
+                "DELETE FROM legacy_projects WHERE project = ?", (project,)
+            )
+
+    def checksum(self, project, week):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT checksum FROM weeks WHERE project = ? AND week = ?",
+                (project, week),
+            ).fetchone()
+        return row[0] if row else None
+
+    def has_project(self, project):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT 1 FROM weeks WHERE project = ? LIMIT 1", (project,)
+            ).fetchone()
+        return row is not None
+
+    def last_week(self, project):
+        """:return: The last week recorded for the project, or None"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT MAX(week) FROM weeks WHERE project = ?", (project,)
+            ).fetchone()
+        return row[0]
+
+    def match_data(self, project, before_week=None):
+        """
+        The latest match of every member and the last unmatched member, like ConstructMatches.match_data
+
+        :param before_week: Only take the weeks before this one into account
+        """
+        before_week = before_week if before_week is not None else float("inf")
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT member1, member2 FROM matches WHERE project = ? AND week < ?"
+                " ORDER BY week",
+                (project, before_week),
+            ).fetchall()
+            unmatched = self._connection.execute(
+                "SELECT unmatched FROM weeks WHERE project = ? AND week < ?"
+                " ORDER BY week DESC LIMIT 1",
+                (project, before_week),
+            ).fetchone()
+        match_data = {}
+        for m_id1, m_id2 in rows:
+            match_data[m_id1] = m_id2
+            match_data[m_id2] = m_id1
+        if unmatched and unmatched[0] is not None:
+            match_data["unmatched"] = unmatched[0]
+        return match_data
+
+    def pair_history(self, project, since_week=None):
+        """:return: A PairHistory answering when two members of the project last met"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT member1, member2, MAX(week) FROM matches"
+                " WHERE project = ? AND week >= ? GROUP BY member1, member2",
+                (project, since_week if since_week is not None else -1),
+            ).fetchall()
+        history = PairHistory()
+        for m_id1, m_id2, week in rows:
+            history.record(week, [(m_id1, m_id2)])
+        return history
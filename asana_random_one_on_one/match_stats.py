@@ -0,0 +1,133 @@
+import cProfile
+import io
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Profiles the matching with cProfile
+PROFILE_CPU = "cpu"
+# Traces the memory allocated while matching with tracemalloc
+PROFILE_MEMORY = "memory"
+PROFILERS = [PROFILE_CPU, PROFILE_MEMORY]
+# Number of functions and allocation sites kept from a profile
+PROFILE_LINES = 15
+
+# tracemalloc traces the whole process, so that memory profiles of projects matched in parallel share
+# one tracing. The last one to finish stops it, unless it was started by someone else.
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_started = False
+
+
+def _start_tracing():
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        if _tracing_users == 0:
+            _tracing_started = not tracemalloc.is_tracing()
+            if _tracing_started:
+                tracemalloc.start()
+        _tracing_users += 1
+
+
+def _stop_tracing():
+    """:return: (peak bytes traced, snapshot), taken before the tracing gets stopped"""
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        peak = tracemalloc.get_traced_memory()[1]
+        snapshot = tracemalloc.take_snapshot()
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_started:
+            tracemalloc.stop()
+            _tracing_started = False
+    return peak, snapshot
+
+
+class MatchStats(object):
+    def __init__(self):
+        """What ConstructMatches did to construct a week's matches"""
+        self.strategy = None
+        self.members = 0
+        # Pairwise compatibility checks
+        self.can_be_matched = 0
+        # Searches for the first compatible member among the available members
+        self.first_match = 0
+        # Compatibility rows looked up by the blossom and weighted strategies
+        self.row_lookups = 0
+        self.break_up_attempts = 0
+        self.break_up_successes = 0
+        # Members matched with each other because no valid match was left for them
+        self.fallback_pairings = 0
+        # Phase name to seconds
+        self.phase_times = {}
+        # Top functions by cumulative time, or top allocation sites, of the opt-in profiler
+        self.profile = None
+        # Peak bytes allocated while matching, when profiling memory
+        self.peak_memory = None
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_times[name] = self.phase_times.get(name, 0.0) + (
+                time.perf_counter() - started
+            )
+
+    @contextmanager
+    def profiled(self, profiler):
+        """
+        :param profiler: One of PROFILERS, or None to not profile
+        """
+        if profiler is None:
+            yield
+        elif profiler == PROFILE_CPU:
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                out = io.StringIO()
+                pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(
+                    PROFILE_LINES
+                )
+                self.profile = out.getvalue()
+        elif profiler == PROFILE_MEMORY:
+            # Tracing started by someone else, e.g. a benchmark, or by projects matched in parallel,
+            # is shared. The peak then includes what they allocated.
+            _start_tracing()
+            try:
+                yield
+            finally:
+                self.peak_memory, snapshot = _stop_tracing()
+                self.profile = "\n".join(
+                    str(stat) for stat in snapshot.statistics("lineno")[:PROFILE_LINES]
+                )
+        else:
+            raise Exception("Unknown profiler '{}'".format(profiler))
+
+    def to_dict(self):
+        return {
+            "strategy": self.strategy,
+            "members": self.members,
+            "can_be_matched": self.can_be_matched,
+            "first_match": self.first_match,
+            "row_lookups": self.row_lookups,
+            "break_up_attempts": self.break_up_attempts,
+            "break_up_successes": self.break_up_successes,
+            "fallback_pairings": self.fallback_pairings,
+            "phase_times": {
+                phase: round(seconds, 6) for phase, seconds in self.phase_times.items()
+            },
+            "peak_memory": self.peak_memory,
+        }
+
+    def __str__(self):
+        return " ".join(
+            "{}={}".format(key, value)
+            for key, value in self.to_dict().items()
+            if value is not None
+        )
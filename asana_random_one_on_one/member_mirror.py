@@ -0,0 +1,215 @@
+import json
+import sqlite3
+import threading
+
+from asana.error import InvalidTokenError, NotFoundError
+
+from asana_random_one_on_one.pagination import DEFAULT_PAGE_SIZE
+
+# Changed member tasks fetched one by one, past this fetching the whole section is cheaper
+MAX_INCREMENTAL_FETCHES = 50
+# Fields of the members section listed on every sync. Vacations belong to users, not tasks, so
+# they don't show up in a project's events, and the listing tells which tasks joined or left the
+# section.
+SLIM_OPT_FIELDS = ["completed", "assignee.vacation_dates"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS members (
+    project TEXT NOT NULL,
+    gid TEXT NOT NULL,
+    task TEXT NOT NULL,
+    PRIMARY KEY (project, gid)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sync_tokens (
+    project TEXT NOT NULL PRIMARY KEY,
+    section TEXT NOT NULL,
+    token TEXT NOT NULL
+);
+"""
+
+
+class MemberMirror(object):
+    def __init__(self, path):
+        """
+        Local SQLite copy of the member tasks of every project, with the sync token of the
+        project's events it's up to date with. See sync_members_tasks.
+
+        :param path: Path of the database file, created if it doesn't exist
+        """
+        self.path = path
+        # Syncs that fetched whole members sections and syncs that only fetched changed tasks
+        self.full_syncs = 0
+        self.incremental_syncs = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.executescript(_SCHEMA)
+
+    def close(self):
+        self._connection.close()
+
+    def sync_token(self, project):
+        """:return: (members section gid, sync token) of the project's last sync, or None"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT section, token FROM sync_tokens WHERE project = ?", (project,)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def members(self, project):
+        """:return: A dict of gid to member task of the project"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT gid, task FROM members WHERE project = ?", (project,)
+            ).fetchall()
+        return {gid: json.loads(task) for gid, task in rows}
+
+    def replace(self, project, section, tasks, token):
+        """Replaces every mirrored member task of the project"""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM members WHERE project = ?", (project,)
+            )
+            self._write(project, section, tasks, token)
+            self.full_syncs += 1
+
+    def update(self, project, section, tasks, removed, token):
+        """
+        :param tasks: Member tasks added or changed since the last sync
+        :param removed: Gids of tasks that left the members section
+        """
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "DELETE FROM members WHERE project = ? AND gid = ?",
+                [(project, gid) for gid in removed],
+            )
+            self._write(project, section, tasks, token)
+            self.incremental_syncs += 1
+
+    def _write(self, project, section, tasks, token):
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO members VALUES (?, ?, ?)",
+            [(project, task["gid"], json.dumps(task)) for task in tasks],
+        )
+        self._connection.execute(
+            "INSERT OR REPLACE INTO sync_tokens VALUES (?, ?, ?)",
+            (project, section, token),
+        )
+
+
+def new_sync_token(client, project_gid):
+    """:return: A sync token for the project's events from now on"""
+    try:
+        result = client.events.get({"resource": project_gid})
+    except InvalidTokenError as e:
+        # Asana answers a request without a sync token with a fresh one
+        return e.sync
+    return result["sync"]
+
+
+def changed_task_gids(client, project_gid, token):
+    """
+    :return: (gids of the tasks changed since the sync token, new sync token)
+    :raises InvalidTokenError: The sync token expired
+    """
+    changed = set()
+    while True:
+        result = client.events.get({"resource": project_gid, "sync": token})
+        for event in result.get("data", []):
+            resource = event.get("resource") or {}
+            if resource.get("resource_type") == "task":
+                changed.add(resource["gid"])
+        token = result["sync"]
+        if not result.get("has_more"):
+            return changed, token
+
+
+def _assignee_gid(task):
+    return (task.get("assignee") or {}).get("gid")
+
+
+def full_sync(client, mirror, project_gid, members_section, opt_fields, page_size):
+    # The token is taken first, so that changes made while listing show up in the next sync
+    token = new_sync_token(client, project_gid)
+    tasks = list(
+        client.tasks.find_by_section(
+            members_section, opt_fields=opt_fields, page_size=page_size
+        )
+    )
+    mirror.replace(project_gid, members_section, tasks, token)
+    return tasks
+
+
+def sync_members_tasks(
+    client,
+    mirror,
+    project_gid,
+    members_section,
+    opt_fields,
+    page_size=DEFAULT_PAGE_SIZE,
+):
+    """
+    Brings the mirrored members section of the project up to date and returns its tasks. Only the
+    tasks changed since the last sync according to the project's events get fetched in full,
+    besides the listing of SLIM_OPT_FIELDS. Falls back to fetching the whole section when the
+    project wasn't synced before, its sync token expired or too many tasks changed.
+
+    :param opt_fields: Fields of the member tasks to mirror
+    :param page_size: Tasks per request when listing the section
+    :return: The tasks of the members section, in section order
+    """
+    synced = mirror.sync_token(project_gid)
+    if synced is None or synced[0] != members_section:
+        return full_sync(
+            client, mirror, project_gid, members_section, opt_fields, page_size
+        )
+    try:
+        changed, token = changed_task_gids(client, project_gid, synced[1])
+    except InvalidTokenError:
+        return full_sync(
+            client, mirror, project_gid, members_section, opt_fields, page_size
+        )
+
+    listing = list(
+        client.tasks.find_by_section(
+            members_section, opt_fields=SLIM_OPT_FIELDS, page_size=page_size
+        )
+    )
+    mirrored = mirror.members(project_gid)
+    stale = [
+        task["gid"]
+        for task in listing
+        if task["gid"] not in mirrored
+        or task["gid"] in changed
+        or _assignee_gid(task) != _assignee_gid(mirrored[task["gid"]])
+    ]
+    if len(stale) > MAX_INCREMENTAL_FETCHES:
+        return full_sync(
+            client, mirror, project_gid, members_section, opt_fields, page_size
+        )
+
+    fetched = {}
+    for gid in stale:
+        try:
+            fetched[gid] = client.tasks.find_by_id(gid, opt_fields=opt_fields)
+        except NotFoundError:
+            # Deleted since it was listed
+            pass
+
+    tasks = []
+    updated = []
+    for slim in listing:
+        task = fetched.get(slim["gid"]) or mirrored.get(slim["gid"])
+        if task is None:
+            continue
+        previous = json.dumps(task, sort_keys=True)
+        task["completed"] = slim.get("completed")
+        if task.get("assignee") and slim.get("assignee"):
+            task["assignee"]["vacation_dates"] = slim["assignee"].get("vacation_dates")
+        if slim["gid"] in fetched or json.dumps(task, sort_keys=True) != previous:
+            updated.append(task)
+        tasks.append(task)
+    listed = set(task["gid"] for task in tasks)
+    removed = [gid for gid in mirrored if gid not in listed]
+    mirror.update(project_gid, members_section, updated, removed, token)
+    return tasks
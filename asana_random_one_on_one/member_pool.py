@@ -0,0 +1,57 @@
+class MemberPool(object):
+    def __init__(self, size):
+        """
+        The members still available for a match, by their index in the shuffled list of profiles.
+        Kept both as a bitset, to search the available members of compatible buckets with a single
+        bit operation, and as a flag per member, so that checking a member doesn't touch the bitset.
+
+        Taking a member only sets its flag, its bit is cleared when the bitset is read next. Members
+        taken together, e.g. the two members of a match, then don't each copy the bitset, and
+        searches never run into taken members.
+
+        Members are taken from the highest index down, which keeps the shuffled order.
+
+        :param size: Number of members, all available at first
+        """
+        self._mask = (1 << size) - 1
+        self._taken = bytearray(size)
+        self._count = size
+        # Members taken since the bitset was read
+        self._pending = []
+        # No member above this index is available, see pop
+        self._top = size - 1
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, index):
+        return not self._taken[index]
+
+    @property
+    def mask(self):
+        """Bitset of the available members"""
+        if self._pending:
+            mask = self._mask
+            for index in self._pending:
+                mask ^= 1 << index
+            self._mask = mask
+            self._pending.clear()
+        return self._mask
+
+    def take(self, index):
+        """Removes the member with the given index from the pool"""
+        if self._taken[index]:
+            raise Exception("Member {} was taken already".format(index))
+        self._taken[index] = 1
+        self._count -= 1
+        self._pending.append(index)
+
+    def pop(self):
+        """Removes the available member with the highest index from the pool and returns its index"""
+        while self._top >= 0 and self._taken[self._top]:
+            self._top -= 1
+        if self._top < 0:
+            raise Exception("No member left")
+        index = self._top
+        self.take(index)
+        return index
@@ -0,0 +1,116 @@
+import itertools
+
+TEAM_FIELD = "Team"
+MATCH_PREFERENCE_FIELD = "Match Preference"
+FREQUENCY_FIELD = "Frequency"
+
+NO_TEAM = "None (default)"
+NO_PREFERENCE = "No preference (default)"
+DEFAULT_FREQUENCY = "Every week"
+
+# Interned integer codes for the Match Preference field. Any other value behaves like no preference.
+PREFERENCE_NONE = 0
+PREFERENCE_SAME_TEAM = 1
+PREFERENCE_OTHER_TEAMS = 2
+PREFERENCE_CODES = {
+    "Only match with same team": PREFERENCE_SAME_TEAM,
+    "Only match with other teams": PREFERENCE_OTHER_TEAMS,
+}
+
+# The Frequency field is stored as the interval in weeks between participations, 0 means never.
+FREQUENCY_CODES = {
+    "Never": 0,
+    "Every week": 1,
+    "Every 2 weeks": 2,
+    "Every 3 weeks": 3,
+    "Every 4 weeks": 4,
+}
+
+# Team 0 is reserved for members without a team. Codes are shared between runs so that profiles
+# compiled separately can still be compared.
+NO_TEAM_CODE = 0
+_team_codes = {}
+_next_team_code = itertools.count(1)
+
+
+def team_code(team):
+    if team is None or team == NO_TEAM:
+        return NO_TEAM_CODE
+    code = _team_codes.get(team)
+    if code is None:
+        code = _team_codes.setdefault(team, next(_next_team_code))
+    return code
+
+
+class MemberProfile(object):
+    """
+    Compact, compiled view of a member task. Custom fields are only read once, when compiling,
+    so comparing two members is a handful of integer comparisons.
+    """
+
+    __slots__ = ("member", "index", "member_id", "team", "preference", "frequency")
+
+    def __init__(self, member, index, member_id, team, preference, frequency):
+        # The member object this profile was compiled from
+        self.member = member
+        # Position of this member in the compiled list
+        self.index = index
+        self.member_id = member_id
+        self.team = team
+        self.preference = preference
+        self.frequency = frequency
+
+    def participates(self, number_of_weeks):
+        return self.frequency != 0 and number_of_weeks % self.frequency == 0
+
+    def __repr__(self):
+        return "MemberProfile({!r})".format(self.member_id)
+
+
+def compile_member_profile(member, index, member_id, get_custom_field_value):
+    """
+    :param member: A member object, or an already compiled MemberProfile
+    :param index: The index to give the profile
+    :param member_id: A function that can take in a member and return an id for that member
+    :param get_custom_field_value: A function (member, name, default) returning the value of a custom field
+    :return: A MemberProfile for the member
+    """
+    if isinstance(member, MemberProfile):
+        member.index = index
+        return member
+
+    team = get_custom_field_value(member, TEAM_FIELD, NO_TEAM)
+    preference = get_custom_field_value(member, MATCH_PREFERENCE_FIELD, NO_PREFERENCE)
+    frequency = get_custom_field_value(member, FREQUENCY_FIELD, DEFAULT_FREQUENCY)
+    return MemberProfile(
+        member,
+        index,
+        member_id(member),
+        team_code(team),
+        PREFERENCE_CODES.get(preference, PREFERENCE_NONE),
+        FREQUENCY_CODES.get(frequency, 0),
+    )
+
+
+def compile_member_profiles(members, member_id, get_custom_field_value):
+    """
+    Compiles a list of members into profiles, indexed by their position in the list.
+    Members that already are profiles are kept but re-indexed.
+    """
+    return [
+        compile_member_profile(member, i, member_id, get_custom_field_value)
+        for i, member in enumerate(members)
+    ]
+
+
+def compatible_profiles(p1, p2):
+    """Checks if match preferences between 2 given profiles are compatible"""
+    if p1.team == NO_TEAM_CODE or p2.team == NO_TEAM_CODE:
+        # Preferences require a Team field to be set on both members in order to compare
+        # Teams with Preferences
+        return True
+    if p1.team == p2.team:
+        # Team members that are ok with being matched with other team members
+        return PREFERENCE_OTHER_TEAMS not in (p1.preference, p2.preference)
+    # Not team members that are ok with being matched outside of their team
+    return PREFERENCE_SAME_TEAM not in (p1.preference, p2.preference)
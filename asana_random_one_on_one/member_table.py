@@ -0,0 +1,164 @@
+from array import array
+from datetime import datetime
+from functools import lru_cache
+
+from asana_random_one_on_one.member_profiles import (
+    DEFAULT_FREQUENCY,
+    FREQUENCY_CODES,
+    FREQUENCY_FIELD,
+    MATCH_PREFERENCE_FIELD,
+    PREFERENCE_CODES,
+    PREFERENCE_NONE,
+    TEAM_FIELD,
+    MemberProfile,
+    team_code,
+)
+
+# Day of a vacation that has no start or end date
+NO_DAY = -1
+
+
+@lru_cache(maxsize=1024)
+def day_number(date_string):
+    """:return: The proleptic Gregorian ordinal of an ISO date, or NO_DAY for None"""
+    if date_string is None:
+        return NO_DAY
+    return datetime.fromisoformat(date_string).toordinal()
+
+
+def is_away(start_day, end_day, today, friday):
+    """
+    Only members away for the whole week are away, see day_number.
+
+    :param today: Day number of today
+    :param friday: Day number of this week's Friday, see next_friday
+    """
+    return (
+        start_day != NO_DAY
+        and start_day <= today
+        and (end_day == NO_DAY or end_day > friday)
+    )
+
+
+def field_codes(team, preference, frequency):
+    """:return: (team, preference, frequency) codes of the custom field values, see member_profiles"""
+    return (
+        team_code(team),
+        PREFERENCE_CODES.get(preference, PREFERENCE_NONE),
+        FREQUENCY_CODES.get(frequency or DEFAULT_FREQUENCY, 0),
+    )
+
+
+class MemberTable(object):
+    def __init__(
+        self, members_tasks=(), today=NO_DAY, friday=NO_DAY, number_of_weeks=None
+    ):
+        """
+        The available members of a members section, loaded column by column. Unassigned, completed
+        and away members are dropped as their pages arrive, in the same pass that reads the custom
+        fields of the others and checks whether they take part this week. Vacation dates are parsed
+        once per distinct date and custom fields are read in a single scan per member.
+
+        :param members_tasks: Member tasks in Asana's format, more can be added as their pages arrive
+        :param today: Day number of today, see is_away. Nobody is away by default.
+        :param friday: Day number of this week's Friday
+        :param number_of_weeks: See MemberProfile.participates, everybody takes part by default
+        """
+        self.today = today
+        self.friday = friday
+        self.number_of_weeks = number_of_weeks
+        self.members = []
+        # Codes of the custom fields, see member_profiles
+        self.team = array("l")
+        self.preference = array("b")
+        self.frequency = array("b")
+        # 1 for members who take part this week
+        self.participates = bytearray()
+        self.extend(members_tasks)
+
+    def __len__(self):
+        return len(self.members)
+
+    def __iter__(self):
+        return iter(self.members)
+
+    def extend(self, members_tasks):
+        # Bound once, this runs for every member of every project
+        members, participates = self.members, self.participates
+        teams, preferences, frequencies = self.team, self.preference, self.frequency
+        today, friday, number_of_weeks = self.today, self.friday, self.number_of_weeks
+        # Few distinct combinations of custom field values, their codes and whether they take part
+        # this week are looked up once
+        codes = {}
+        for member in members_tasks:
+            assignee = member.get("assignee")
+            if assignee is None or member.get("completed"):
+                continue
+            vacation_dates = assignee.get("vacation_dates")
+            start = vacation_dates.get("start_date") if vacation_dates else None
+            if start is not None:
+                # Inlined is_away
+                start = day_number(start)
+                if start <= today:
+                    end = day_number(vacation_dates.get("end_date"))
+                    if end == NO_DAY or end > friday:
+                        continue
+            # Single scan of the custom fields, the first field with a value counts
+            team = preference = frequency = None
+            for field in member.get("custom_fields") or ():
+                value = field.get("enum_value")
+                if not value:
+                    continue
+                name = field["name"]
+                if name == TEAM_FIELD:
+                    team = team or value["name"]
+                elif name == MATCH_PREFERENCE_FIELD:
+                    preference = preference or value["name"]
+                elif name == FREQUENCY_FIELD:
+                    frequency = frequency or value["name"]
+            key = (team, preference, frequency)
+            field_code = codes.get(key)
+            if field_code is None:
+                field_code = field_codes(*key)
+                code = field_code[2]
+                field_code = codes[key] = field_code + (
+                    number_of_weeks is None
+                    or (code != 0 and number_of_weeks % code == 0),
+                )
+            members.append(member)
+            teams.append(field_code[0])
+            preferences.append(field_code[1])
+            frequencies.append(field_code[2])
+            participates.append(field_code[3])
+
+    def select(self, indexes):
+        """:return: A MemberTable of the members with the given indexes, in that order"""
+        table = MemberTable(
+            today=self.today, friday=self.friday, number_of_weeks=self.number_of_weeks
+        )
+        table.members = [self.members[i] for i in indexes]
+        table.participates = bytearray(self.participates[i] for i in indexes)
+        for name in ["team", "preference", "frequency"]:
+            column = getattr(self, name)
+            setattr(table, name, array(column.typecode, [column[i] for i in indexes]))
+        return table
+
+    def profiles(self, member_id, participating=False):
+        """
+        :param member_id: A function that can take in a member and return an id for that member
+        :param participating: Whether to leave out the members who don't take part this week
+        :return: A MemberProfile for each member, like member_profiles.compile_member_profiles
+        """
+        return [
+            MemberProfile(member, i, member_id(member), team, preference, frequency)
+            for i, (member, team, preference, frequency, participates) in enumerate(
+                zip(
+                    self.members,
+                    self.team,
+                    self.preference,
+                    self.frequency,
+                    self.participates,
+                )
+            )
+            if participates or not participating
+        ]
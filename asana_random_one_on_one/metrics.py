@@ -0,0 +1,286 @@
+import contextvars
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds of the request latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+# Phases of a project's run
+FETCH = "fetch"
+MATCH = "match"
+WRITE = "write"
+
+# The project requests made in the current context are attributed to
+_current_project = contextvars.ContextVar("project", default=None)
+# The read, see projections.Projection, the requests made in the current context belong to
+_current_call_site = contextvars.ContextVar("call_site", default=None)
+_GID = re.compile(r"/\d+(?=/|$)")
+
+
+def endpoint(method, path):
+    """:return: The endpoint of a request, e.g. GET /tasks/{gid} for a GET of /tasks/123"""
+    return "{} {}".format(method.upper(), _GID.sub("/{gid}", path.split("?")[0]))
+
+
+def in_current_context(fn):
+    """
+    Worker threads don't inherit the context of the thread that submitted work to them, this
+    wraps fn to run in a copy of the current context so that its requests get attributed to the
+    current project.
+    """
+    context = contextvars.copy_context()
+
+    def inner(*args, **kwargs):
+        # A context can only be entered by one thread at a time
+        return context.copy().run(fn, *args, **kwargs)
+
+    return inner
+
+
+class EndpointStats(object):
+    __slots__ = ("count", "errors", "bytes", "latency", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.bytes = 0
+        # Total seconds of all requests
+        self.latency = 0.0
+        # Number of requests per LATENCY_BUCKETS bucket, not cumulative
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    def record(self, latency, size, error):
+        self.count += 1
+        self.errors += 1 if error else 0
+        self.bytes += size
+        self.latency += latency
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.buckets[i] += 1
+                break
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "latency": round(self.latency, 6),
+            "latency_buckets": {
+                "+Inf" if bound == float("inf") else str(bound): count
+                for bound, count in zip(LATENCY_BUCKETS, self.buckets)
+            },
+        }
+
+
+class RunMetrics(object):
+    def __init__(self):
+        """
+        Requests per endpoint and per project, and the time spent in each phase of a run. Shared by
+        every worker of a run.
+        """
+        self.started = time.monotonic()
+        # Endpoint to EndpointStats
+        self.endpoints = {}
+        # Project gid to endpoint to EndpointStats, requests made outside a project are left out
+        self.projects = {}
+        # Phase to total seconds spent in it, summed over projects handled at the same time
+        self.phases = {}
+        # Project gid to phase to seconds
+        self.project_phases = {}
+        # Project gid to MatchStats.to_dict() of its matching
+        self.project_matching = {}
+        # Call site to EndpointStats of its reads
+        self.call_sites = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def project(self, project_gid):
+        """Attributes the requests made within to the given project, see in_project for worker threads"""
+        token = _current_project.set(project_gid)
+        try:
+            yield
+        finally:
+            _current_project.reset(token)
+
+    def in_project(self, project_gid, fn):
+        """:return: fn wrapped to attribute its requests to the given project, in any thread"""
+
+        def inner(*args, **kwargs):
+            with self.project(project_gid):
+                return fn(*args, **kwargs)
+
+        return in_current_context(inner)
+
+    @contextmanager
+    def call_site(self, name):
+        """
+        Attributes the reads made within to the given call site, e.g. the name of their Projection.
+        Writes made within, like a comment on a task listed by the read, are left out.
+        """
+        token = _current_call_site.set(name)
+        try:
+            yield
+        finally:
+            _current_call_site.reset(token)
+
+    def record_request(self, method, path, latency, size=0, error=False):
+        """
+        :param path: Path relative to the API's base url
+        :param size: Bytes received
+        :param error: The request failed, either with an error status or without a response at all
+        """
+        name = endpoint(method, path)
+        project_gid = _current_project.get()
+        call_site = _current_call_site.get() if method.upper() == "GET" else None
+        with self._lock:
+            self.endpoints.setdefault(name, EndpointStats()).record(
+                latency, size, error
+            )
+            if call_site is not None:
+                self.call_sites.setdefault(call_site, EndpointStats()).record(
+                    latency, size, error
+                )
+            if project_gid is not None:
+                self.projects.setdefault(project_gid, {}).setdefault(
+                    name, EndpointStats()
+                ).record(latency, size, error)
+
+    def record_phase(self, phase, seconds):
+        project_gid = _current_project.get()
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+            if project_gid is not None:
+                phases = self.project_phases.setdefault(project_gid, {})
+                phases[phase] = phases.get(phase, 0.0) + seconds
+
+    def record_match_stats(self, stats):
+        """:param stats: MatchStats.to_dict() of the current project's matching"""
+        project_gid = _current_project.get()
+        if project_gid is not None:
+            with self._lock:
+                self.project_matching[project_gid] = stats
+
+    @contextmanager
+    def phase(self, phase):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record_phase(phase, time.monotonic() - started)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "wall_time": round(time.monotonic() - self.started, 6),
+                "requests": sum(s.count for s in self.endpoints.values()),
+                "endpoints": {
+                    name: stats.to_dict()
+                    for name, stats in sorted(self.endpoints.items())
+                },
+                "phases": {
+                    phase: round(seconds, 6) for phase, seconds in self.phases.items()
+                },
+                "call_sites": {
+                    name: stats.to_dict()
+                    for name, stats in sorted(self.call_sites.items())
+                },
+                "projects": {
+                    project_gid: {
+                        "endpoints": {
+                            name: stats.to_dict()
+                            for name, stats in sorted(
+                                self.projects.get(project_gid, {}).items()
+                            )
+                        },
+                        "phases": {
+                            phase: round(seconds, 6)
+                            for phase, seconds in self.project_phases.get(
+                                project_gid, {}
+                            ).items()
+                        },
+                        "matching": self.project_matching.get(project_gid),
+                    }
+                    for project_gid in sorted(
+                        set(self.projects)
+                        | set(self.project_phases)
+                        | set(self.project_matching)
+                    )
+                },
+            }
+
+    def to_prometheus(self):
+        """:return: The metrics in the Prometheus text format, per project metrics are left out"""
+        prefix = "random_one_on_one_"
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+            lines = []
+            for metric, kind, field in [
+                ("requests_total", "counter", "count"),
+                ("request_errors_total", "counter", "errors"),
+                ("response_bytes_total", "counter", "bytes"),
+            ]:
+                lines.append("# TYPE {}{} {}".format(prefix, metric, kind))
+                for name, stats in endpoints:
+                    lines.append(
+                        '{}{}{{endpoint="{}"}} {}'.format(
+                            prefix, metric, name, getattr(stats, field)
+                        )
+                    )
+
+            for metric, field in [
+                ("call_site_requests_total", "count"),
+                ("call_site_response_bytes_total", "bytes"),
+            ]:
+                lines.append("# TYPE {}{} counter".format(prefix, metric))
+                for name, stats in sorted(self.call_sites.items()):
+                    lines.append(
+                        '{}{}{{call_site="{}"}} {}'.format(
+                            prefix, metric, name, getattr(stats, field)
+                        )
+                    )
+
+            lines.append("# TYPE {}request_duration_seconds histogram".format(prefix))
+            for name, stats in endpoints:
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                    cumulative += count
+                    lines.append(
+                        '{}request_duration_seconds_bucket{{endpoint="{}",le="{}"}} {}'.format(
+                            prefix,
+                            name,
+                            "+Inf" if bound == float("inf") else bound,
+                            cumulative,
+                        )
+                    )
+                lines.append(
+                    '{}request_duration_seconds_sum{{endpoint="{}"}} {}'.format(
+                        prefix, name, stats.latency
+                    )
+                )
+                lines.append(
+                    '{}request_duration_seconds_count{{endpoint="{}"}} {}'.format(
+                        prefix, name, stats.count
+                    )
+                )
+
+            lines.append("# TYPE {}phase_seconds gauge".format(prefix))
+            for phase, seconds in sorted(self.phases.items()):
+                lines.append(
+                    '{}phase_seconds{{phase="{}"}} {}'.format(prefix, phase, seconds)
+                )
+            lines.append("# TYPE {}run_seconds gauge".format(prefix))
+            lines.append(
+                "{}run_seconds {}".format(prefix, time.monotonic() - self.started)
+            )
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Writes the metrics to path, in the Prometheus text format for a .prom file, JSON otherwise"""
+        if path.endswith(".prom"):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.to_dict(), indent=2) + "\n"
+        with open(path, "w") as f:
+            f.write(content)
@@ -0,0 +1,49 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from asana.page_iterator import CollectionPageIterator
+
+from asana_random_one_on_one.metrics import in_current_context
+
+# Asana returns at most 100 items per page
+MAX_PAGE_SIZE = 100
+DEFAULT_PAGE_SIZE = MAX_PAGE_SIZE
+
+
+def check_page_size(page_size):
+    if not 1 <= page_size <= MAX_PAGE_SIZE:
+        raise Exception(
+            "Page size must be between 1 and {}, got {}".format(
+                MAX_PAGE_SIZE, page_size
+            )
+        )
+
+
+def prefetched(pages):
+    """
+    Yields the pages of an iterator while the next page gets fetched in a background thread, so
+    that at most two pages are held at a time.
+    """
+    fetch_next = in_current_context(lambda: next(pages, None))
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(fetch_next)
+        while True:
+            page = future.result()
+            if page is None:
+                return
+            future = executor.submit(fetch_next)
+            yield page
+
+
+def stream_collection(client, path, query, page_size=DEFAULT_PAGE_SIZE, **options):
+    """
+    Yields the items of a collection as its pages arrive, one page ahead of the caller.
+
+    :param path: Path of the collection, e.g. /sections/{gid}/tasks
+    :param page_size: Items per request, up to MAX_PAGE_SIZE
+    :param options: Request options, e.g. opt_fields
+    """
+    check_page_size(page_size)
+    options["page_size"] = page_size
+    for page in prefetched(CollectionPageIterator(client, path, query, options)):
+        for item in page:
+            yield item
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+# Weeks are counted from the same date as the Frequency custom field
+FIRST_WEEK = datetime(2019, 1, 1).date()
+# Monday of the ISO week FIRST_WEEK is in
+FIRST_MONDAY = FIRST_WEEK - timedelta(days=FIRST_WEEK.weekday())
+
+
+def week_index(day):
+    """
+    Number of whole weeks between FIRST_WEEK and the given date. These weeks run Tuesday to Monday,
+    they only decide who participates with the Frequency custom field, see week_key for everything
+    else.
+    """
+    return (day - FIRST_WEEK).days // 7
+
+
+def week_key(day):
+    """
+    Number of ISO weeks between the week of FIRST_WEEK and the week of the given date. Like ISO
+    weeks, and the week number in a weekly task's name, they run Monday to Sunday. Every week kept
+    in the pair history, the match history store, the write journal or a plan is keyed by it.
+    """
+    return (day - FIRST_MONDAY).days // 7
+
+
+def pair_key(id1, id2):
+    return (id1, id2) if id1 < id2 else (id2, id1)
+
+
+def match_data_pairs(match_data):
+    """All pairs of member ids in a match_data dict, see ConstructMatches.previous_match_data"""
+    return {
+        pair_key(m_id1, m_id2)
+        for m_id1, m_id2 in match_data.items()
+        if m_id1 != "unmatched" and m_id2
+    }
+
+
+class PairHistory(object):
+    """In memory record of the last week each pair of members got matched"""
+
+    def __init__(self):
+        self._last_met = {}
+
+    def record(self, week, pairs):
+        for m_id1, m_id2 in pairs:
+            key = pair_key(m_id1, m_id2)
+            if self._last_met.get(key, -1) < week:
+                self._last_met[key] = week
+
+    def last_met(self, m_id1, m_id2):
+        """:return: The last week the two members got matched, or None if they never met"""
+        return self._last_met.get(pair_key(m_id1, m_id2))
+
+    def __len__(self):
+        return len(self._last_met)
+
+    @classmethod
+    def from_weekly_match_data(cls, weekly_match_data):
+        """
+        :param weekly_match_data: A list of (week, match_data) from the weekly tasks, in any order.
+
+        match_data copies forward the last match of members that did not get a match that week, so a
+        pair is recorded at the first week of each run of consecutive weekly tasks it shows up in.
+        """
+        history = cls()
+        previous_pairs = set()
+        for week, match_data in sorted(weekly_match_data, key=lambda w: w[0]):
+            pairs = match_data_pairs(match_data)
+            history.record(week, pairs - previous_pairs)
+            previous_pairs = pairs
+        return history
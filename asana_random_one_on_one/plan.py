@@ -0,0 +1,172 @@
+import json
+import os
+import threading
+
+PLAN_VERSION = 2
+
+# Project plan statuses
+PLANNED = "planned"
+DONE = "done"
+FAILED = "failed"
+
+
+def assignee_summary(assignee):
+    """The part of a member task's assignee needed to create its one on one tasks"""
+    return (
+        {"gid": assignee.get("gid"), "name": assignee.get("name")} if assignee else None
+    )
+
+
+class ProjectPlan(object):
+    def __init__(
+        self,
+        project_gid,
+        weekly_task_name,
+        location,
+        external_data,
+        match_data,
+        pairs,
+        unmatched,
+        member_id_pairs,
+        unmatched_id,
+        task_gid=None,
+        weekly_task_gid=None,
+        status=PLANNED,
+        error=None,
+    ):
+        """
+        This week's one on ones of a project, computed without writing anything to Asana.
+
+        :param location: Where the weekly task goes, {"insert_before": gid} or {"section": gid}
+        :param external_data: The weekly task's external data
+        :param match_data: The new match data, see ConstructMatches.match_data
+        :param pairs: A list of [assignee, assignee] to create one on ones for, see assignee_summary
+        :param unmatched: The assignee of the member that didn't get a match, or None
+        :param member_id_pairs: The matches as [id, id], recorded in the MatchHistoryStore when applied
+        :param unmatched_id: Id of the member that didn't get a match, recorded with member_id_pairs
+        :param task_gid: Gid of the task assigned to the bot in the project, errors are reported to it
+        :param weekly_task_gid: Gid of the weekly task once created
+        :param status: PLANNED until the one on ones got created, then DONE or FAILED
+        """
+        self.project_gid = project_gid
+        self.weekly_task_name = weekly_task_name
+        self.location = location
+        self.external_data = external_data
+        self.match_data = match_data
+        self.pairs = pairs
+        self.unmatched = unmatched
+        self.member_id_pairs = member_id_pairs
+        self.unmatched_id = unmatched_id
+        self.task_gid = task_gid
+        self.weekly_task_gid = weekly_task_gid
+        self.status = status
+        self.error = error
+
+    def members_tasks(self):
+        """The matched members as member tasks in ConstructMatches.matched_members order"""
+        tasks = []
+        for assignee1, assignee2 in reversed(self.pairs):
+            tasks.extend([{"assignee": assignee2}, {"assignee": assignee1}])
+        return tasks
+
+    def unmatched_member_task(self):
+        return {"assignee": self.unmatched} if self.unmatched else None
+
+    def to_dict(self):
+        return {
+            "project": self.project_gid,
+            "weekly_task_name": self.weekly_task_name,
+            "location": self.location,
+            "external_data": self.external_data,
+            "match_data": self.match_data,
+            "pairs": self.pairs,
+            "unmatched": self.unmatched,
+            "member_id_pairs": self.member_id_pairs,
+            "unmatched_id": self.unmatched_id,
+            "task": self.task_gid,
+            "weekly_task": self.weekly_task_gid,
+            "status": self.status,
+            "error": self.error,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["project"],
+            data["weekly_task_name"],
+            data["location"],
+            data["external_data"],
+            data["match_data"],
+            [list(pair) for pair in data["pairs"]],
+            data["unmatched"],
+            [list(pair) for pair in data["member_id_pairs"]],
+            data["unmatched_id"],
+            task_gid=data.get("task"),
+            weekly_task_gid=data.get("weekly_task"),
+            status=data.get("status", PLANNED),
+            error=data.get("error"),
+        )
+
+
+class Plan(object):
+    def __init__(self, week_number, week_key, projects=None, errors=None):
+        """
+        The one on ones of every project for a week. Written to a file by a plan run and executed
+        by an apply run, which keeps the file up to date so that an interrupted apply can resume.
+
+        :param week_key: The week the plan was made for, see pair_history.week_key
+        :param projects: A dict of project gid to ProjectPlan
+        :param errors: A dict of the gid of a task assigned to the bot to the error its project ran
+         into while planning, reported to the task when the plan gets applied
+        """
+        self.week_number = week_number
+        self.week_key = week_key
+        self.projects = projects or {}
+        self.errors = errors or {}
+        self.errors_reported = False
+        self._lock = threading.Lock()
+
+    def add(self, project_plan):
+        with self._lock:
+            self.projects[project_plan.project_gid] = project_plan
+
+    def pending(self):
+        """Project plans that still have to be applied"""
+        return [p for p in self.projects.values() if p.status == PLANNED]
+
+    def to_dict(self):
+        return {
+            "version": PLAN_VERSION,
+            "week_number": self.week_number,
+            "week_key": self.week_key,
+            "projects": [p.to_dict() for p in self.projects.values()],
+            "errors": self.errors,
+            "errors_reported": self.errors_reported,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("version") != PLAN_VERSION:
+            raise Exception("Unsupported plan version {}".format(data.get("version")))
+        plan = cls(
+            data["week_number"],
+            data["week_key"],
+            {p["project"]: ProjectPlan.from_dict(p) for p in data["projects"]},
+            data.get("errors"),
+        )
+        plan.errors_reported = data.get("errors_reported", False)
+        return plan
+
+    def save(self, path):
+        """Replaces the file at path at once, so that it's never left half written"""
+        with self._lock:
+            content = json.dumps(self.to_dict(), indent=2)
+            tmp_path = "{}.tmp".format(path)
+            with open(tmp_path, "w") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
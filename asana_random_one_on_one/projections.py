@@ -0,0 +1,58 @@
+class Projection(object):
+    def __init__(self, name, fields):
+        """
+        The fields a read of Asana uses. They are requested as opt_fields so that Asana only sends
+        those, the gid of each object always comes along. Reads run within RunMetrics.call_site of
+        their projection's name, so that the bytes of their responses are reported per read.
+
+        :param name: Name of the read in the metrics
+        :param fields: Dotted field paths, e.g. custom_fields.enum_value.name
+        """
+        self.name = name
+        self.fields = tuple(fields)
+
+    @property
+    def opt_fields(self):
+        return list(self.fields)
+
+
+# Tasks assigned to the bot, only the ones with the expected name are looked at
+BOT_TASKS = Projection("bot_tasks", ["name"])
+# Tasks assigned to the bot found by searching the workspace, along with their projects, see
+# discovery.search_bot_tasks
+DISCOVERY_TASKS = Projection("discovery_tasks", ["name", "created_at", "projects"])
+# The projects of a task assigned to the bot
+BOT_TASK_PROJECTS = Projection("bot_task_projects", ["projects"])
+# Sections of a project, found by their name
+SECTIONS = Projection("sections", ["name"])
+# Member tasks, see MemberTable and compile_member_profiles. Only the name and value of each custom
+# field are read.
+MEMBER_TASKS = Projection(
+    "member_tasks",
+    [
+        "name",
+        "completed",
+        "assignee.name",
+        "assignee.vacation_dates",
+        "custom_fields.name",
+        "custom_fields.enum_value.name",
+    ],
+)
+# The last weekly task, to check whether this week's one on ones exist and read last week's matches
+LAST_WEEKLY_TASK = Projection(
+    "last_weekly_task", ["name", "created_at", "external.data"]
+)
+# The weekly tasks of the last weeks, to read the match history
+WEEKLY_TASKS_HISTORY = Projection(
+    "weekly_tasks_history", ["created_at", "external.data"]
+)
+# This week's and last week's weekly tasks when rematching
+REMATCH_WEEKLY_TASKS = Projection(
+    "rematch_weekly_tasks", ["name", "created_at", "external.data"]
+)
+# One on ones of a week, the subtasks of its weekly task
+WEEK_ONE_ON_ONES = Projection("week_one_on_ones", ["name", "completed", "assignee"])
+# The assignees of a one on one, the subtasks of its task
+ONE_ON_ONE_ASSIGNEES = Projection("one_on_one_assignees", ["assignee.name"])
+# Subtasks of a task when checking a write in doubt, see write_journal.existing_subtasks
+JOURNAL_SUBTASKS = Projection("journal_subtasks", ["name", "assignee"])
@@ -0,0 +1,41 @@
+import random
+
+from asana_random_one_on_one.compatibility import bits
+
+
+def sparse_candidates(row, count, limit, rng=random):
+    """
+    :param row: Bitset of possible candidates
+    :param count: Number of bits in row
+    :param limit: Maximum number of candidates to return
+    :return: Up to limit randomly picked positions of set bits in row
+    """
+    candidates = set()
+    for _ in range(limit * 4):
+        if len(candidates) >= limit:
+            return list(candidates)
+        j = rng.randrange(count)
+        if (row >> j) & 1:
+            candidates.add(j)
+    # Sparse row, fill up with the lowest set bits instead
+    for j in bits(row):
+        if len(candidates) >= limit:
+            break
+        candidates.add(j)
+    return list(candidates)
+
+
+def greedy_weighted_matching(count, edges):
+    """
+    Heavy edges first matching, at least half the weight of a maximum weight matching. The
+    exact algorithm is cubic in the number of vertices which is too slow for large projects.
+
+    :param count: Number of vertices, vertices are 0..count-1
+    :param edges: A list of (weight, a, b). Edges with equal weight are picked in list order.
+    :return: A list where item v is the vertex matched with v, or -1 if v is unmatched
+    """
+    mate = [-1] * count
+    for weight, a, b in sorted(edges, key=lambda e: -e[0]):
+        if a != b and mate[a] == -1 and mate[b] == -1:
+            mate[a], mate[b] = b, a
+    return mate
@@ -0,0 +1,207 @@
+import json
+import sqlite3
+import threading
+
+from asana_random_one_on_one.plan import ProjectPlan
+from asana_random_one_on_one.projections import JOURNAL_SUBTASKS
+
+# Weeks of writes kept in the journal, older weeks can't be resumed anymore
+JOURNAL_WEEKS = 4
+
+# Write statuses. A write stays INTENDED when the run died while sending it. Whether Asana got an
+# INTENDED or FAILED write is unknown until checked, e.g. a request can time out after Asana handled
+# it.
+INTENDED = "intended"
+COMPLETED = "completed"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS plans (
+    project TEXT NOT NULL,
+    week INTEGER NOT NULL,
+    plan TEXT NOT NULL,
+    PRIMARY KEY (project, week)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS writes (
+    key TEXT NOT NULL PRIMARY KEY,
+    week INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    gid TEXT,
+    error TEXT
+) WITHOUT ROWID;
+"""
+
+
+def subtask_key(parent_gid, data):
+    """Idempotency key of creating a subtask, its parent never has two subtasks with the same name and assignee"""
+    return "{}/subtasks/{}/{}".format(
+        parent_gid, data.get("assignee") or "", data.get("name")
+    )
+
+
+def write_key(action, parent_gid=None, data=None):
+    """
+    Idempotency key of a BatchAction, see subtask_key for the ones creating a subtask of parent_gid.
+    Other actions, like adding a task to a project, have the same effect when repeated.
+    """
+    if parent_gid is not None:
+        return subtask_key(parent_gid, data)
+    return "{} {}".format(action.method, action.relative_path)
+
+
+def existing_subtasks(client, parent_gid):
+    """:return: A dict of subtask_key to gid of the parent's subtasks"""
+    return {
+        subtask_key(
+            parent_gid,
+            {
+                "name": subtask.get("name"),
+                "assignee": (subtask.get("assignee") or {}).get("gid"),
+            },
+        ): subtask["gid"]
+        for subtask in client.tasks.get_subtasks_for_task(
+            parent_gid, opt_fields=JOURNAL_SUBTASKS.opt_fields
+        )
+    }
+
+
+class WriteJournal(object):
+    def __init__(self, path, week):
+        """
+        Local SQLite journal of every write of a week's one on ones. Each write is recorded under an
+        idempotency key before it's sent and once it completed, so that a rerun after a crash
+        skips what was written and retries the rest without creating duplicates.
+
+        :param path: Path of the database file, created if it doesn't exist
+        :param week: See pair_history.week_key, writes are recorded for this week
+        """
+        self.path = path
+        self.week = week
+        # Parent gid to existing_subtasks, listed once per run when checking writes in doubt
+        self._subtasks = {}
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.executescript(_SCHEMA)
+
+    def close(self):
+        self._connection.close()
+
+    def prune(self, weeks=JOURNAL_WEEKS):
+        """Forgets the plans and writes of weeks before the last given number of weeks"""
+        with self._lock, self._connection:
+            for table in ["plans", "writes"]:
+                self._connection.execute(
+                    "DELETE FROM {} WHERE week <= ?".format(table),
+                    (self.week - weeks,),
+                )
+
+    def save_plan(self, project_plan):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO plans VALUES (?, ?, ?)",
+                (
+                    project_plan.project_gid,
+                    self.week,
+                    json.dumps(project_plan.to_dict()),
+                ),
+            )
+
+    def project_plan(self, project):
+        """:return: The ProjectPlan of the project this week, or None if it wasn't applied yet"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT plan FROM plans WHERE project = ? AND week = ?",
+                (project, self.week),
+            ).fetchone()
+        return ProjectPlan.from_dict(json.loads(row[0])) if row else None
+
+    def entry(self, key):
+        """:return: (status, gid) of the write, or None if it was never attempted"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT status, gid FROM writes WHERE key = ?", (key,)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def _record(self, key, status, gid=None, error=None):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?)",
+                (key, self.week, status, gid, error),
+            )
+
+    def intend(self, key):
+        self._record(key, INTENDED)
+
+    def complete(self, key, gid=None):
+        self._record(key, COMPLETED, gid)
+
+    def fail(self, key, error):
+        self._record(key, FAILED, error=str(error))
+
+    def resolve(self, client, key, parent_gid=None, data=None):
+        """
+        :param parent_gid: Parent of the subtask the write creates, with its data. Without a parent
+         the write is assumed to be safe to repeat.
+        :return: (done, gid), done if an earlier run completed the write
+        """
+        entry = self.entry(key)
+        if entry is None or parent_gid is None and entry[0] != COMPLETED:
+            return False, None
+        if entry[0] == COMPLETED:
+            return True, entry[1]
+        # An earlier attempt may have created the subtask without knowing it. The parent's
+        # subtasks created by earlier runs are only listed once, later writes are in the journal.
+        if parent_gid not in self._subtasks:
+            subtasks = existing_subtasks(client, parent_gid)
+            with self._lock:
+                self._subtasks.setdefault(parent_gid, subtasks)
+        gid = self._subtasks[parent_gid].get(key)
+        if gid is not None:
+            self.complete(key, gid)
+        return gid is not None, gid
+
+    def write(self, client, key, write, parent_gid=None, data=None):
+        """
+        Calls write() unless an earlier run already completed it.
+
+        :return: The result of write(), or {"gid": gid} of the earlier write
+        """
+        done, gid = self.resolve(client, key, parent_gid, data)
+        if done:
+            return {"gid": gid}
+        self.intend(key)
+        try:
+            result = write()
+        except Exception as e:
+            self.fail(key, e)
+            raise
+        self.complete(key, (result or {}).get("gid"))
+        return result
+
+    def execute_batch(self, client, writer, writes):
+        """
+        Sends the writes not completed by an earlier run through a BatchWriter.
+
+        :param writes: A list of (BatchAction, parent gid or None, data), see write_key
+        :return: A result or exception for each write, like BatchWriter.execute
+        """
+        keys = [write_key(*write) for write in writes]
+        results = [None] * len(writes)
+        pending = []
+        for i, (key, (_, parent_gid, data)) in enumerate(zip(keys, writes)):
+            done, gid = self.resolve(client, key, parent_gid, data)
+            if done:
+                results[i] = {"gid": gid}
+            else:
+                self.intend(key)
+                pending.append(i)
+        sent = writer.execute([writes[i][0] for i in pending])
+        for i, result in zip(pending, sent):
+            results[i] = result
+            if isinstance(result, Exception):
+                self.fail(keys[i], result)
+            else:
+                self.complete(keys[i], (result or {}).get("gid"))
+        return results
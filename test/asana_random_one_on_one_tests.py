@@ -1,7 +1,17 @@
+import itertools
+import json
+import os
+import sqlite3
+import threading
 import unittest
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
 import asana_random_one_on_one as oneonone
+from asana_random_one_on_one.config import Config
+from asana_random_one_on_one.fake_asana import FakeAsanaServer
+from asana_random_one_on_one.match_history import MatchHistoryStore, history_pointer
+from asana_random_one_on_one.pair_history import week_key
+from test.helpers import FakeAsanaTestCase, today
 
 
 def create_user(start_date=None, end_date=None):
@@ -16,6 +26,59 @@ def fmt(date):
     return date.strftime("%Y-%m-%d")
 
 
+def create_member_task(name):
+    return {"name": name, "assignee": {"gid": name, "name": name}}
+
+
+class FakeTasks(object):
+    def __init__(self, failing_names=()):
+        self.failing_names = failing_names
+        self.subtasks = {}
+        self._gids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def add_subtask(self, parent, params):
+        if params["name"] in self.failing_names:
+            raise Exception("Failed")
+        with self._lock:
+            gid = str(next(self._gids))
+            self.subtasks.setdefault(parent, []).append(params["name"])
+        return {"gid": gid}
+
+
+class FakeClient(object):
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.batch_requests = 0
+
+    def post(self, path, data):
+        # Asana's /batch endpoint, for subtasks only
+        self.batch_requests += 1
+        results = []
+        for action in data["actions"]:
+            parent = action["relative_path"].split("/")[2]
+            try:
+                task = self.tasks.add_subtask(parent, action["data"])
+                results.append({"status_code": 201, "body": {"data": task}})
+            except Exception:
+                results.append({"status_code": 500, "body": {"errors": []}})
+        return results
+
+
+def create_config(client, use_batch_api=False, **options):
+    return Config(
+        client,
+        "workspace",
+        None,
+        None,
+        None,
+        False,
+        False,
+        use_batch_api=use_batch_api,
+        **options
+    )
+
+
 class TestOneOnOne(unittest.TestCase):
     def __init__(self, *args, **kwargs):
         super(TestOneOnOne, self).__init__(*args, **kwargs)
@@ -55,5 +118,431 @@ class TestOneOnOne(unittest.TestCase):
         self.assertFalse(oneonone.user_is_away(user))
 
 
+class TestCreateOneOnOneTasks(unittest.TestCase):
+    def test_creates_subtasks_for_each_match(self):
+        tasks = FakeTasks()
+        members = [create_member_task(n) for n in ["A", "B", "C", "D"]]
+        failures = oneonone.create_one_on_one_tasks(
+            create_config(FakeClient(tasks)), "week", members, create_member_task("E")
+        )
+
+        self.assertEqual(failures, [])
+        self.assertEqual(
+            sorted(tasks.subtasks["week"]),
+            ["Random 1:1 for B : A", "Random 1:1 for D : C", "Random One on None E"],
+        )
+        one_on_ones = [s for parent, s in tasks.subtasks.items() if parent != "week"]
+        self.assertEqual(
+            sorted(sorted(s) for s in one_on_ones),
+            [
+                ["Schedule a meet-up with A", "Schedule a meet-up with B"],
+                ["Schedule a meet-up with C", "Schedule a meet-up with D"],
+            ],
+        )
+
+    def test_failures_dont_stop_other_matches(self):
+        for write_concurrency in [1, 8]:
+            with self.subTest(write_concurrency=write_concurrency):
+                tasks = FakeTasks(failing_names=["Random 1:1 for D : C"])
+                members = [create_member_task(n) for n in ["A", "B", "C", "D"]]
+                failures = oneonone.create_one_on_one_tasks(
+                    create_config(
+                        FakeClient(tasks), write_concurrency=write_concurrency
+                    ),
+                    "week",
+                    members,
+                    None,
+                )
+
+                self.assertEqual(
+                    [task for task, e in failures], ["Random 1:1 for D : C"]
+                )
+                self.assertEqual(tasks.subtasks["week"], ["Random 1:1 for B : A"])
+                self.assertEqual(len(tasks.subtasks), 2)
+
+    def test_creates_subtasks_one_at_a_time(self):
+        tasks = FakeTasks()
+        members = [create_member_task(n) for n in ["A", "B", "C", "D"]]
+        failures = oneonone.create_one_on_one_tasks(
+            create_config(FakeClient(tasks), write_concurrency=1),
+            "week",
+            members,
+            create_member_task("E"),
+        )
+
+        self.assertEqual(failures, [])
+        self.assertEqual(
+            tasks.subtasks["week"],
+            ["Random 1:1 for D : C", "Random 1:1 for B : A", "Random One on None E"],
+        )
+        self.assertEqual(
+            sum(len(s) for parent, s in tasks.subtasks.items() if parent != "week"), 4
+        )
+
+    def test_creates_subtasks_in_batches(self):
+        tasks = FakeTasks(failing_names=["Schedule a meet-up with C"])
+        client = FakeClient(tasks)
+        members = [create_member_task(str(n)) for n in range(10)] + [
+            create_member_task(n) for n in ["A", "B", "C", "D"]
+        ]
+        failures = oneonone.create_one_on_one_tasks(
+            create_config(client, use_batch_api=True), "week", members, None
+        )
+
+        self.assertEqual(
+            [task for task, e in failures], ["Schedule a meet-up for D with C"]
+        )
+        self.assertEqual(len(tasks.subtasks["week"]), 7)
+        self.assertEqual(
+            sum(len(s) for parent, s in tasks.subtasks.items() if parent != "week"),
+            13,
+        )
+        # 7 one on ones and then 14 subtasks
+        self.assertEqual(client.batch_requests, 3)
+
+
+class TestPlanAndApply(FakeAsanaTestCase):
+    workspace = dict(projects=3, members=(4, 7), bot_gid="bot", task_name="1:1")
+    single_project = False
+
+    def setUp(self):
+        super(TestPlanAndApply, self).setUp()
+        self.plan_path = self.path("plan.json")
+
+    def test_plan_doesnt_write_and_apply_resumes(self):
+        with FakeAsanaServer(self.asana) as server:
+            tasks_before = len(self.asana.tasks)
+            self._main(
+                server, user_gid="bot", task_name="1:1", plan_path=self.plan_path
+            )
+            self.assertEqual(len(self.asana.tasks), tasks_before)
+            self.assertEqual(
+                {method for method, route in server.request_counts}, {"GET"}
+            )
+            with open(self.plan_path) as f:
+                planned = json.load(f)["projects"]
+            self.assertEqual(len(planned), 3)
+
+            self._main(server, apply_path=self.plan_path, use_batch_api=True)
+            self.assertEqual(len(self._weekly_tasks()), 3)
+            with open(self.plan_path) as f:
+                applied = json.load(f)["projects"]
+            self.assertEqual({p["status"] for p in applied}, {"done"})
+            for project in applied:
+                subtasks = self.asana.subtasks(project["weekly_task"])
+                self.assertEqual(
+                    len(subtasks), len(project["pairs"]) + bool(project["unmatched"])
+                )
+
+            # Everything got applied already
+            server.request_counts.clear()
+            self._main(server, apply_path=self.plan_path)
+            self.assertEqual(sum(server.request_counts.values()), 0)
+            self.assertEqual(len(self._weekly_tasks()), 3)
+
+    def test_reads_are_reported_per_call_site(self):
+        metrics_path = self.path("metrics.json")
+        with FakeAsanaServer(self.asana) as server:
+            self._main(
+                server,
+                user_gid="bot",
+                task_name="1:1",
+                plan_path=self.plan_path,
+                metrics_path=metrics_path,
+            )
+            # The projects of the bot's tasks are read without fetching the whole tasks
+            self.assertEqual(server.request_counts[("GET", "/tasks/{gid}")], 3)
+        with open(metrics_path) as f:
+            call_sites = json.load(f)["call_sites"]
+        self.assertEqual(
+            sorted(call_sites),
+            [
+                "bot_task_projects",
+                "bot_tasks",
+                "last_weekly_task",
+                "member_tasks",
+                "sections",
+            ],
+        )
+        self.assertEqual(call_sites["last_weekly_task"]["count"], 3)
+        self.assertGreater(call_sites["member_tasks"]["bytes"], 0)
+
+    def test_discovery_is_kept_between_runs(self):
+        discovery_path = self.path("discovery.json")
+        with FakeAsanaServer(self.asana) as server:
+            self._main(
+                server, user_gid="bot", task_name="1:1", discovery_path=discovery_path
+            )
+            self.assertEqual(len(self._weekly_tasks()), 3)
+            self.assertEqual(
+                server.request_counts[("GET", "/workspaces/{gid}/tasks/search")], 1
+            )
+            self.assertEqual(server.request_counts[("GET", "/tasks")], 0)
+            self.assertEqual(server.request_counts[("GET", "/tasks/{gid}")], 0)
+            self.assertEqual(
+                server.request_counts[("GET", "/projects/{gid}/sections")], 3
+            )
+
+            # The sections of every project are known already
+            server.request_counts.clear()
+            self._main(
+                server, user_gid="bot", task_name="1:1", discovery_path=discovery_path
+            )
+            self.assertEqual(
+                server.request_counts[("GET", "/projects/{gid}/sections")], 0
+            )
+            self.assertEqual(len(self._weekly_tasks()), 3)
+
+    def _one_on_ones(self, weekly_task_gid):
+        return [
+            t
+            for t in self.asana.subtasks(weekly_task_gid)
+            if t["name"].startswith("Random 1:1")
+        ]
+
+    def test_reapplying_a_stopped_plan_creates_only_whats_missing(self):
+        for use_batch_api in [False, True]:
+            with FakeAsanaServer(self.asana) as server:
+                self._main(
+                    server, user_gid="bot", task_name="1:1", plan_path=self.plan_path
+                )
+                self._main(
+                    server, apply_path=self.plan_path, use_batch_api=use_batch_api
+                )
+                with open(self.plan_path) as f:
+                    plan = json.load(f)
+                # The apply stopped after creating the weekly tasks and some of the one on ones
+                deleted = 0
+                for project in plan["projects"]:
+                    project["status"] = "planned"
+                    for one_on_one in self._one_on_ones(project["weekly_task"])[:1]:
+                        self.asana.delete_task(
+                            self.asana.subtasks(one_on_one["gid"])[0]["gid"]
+                        )
+                        deleted += 1
+                with open(self.plan_path, "w") as f:
+                    json.dump(plan, f)
+                tasks_before = len(self.asana.tasks)
+
+                self._main(
+                    server, apply_path=self.plan_path, use_batch_api=use_batch_api
+                )
+                self.assertEqual(len(self.asana.tasks), tasks_before + deleted)
+                for project in plan["projects"]:
+                    one_on_ones = self._one_on_ones(project["weekly_task"])
+                    self.assertEqual(len(one_on_ones), len(project["pairs"]))
+                    for one_on_one in one_on_ones:
+                        self.assertEqual(len(self.asana.subtasks(one_on_one["gid"])), 2)
+                    # Ready for the next round
+                    self.asana.delete_task(project["weekly_task"])
+
+    def test_apply_refuses_a_plan_of_another_week(self):
+        with FakeAsanaServer(self.asana) as server:
+            self._main(
+                server, user_gid="bot", task_name="1:1", plan_path=self.plan_path
+            )
+            with open(self.plan_path) as f:
+                plan = json.load(f)
+            plan["week_key"] -= 1
+            with open(self.plan_path, "w") as f:
+                json.dump(plan, f)
+            with self.assertRaises(Exception):
+                self._main(server, apply_path=self.plan_path)
+            self.assertEqual(self._weekly_tasks(), [])
+
+    def test_apply_follows_iso_weeks(self):
+        with FakeAsanaServer(self.asana) as server:
+            # Planned on a Sunday, the week ends before it gets applied on Monday
+            with today(date(2026, 10, 11)):
+                self._main(
+                    server, user_gid="bot", task_name="1:1", plan_path=self.plan_path
+                )
+            with today(date(2026, 10, 12)):
+                with self.assertRaises(Exception):
+                    self._main(server, apply_path=self.plan_path)
+            self.assertEqual(self._weekly_tasks(), [])
+
+            # Planned on a Monday, still the same week on Tuesday
+            with today(date(2026, 10, 12)):
+                self._main(
+                    server, user_gid="bot", task_name="1:1", plan_path=self.plan_path
+                )
+            with today(date(2026, 10, 13)):
+                self._main(server, apply_path=self.plan_path)
+            self.assertEqual(
+                [t["name"] for t in self._weekly_tasks()],
+                ["[42] weeks Random 1:1"] * len(self.asana.projects),
+            )
+
+
+class TestRematch(FakeAsanaTestCase):
+    workspace = dict(
+        projects=1, members=(10, 10), bot_gid="bot", task_name="1:1", seed=3
+    )
+
+    def _matched(self):
+        """Assignee gids of every member with a one on one, and of the unmatched member"""
+        weekly_task = self._weekly_tasks()[0]
+        matched = []
+        unmatched = None
+        for task in self.asana.subtasks(weekly_task["gid"]):
+            if task["assignee"]:
+                unmatched = task["assignee"]["gid"]
+            for subtask in self.asana.subtasks(task["gid"]):
+                matched.append(subtask["assignee"]["gid"])
+        return weekly_task, matched, unmatched
+
+    def test_rematch_repairs_only_the_affected_pairs(self):
+        with FakeAsanaServer(self.asana) as server:
+            self._main(server)
+            weekly_task, matched, unmatched = self._matched()
+            data_before = weekly_task["external"]["data"]
+
+            # One member leaves and another one joins
+            section = next(
+                gid for gid, s in self.asana.sections.items() if s["name"] == "Members"
+            )
+            dropout = matched[0]
+            for gid in self.asana.sections[section]["tasks"]:
+                if self.asana.tasks[gid]["assignee"]["gid"] == dropout:
+                    self.asana.update_task(gid, {"completed": True})
+            joiner = self.asana.create_task(
+                {
+                    "name": "Member joiner",
+                    "assignee": {
+                        "gid": "joiner",
+                        "name": "User joiner",
+                        "vacation_dates": {"start_date": None, "end_date": None},
+                    },
+                }
+            )
+            self.asana.add_project(
+                joiner["gid"], {"project": self.project_gid, "section": section}
+            )
+
+            server.request_counts.clear()
+            self._main(server, rematch=True)
+            _, rematched, new_unmatched = self._matched()
+            self.assertNotIn(dropout, rematched + [new_unmatched])
+            self.assertIn("joiner", rematched + [new_unmatched])
+            self.assertEqual(len(rematched), len(set(rematched)))
+            # Only the pairs of the member who left and of the one who joined changed
+            self.assertLessEqual(len(set(matched) - set(rematched)), 3)
+            self.assertLessEqual(server.request_counts[("DELETE", "/tasks/{gid}")], 2)
+            self.assertNotEqual(weekly_task["external"]["data"], data_before)
+
+            # Nothing changed since, a rematch doesn't write anything
+            server.request_counts.clear()
+            self._main(server, rematch=True)
+            self.assertEqual(
+                {method for method, route in server.request_counts}, {"GET"}
+            )
+
+    def test_rematch_needs_this_weeks_one_on_ones(self):
+        with FakeAsanaServer(self.asana) as server:
+            with self.assertRaises(Exception):
+                self._main(server, rematch=True)
+
+
+class TestHistoryStore(FakeAsanaTestCase):
+    workspace = dict(projects=1, members=(10, 10), seed=5)
+
+    def setUp(self):
+        super(TestHistoryStore, self).setUp()
+        self.history_path = self.path("history.db")
+
+    def main_options(self):
+        return {"history_path": self.history_path}
+
+    def _make_last_week(self):
+        """Renames this week's weekly task, so that the next run creates this week's one on ones again"""
+        for task in self._weekly_tasks():
+            task["name"] = "[0] weeks Random 1:1"
+
+    def test_newer_match_data_in_the_weekly_task_gets_imported(self):
+        store = MatchHistoryStore(self.history_path)
+        store.record_week(self.project_gid, 1, [("A", "B")], None)
+        config = Config(None, "1", None, None, None, False, False, history_store=store)
+
+        match_data = oneonone.load_matches_from_history_store(
+            config, self.project_gid, {"A": "C", "C": "A", "unmatched": "B"}, 2
+        )
+        # B's last match is still the store's
+        self.assertEqual(match_data, {"A": "C", "C": "A", "B": "A", "unmatched": "B"})
+        self.assertEqual(store.last_week(self.project_gid), 2)
+        # Older than the store's weeks
+        match_data = oneonone.load_matches_from_history_store(
+            config, self.project_gid, {"A": "D", "D": "A"}, 1
+        )
+        self.assertEqual(match_data["A"], "C")
+        store.close()
+
+    def test_store_from_before_week_key_follows_the_weekly_task(self):
+        store = MatchHistoryStore(self.history_path)
+        # Recorded on a Monday, one week_index before the weekly task's week_key
+        checksum = store.record_week(self.project_gid, 40, [("A", "B")], "C")
+        store.close()
+        connection = sqlite3.connect(self.history_path)
+        connection.execute("PRAGMA user_version = 0")
+        connection.close()
+
+        store = MatchHistoryStore(self.history_path)
+        config = Config(None, "1", None, None, None, False, False, history_store=store)
+        match_data = oneonone.load_matches_from_history_store(
+            config, self.project_gid, history_pointer(40, checksum), 41
+        )
+        self.assertEqual(match_data, {"A": "B", "B": "A", "unmatched": "C"})
+        self.assertEqual(store.last_week(self.project_gid), 41)
+        self.assertFalse(store.is_legacy(self.project_gid))
+        store.close()
+
+    def test_rematch_repairs_the_week_of_the_weekly_task(self):
+        monday = date(2026, 10, 12)
+        with FakeAsanaServer(self.asana) as server:
+            with today(monday):
+                self._main(server)
+            weekly_task = self._weekly_tasks()[0]
+            weekly_task["created_at"] = "2026-10-12T08:00:00.000Z"
+            member = next(
+                t
+                for t in self.asana.tasks.values()
+                if t["name"].startswith("Member") and t["assignee"]
+            )
+            self.asana.update_task(member["gid"], {"completed": True})
+            with today(monday):
+                self._main(server, rematch=True)
+
+        store = MatchHistoryStore(self.history_path)
+        self.assertEqual(store.last_week(self.project_gid), week_key(monday))
+        # The rematch replaced the week instead of recording the week before
+        self.assertEqual(
+            store.match_data(self.project_gid, before_week=week_key(monday)), {}
+        )
+        self.assertNotIn(member["assignee"]["gid"], store.match_data(self.project_gid))
+        store.close()
+
+    def test_lost_store_gets_rebuilt_from_the_weekly_task(self):
+        with FakeAsanaServer(self.asana) as server:
+            self._main(server)
+            store = MatchHistoryStore(self.history_path)
+            week_index = store.last_week(self.project_gid)
+            matched = store.match_data(self.project_gid)
+            store.close()
+            os.remove(self.history_path)
+            self._make_last_week()
+
+            with self.assertRaises(Exception):
+                self._main(server)
+            os.remove(self.history_path)
+            self._main(server, rebuild_history=True)
+
+        store = MatchHistoryStore(self.history_path)
+        history = store.pair_history(self.project_gid)
+        for m_id1, m_id2 in matched.items():
+            if m_id1 != "unmatched":
+                self.assertEqual(history.last_met(m_id1, m_id2), week_index)
+        store.close()
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+
+from asana_random_one_on_one.batch import (
+    BatchActionError,
+    BatchWriter,
+    create_subtask_action,
+)
+
+
+class FakeBatchClient(object):
+    def __init__(self, failing_names=()):
+        self.failing_names = failing_names
+        self.requests = []
+
+    def post(self, path, data):
+        self.requests.append((path, data["actions"]))
+        return [
+            (
+                {"status_code": 400, "body": {"errors": [{"message": "Bad"}]}}
+                if action["data"]["name"] in self.failing_names
+                else {
+                    "status_code": 201,
+                    "body": {"data": {"gid": action["data"]["name"]}},
+                }
+            )
+            for action in data["actions"]
+        ]
+
+
+class TestBatchWriter(unittest.TestCase):
+    def test_splits_actions_into_batches(self):
+        client = FakeBatchClient()
+        writer = BatchWriter(client, concurrency=2)
+        actions = [create_subtask_action("P", {"name": str(i)}) for i in range(25)]
+        results = writer.execute(actions)
+
+        self.assertEqual([r["gid"] for r in results], [str(i) for i in range(25)])
+        self.assertEqual(writer.request_count, 3)
+        self.assertEqual(
+            sorted(len(actions) for path, actions in client.requests), [5, 10, 10]
+        )
+        self.assertEqual(
+            client.requests[0][1][0],
+            {
+                "method": "post",
+                "relative_path": "/tasks/P/subtasks",
+                "data": {"name": "0"},
+            },
+        )
+
+    def test_failed_actions_are_returned_as_errors(self):
+        client = FakeBatchClient(failing_names=["1"])
+        results = BatchWriter(client).execute(
+            [create_subtask_action("P", {"name": str(i)}) for i in range(3)]
+        )
+
+        self.assertEqual(results[0], {"gid": "0"})
+        self.assertIsInstance(results[1], BatchActionError)
+        self.assertEqual(results[1].status_code, 400)
+        self.assertEqual(results[2], {"gid": "2"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+
+from asana_random_one_on_one.best_of import (
+    MatchPool,
+    MatchScore,
+    best_of_k_matches,
+    score_matches,
+    seeded_matches,
+)
+from asana_random_one_on_one.construct_matches import WEIGHTED, ConstructMatches
+from asana_random_one_on_one.member_profiles import compile_member_profiles
+from test.helpers import get_custom_field, member_id
+
+
+def create_profiles(count, teams=3):
+    members = [
+        {"id": "M{}".format(i), "Team": "T{}".format(i % teams)} for i in range(count)
+    ]
+    return compile_member_profiles(members, member_id, get_custom_field)
+
+
+class TestBestOf(unittest.TestCase):
+    def test_score_counts_repeats_and_cross_team_pairs(self):
+        # Only A, B and C are left for each other, so a repeat is forced
+        members = [
+            {"id": "A", "Team": "T1"},
+            {"id": "B", "Team": "T1"},
+            {"id": "C", "Team": "T2"},
+        ]
+        m = ConstructMatches(
+            members, {"C": "B", "unmatched": "A"}, member_id, get_custom_field
+        )
+        m.construct_matches()
+        score = score_matches(m, "A")
+
+        self.assertEqual(score.pairs, 1)
+        self.assertEqual(score.valid_pairs + score.repeats, 1)
+        self.assertEqual(score.prioritized, m.unmatched_member["id"] != "A")
+
+    def test_scores_are_compared_by_valid_pairs_first(self):
+        self.assertGreater(
+            MatchScore(pairs=2, valid_pairs=2, repeats=0).key,
+            MatchScore(pairs=2, valid_pairs=1, repeats=0, cross_team_pairs=2).key,
+        )
+        self.assertGreater(
+            MatchScore(valid_pairs=1, cross_team_pairs=1).key,
+            MatchScore(valid_pairs=1).key,
+        )
+
+    def test_seeded_matches_are_reproducible(self):
+        profiles = create_profiles(40)
+        previous = {"M1": "M2", "M2": "M1", "unmatched": "M3"}
+        orders = []
+        for _ in range(2):
+            m = seeded_matches(
+                profiles, previous, member_id, get_custom_field, 7, strategy=WEIGHTED
+            )
+            m.construct_matches()
+            orders.append([p.member_id for p in m.matched_profiles])
+            self.assertNotEqual(m.unmatched_member, profiles[3].member)
+        self.assertEqual(orders[0], orders[1])
+
+    def test_keeps_the_best_of_k(self):
+        profiles = create_profiles(41)
+        previous = {"unmatched": "M0"}
+        single = ConstructMatches(profiles, previous, member_id, get_custom_field)
+        single.construct_matches()
+
+        best, score, scored = best_of_k_matches(
+            profiles, previous, member_id, get_custom_field, 4, budget=60
+        )
+        self.assertEqual(scored, 4)
+        self.assertGreaterEqual(score.key, score_matches(single, "M0").key)
+        self.assertEqual(score.key, score_matches(best, "M0").key)
+        self.assertEqual(len(best.matched_profiles), 40)
+
+    def test_budget_keeps_the_first_matching(self):
+        profiles = create_profiles(10)
+        best, score, scored = best_of_k_matches(
+            profiles, {}, member_id, get_custom_field, 3, budget=0
+        )
+        self.assertEqual(scored, 1)
+        self.assertEqual(len(best.matched_profiles), 10)
+
+    def test_projects_share_the_pool_of_the_run(self):
+        pool = MatchPool(2)
+        try:
+            for count in [20, 21]:
+                best, score, scored = best_of_k_matches(
+                    create_profiles(count),
+                    {},
+                    member_id,
+                    get_custom_field,
+                    3,
+                    budget=60,
+                    pool=pool,
+                )
+                self.assertEqual(scored, 3)
+                self.assertEqual(len(best.matched_profiles), count // 2 * 2)
+            self.assertIsNotNone(pool._pool)
+        finally:
+            pool.close()
+        self.assertIsNone(pool._pool)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import itertools
+import random
+import unittest
+
+from asana_random_one_on_one.blossom import maximum_matching
+
+
+def brute_force_matching_size(count, edges):
+    best = 0
+    for size in range(count // 2, 0, -1):
+        for subset in itertools.combinations(edges, size):
+            vertices = [v for edge in subset for v in edge]
+            if len(set(vertices)) == len(vertices):
+                return size
+    return best
+
+
+class TestBlossom(unittest.TestCase):
+    def _assert_valid(self, adjacency, mate):
+        for v, m in enumerate(mate):
+            if m != -1:
+                self.assertEqual(mate[m], v)
+                self.assertIn(m, adjacency[v])
+
+    def test_odd_cycle_with_a_tail(self):
+        # Greedy matching of 0:1 and 2:3 leaves 4 and 5 free, an augmenting path goes through the
+        # blossom 1-2-3
+        edges = [(0, 1), (1, 2), (2, 3), (3, 1), (3, 4), (0, 5)]
+        adjacency = [set() for _ in range(6)]
+        for a, b in edges:
+            adjacency[a].add(b)
+            adjacency[b].add(a)
+        mate = maximum_matching(6, lambda v: sorted(adjacency[v]))
+        self._assert_valid(adjacency, mate)
+        self.assertNotIn(-1, mate)
+
+    def test_random_graphs_are_maximum(self):
+        rng = random.Random(3)
+        for _ in range(100):
+            count = rng.randint(1, 9)
+            edges = [
+                (a, b)
+                for a, b in itertools.combinations(range(count), 2)
+                if rng.random() < 0.3
+            ]
+            adjacency = [set() for _ in range(count)]
+            for a, b in edges:
+                adjacency[a].add(b)
+                adjacency[b].add(a)
+            mate = maximum_matching(count, lambda v: sorted(adjacency[v]))
+            self._assert_valid(adjacency, mate)
+            matched = len([m for m in mate if m != -1]) // 2
+            self.assertEqual(matched, brute_force_matching_size(count, edges))
+
+    def test_order_decides_who_gets_matched(self):
+        # Path 0-1-2, only one of 0 and 2 can be matched
+        adjacency = [[1], [0, 2], [1]]
+        mate = maximum_matching(3, lambda v: adjacency[v], order=[2, 1, 0])
+        self.assertEqual(mate, [-1, 2, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
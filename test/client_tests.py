@@ -0,0 +1,113 @@
+import threading
+import time
+import unittest
+
+from asana import error
+
+from asana_random_one_on_one.client import Client, RateLimiter
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, data=None, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._data = data
+
+    def json(self):
+        return {"data": self._data, "errors": [{"message": "Throttled"}]}
+
+
+class FakeSession(object):
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.hooks = {"response": []}
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def get(self, url, **options):
+        with self._lock:
+            self.last_options = options
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            response = self.responses.pop(0) if self.responses else FakeResponse(200)
+        time.sleep(0.01)
+        with self._lock:
+            self.in_flight -= 1
+        return response
+
+
+class TestRateLimitedClient(unittest.TestCase):
+    def test_retries_after_the_retry_after_header(self):
+        session = FakeSession(
+            [
+                FakeResponse(429, headers={"Retry-After": "0.05"}),
+                FakeResponse(200, data={"gid": "1"}),
+            ]
+        )
+        limiter = RateLimiter(max_concurrency=4)
+        client = Client(session=session, rate_limiter=limiter)
+
+        started = time.monotonic()
+        self.assertEqual(client.tasks.find_by_id("1"), {"gid": "1"})
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+        self.assertEqual(session.requests, 2)
+        self.assertEqual(limiter.throttled_count, 1)
+        self.assertEqual(limiter.concurrency, 2)
+        self.assertGreater(limiter.wait_time, 0)
+
+    def test_gives_up_after_max_retries(self):
+        session = FakeSession(
+            [FakeResponse(429, headers={"Retry-After": "0"}) for _ in range(3)]
+        )
+        client = Client(session=session, rate_limiter=RateLimiter(), max_retries=2)
+
+        with self.assertRaises(error.RateLimitEnforcedError):
+            client.tasks.find_by_id("1")
+        self.assertEqual(session.requests, 3)
+
+    def test_limits_requests_in_flight(self):
+        session = FakeSession([])
+        client = Client(session=session, rate_limiter=RateLimiter(max_concurrency=3))
+
+        threads = [
+            threading.Thread(target=client.tasks.find_by_id, args=("1",))
+            for _ in range(12)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(session.requests, 12)
+        self.assertLessEqual(session.max_in_flight, 3)
+
+    def test_configure_pool(self):
+        client = Client.access_token("token")
+        client.configure_pool(7, timeout=5)
+
+        adapter = client.session.get_adapter("https://app.asana.com")
+        self.assertEqual(adapter._pool_maxsize, 7)
+        self.assertTrue(adapter._pool_block)
+        self.assertIn("gzip", client.session.headers["Accept-Encoding"])
+
+        session = FakeSession([FakeResponse(200, data={})])
+        client = Client(session=session)
+        client.options["timeout"] = 5
+        client.tasks.find_by_id("1")
+        self.assertEqual(session.last_options["timeout"], 5)
+
+    def test_concurrency_grows_back_after_successful_requests(self):
+        limiter = RateLimiter(max_concurrency=4)
+        limiter.acquire()
+        limiter.release(throttled=True)
+        self.assertEqual(limiter.concurrency, 2)
+        for _ in range(4):
+            limiter.acquire()
+            limiter.release()
+        self.assertEqual(limiter.concurrency, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
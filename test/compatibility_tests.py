@@ -0,0 +1,63 @@
+import random
+import unittest
+
+from asana_random_one_on_one.compatibility import bits, lowest_bit
+from asana_random_one_on_one.construct_matches import ConstructMatches
+from test.helpers import get_custom_field, member_id
+
+
+class TestCompatibilityIndex(unittest.TestCase):
+    def test_bit_helpers(self):
+        self.assertEqual(lowest_bit(0), -1)
+        self.assertEqual(lowest_bit(0b10100), 2)
+        self.assertEqual(list(bits(0b10100)), [2, 4])
+
+    def test_index_agrees_with_pairwise_checks(self):
+        rng = random.Random(1)
+        teams = [None, "T1", "T2", "T3"]
+        preferences = [
+            None,
+            "No preference (default)",
+            "Only match with same team",
+            "Only match with other teams",
+        ]
+        ids = [str(i) for i in range(40)]
+        members = [
+            {
+                "id": i,
+                "Team": rng.choice(teams),
+                "Match Preference": rng.choice(preferences),
+            }
+            for i in ids
+        ]
+        previous_matches = {i: rng.choice(ids) for i in ids if rng.random() < 0.5}
+        m = ConstructMatches(members, previous_matches, member_id, get_custom_field)
+
+        for p1 in m.profiles:
+            for p2 in m.profiles:
+                if p1 is p2:
+                    continue
+                expected = not m.got_matched_last_time(
+                    p1, p2
+                ) and m.compatible_match_preferences(p1, p2)
+                self.assertEqual(
+                    m.compatibility.can_be_matched(p1, p2),
+                    expected,
+                    (p1.member, p2.member),
+                )
+                self.assertEqual(
+                    (m.compatibility.row(p1) >> p2.index) & 1 == 1, expected
+                )
+
+        # Searching the buckets finds the same member as searching the member's row
+        for _ in range(200):
+            candidates = rng.getrandbits(len(m.profiles))
+            p1 = rng.choice(m.profiles)
+            self.assertEqual(
+                m.compatibility.first_match(p1, candidates),
+                lowest_bit(m.compatibility.row(p1) & candidates),
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,20 +1,21 @@
 from __future__ import print_function
+import threading
+import tracemalloc
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 
-from asana_random_one_on_one.construct_matches import ConstructMatches
+from asana_random_one_on_one.construct_matches import (
+    BLOSSOM,
+    WEIGHTED,
+    ConstructMatches,
+)
+from asana_random_one_on_one.pair_history import PairHistory
+from test.helpers import get_custom_field, member_id
 
 Same = "SameTeam"
 Other = "OtherTeam"
 
 
-def member_id(m):
-    return m["id"]
-
-
-def get_custom_field(member, name, default=None):
-    return member[name] if member.get(name) else default
-
-
 def create_members(list_of_members):
     return [{"id": i} for i in list_of_members]
 
@@ -196,6 +197,77 @@ class TestConstructMatches(unittest.TestCase):
         expected_matches = ["C", "D", "B", "A"]
         self._assert(m, expected_matches, expected_data, None)
 
+    def test_blossom_strategy_finds_matches_for_everyone(self):
+        previous_matches = {"A": "D", "C": "B", "D": "B", "E": "B", "F": "D"}
+        # Greedy can't find a valid match for D and B so they get matched again
+        members = create_members(["A", "B", "C", "D", "E", "F"])
+        m = ConstructMatches(members, previous_matches, member_id, get_custom_field)
+        m.construct_matches()
+        self.assertEqual(m.match_data["D"], "B")
+
+        members = create_members(["A", "B", "C", "D", "E", "F"])
+        m = ConstructMatches(
+            members, previous_matches, member_id, get_custom_field, strategy=BLOSSOM
+        )
+        m.construct_matches()
+
+        expected_data = {"A": "E", "E": "A", "C": "D", "D": "C", "F": "B", "B": "F"}
+        expected_matches = ["F", "B", "E", "A", "D", "C"]
+        self._assert(m, expected_matches, expected_data, None)
+
+    def test_blossom_strategy_matches_unmatchable_members_anyway(self):
+        previous_matches = {"A": "B", "B": "A", "C": "A", "D": "A", "E": "A"}
+        members = create_members(["B", "C", "D", "E", "A"])
+        m = ConstructMatches(
+            members, previous_matches, member_id, get_custom_field, strategy=BLOSSOM
+        )
+        m.construct_matches()
+
+        expected_data = {
+            "A": "B",
+            "E": "B",
+            "B": "E",
+            "D": "C",
+            "C": "D",
+            "unmatched": "A",
+        }
+        expected_matches = ["E", "B", "D", "C"]
+        self._assert(m, expected_matches, expected_data, "A")
+
+    def test_weighted_strategy_prefers_pairs_that_met_longest_ago(self):
+        history = PairHistory()
+        history.record(10, [("A", "D"), ("B", "C")])
+        history.record(8, [("A", "C"), ("B", "D")])
+        history.record(5, [("A", "B"), ("C", "D")])
+        members = create_members(["A", "B", "C", "D"])
+        m = ConstructMatches(
+            members,
+            {},
+            member_id,
+            get_custom_field,
+            strategy=WEIGHTED,
+            pair_history=history,
+            week=11,
+        )
+        m.construct_matches()
+
+        expected_data = {"D": "C", "C": "D", "B": "A", "A": "B"}
+        expected_matches = ["D", "C", "B", "A"]
+        self._assert(m, expected_matches, expected_data, None)
+
+    def test_weighted_strategy_prefers_other_teams(self):
+        members = create_members_with_preferences(
+            [["A", "T1", None], ["B", "T1", None], ["C", "T2", None], ["D", "T2", None]]
+        )
+        m = ConstructMatches(
+            members, {}, member_id, get_custom_field, strategy=WEIGHTED
+        )
+        m.construct_matches()
+
+        for m1, m2 in zip(m.matched_members[::2], m.matched_members[1::2]):
+            self.assertNotEqual(m1["Team"], m2["Team"])
+        self.assertIsNone(m.unmatched_member)
+
     """
     Lets test compatible_match_preferences for all possible outcomes
     Legend:
@@ -213,6 +285,101 @@ class TestConstructMatches(unittest.TestCase):
     6    1  1  1  1  | ?   Both have Team and Preference, possible match
     """
 
+    def test_stats_count_break_ups_and_fallback_pairings(self):
+        previous_matches = {"A": "D", "C": "B", "D": "B", "E": "B", "F": "D"}
+        members = create_members(["A", "B", "C", "D", "E", "F"])
+        m = ConstructMatches(members, previous_matches, member_id, get_custom_field)
+        stats = m.construct_matches()
+
+        self.assertIs(stats, m.stats)
+        self.assertEqual(stats.members, 6)
+        self.assertGreater(stats.first_match, 0)
+        self.assertGreater(stats.break_up_attempts, 0)
+        self.assertEqual(stats.break_up_successes, 0)
+        # D and B had no valid match left
+        self.assertEqual(stats.fallback_pairings, 1)
+        self.assertEqual(sorted(stats.phase_times), ["compile", "finalize", "match"])
+        self.assertIsNone(stats.profile)
+
+    def test_stats_count_successful_break_ups(self):
+        # D takes A, C can't match with B again so it breaks up D:A and B gets A
+        members = create_members(["A", "B", "C", "D"])
+        m = ConstructMatches(members, {"B": "C"}, member_id, get_custom_field)
+        stats = m.construct_matches()
+
+        self.assertEqual(
+            [member["id"] for member in m.matched_members], ["C", "D", "A", "B"]
+        )
+        self.assertEqual(stats.break_up_attempts, 1)
+        self.assertEqual(stats.break_up_successes, 1)
+        self.assertEqual(stats.fallback_pairings, 0)
+
+    def test_repair_matches_pairs_the_partner_of_a_member_who_left(self):
+        # D left, C gets E who was unmatched this week. E comes last, it has priority.
+        members = create_members(["A", "B", "C", "E"])
+        week_data = {"A": "B", "B": "A", "C": "D", "D": "C", "unmatched": "E"}
+        m = ConstructMatches(members, {}, member_id, get_custom_field)
+        stats = m.repair_matches([("A", "B"), ("C", "D")], week_data)
+
+        expected_data = {
+            "A": "B",
+            "B": "A",
+            "C": "E",
+            "D": "C",
+            "E": "C",
+            "unmatched": "",
+        }
+        self._assert(m, ["A", "B", "E", "C"], expected_data, None)
+        self.assertEqual(stats.break_up_attempts, 0)
+
+    def test_repair_matches_rewires_a_pair_for_a_member_who_joined(self):
+        # F joined, E was unmatched but met F last week. E breaks up A:B and B gets F.
+        members = create_members(["A", "B", "F", "E"])
+        week_data = {"A": "B", "B": "A", "unmatched": "E"}
+        m = ConstructMatches(members, {"E": "F", "F": "E"}, member_id, get_custom_field)
+        stats = m.repair_matches([("A", "B")], week_data)
+
+        expected_data = {"A": "E", "B": "F", "E": "A", "F": "B", "unmatched": ""}
+        self._assert(m, ["E", "A", "B", "F"], expected_data, None)
+        self.assertEqual(stats.break_up_successes, 1)
+
+    def test_repair_matches_leaves_a_member_who_joined_unmatched(self):
+        members = create_members(["A", "B", "C"])
+        week_data = {"A": "B", "B": "A", "unmatched": ""}
+        m = ConstructMatches(members, {}, member_id, get_custom_field)
+        m.repair_matches([("A", "B")], week_data)
+
+        self._assert(m, ["A", "B"], {"A": "B", "B": "A", "unmatched": "C"}, "C")
+
+    def test_profilers(self):
+        members = create_members(["A", "B", "C", "D"])
+        m = ConstructMatches(members, {}, member_id, get_custom_field, profiler="cpu")
+        stats = m.construct_matches()
+        self.assertIn("construct_greedy_matches", stats.profile)
+
+        m = ConstructMatches(
+            members, {}, member_id, get_custom_field, profiler="memory"
+        )
+        stats = m.construct_matches()
+        self.assertGreater(stats.peak_memory, 0)
+        self.assertIn("peak_memory=", str(stats))
+
+    def test_memory_profiles_in_parallel_share_the_tracing(self):
+        members = create_members([str(i) for i in range(40)])
+        started = threading.Barrier(4)
+
+        def profile(_):
+            m = ConstructMatches(
+                members, {}, member_id, get_custom_field, profiler="memory"
+            )
+            started.wait()
+            return m.construct_matches()
+
+        with ThreadPoolExecutor(4) as executor:
+            for stats in executor.map(profile, range(4)):
+                self.assertGreater(stats.peak_memory, 0)
+        self.assertFalse(tracemalloc.is_tracing())
+
     def test_members_without_the_team_field_results_in_a_match(self):
         # Test all combinations of Case 1 and 2
         # All combinations of one member having no Team
@@ -0,0 +1,93 @@
+import os
+import tempfile
+import unittest
+
+from asana_random_one_on_one.client import Client
+from asana_random_one_on_one.discovery import (
+    SEARCH_LIMIT,
+    DiscoveryManifest,
+    search_bot_tasks,
+)
+from asana_random_one_on_one.fake_asana import FakeAsana, FakeAsanaServer
+
+
+class TestSearchBotTasks(unittest.TestCase):
+    def setUp(self):
+        # The fake server is plain http on localhost
+        os.environ.setdefault("OAUTHLIB_INSECURE_TRANSPORT", "1")
+
+    def test_searches_past_the_search_limit(self):
+        asana = FakeAsana()
+        for i in range(SEARCH_LIMIT + 20):
+            task = asana.create_task({"name": "1:1 bot", "assignee": "bot"})
+            # Distinct creation times, the next search goes on from the last one
+            task["created_at"] = "2024-01-01T00:{:02d}:{:02d}Z".format(i // 60, i % 60)
+        asana.create_task({"name": "1:1 bot", "assignee": "someone else"})
+        asana.create_task({"name": "1:1 bot", "assignee": "bot", "completed": True})
+        asana.create_task({"name": "Other", "assignee": "bot"})
+
+        with FakeAsanaServer(asana) as server:
+            client = Client(base_url=server.base_url, max_retries=0)
+            tasks = list(
+                search_bot_tasks(
+                    client, asana.workspace_gid, "bot", "1:1", ["name", "created_at"]
+                )
+            )
+            searches = server.request_counts[("GET", "/workspaces/{gid}/tasks/search")]
+
+        self.assertEqual(len(tasks), SEARCH_LIMIT + 20)
+        self.assertEqual(len({t["gid"] for t in tasks}), len(tasks))
+        self.assertEqual(searches, 2)
+
+    def test_keeps_tasks_created_at_the_same_time_as_the_last_one_found(self):
+        asana = FakeAsana()
+        created = []
+        for i in range(SEARCH_LIMIT + 20):
+            task = asana.create_task({"name": "1:1 bot", "assignee": "bot"})
+            task["created_at"] = "2024-01-01T00:{:02d}:{:02d}.000Z".format(
+                i // 60, i % 60
+            )
+            created.append(task)
+        # Newest first, the 100th and 101st task share their creation time
+        created_at = created[-SEARCH_LIMIT]["created_at"]
+        created[-SEARCH_LIMIT - 1]["created_at"] = created_at
+
+        with FakeAsanaServer(asana) as server:
+            client = Client(base_url=server.base_url, max_retries=0)
+            tasks = list(
+                search_bot_tasks(
+                    client, asana.workspace_gid, "bot", "1:1", ["name", "created_at"]
+                )
+            )
+
+        self.assertEqual(tasks[SEARCH_LIMIT - 1]["created_at"], created_at)
+        self.assertEqual(tasks[SEARCH_LIMIT]["created_at"], created_at)
+        self.assertEqual(len(tasks), SEARCH_LIMIT + 20)
+        self.assertEqual(len({t["gid"] for t in tasks}), len(tasks))
+
+
+class TestDiscoveryManifest(unittest.TestCase):
+    def test_kept_between_runs_of_the_same_bot(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "discovery.json")
+            manifest = DiscoveryManifest(path, "ws", "bot", "1:1")
+            manifest.record("P1", "T1", "M1", "U1")
+            manifest.record("P2", "T2", "M2", "U2")
+            manifest.record("P3", "T3", "M3", "U3")
+            manifest.forget("P2")
+            manifest.retain(["P1", "P2"])
+            manifest.save()
+
+            loaded = DiscoveryManifest(path, "ws", "bot", "1:1")
+            self.assertEqual(loaded.sections("P1", "T1"), ("M1", "U1"))
+            self.assertIsNone(loaded.sections("P2", "T2"))
+            self.assertIsNone(loaded.sections("P3", "T3"))
+            # The bot's task in the project changed
+            self.assertIsNone(loaded.sections("P1", "T4"))
+
+            other = DiscoveryManifest(path, "ws", "bot", "Other task")
+            self.assertIsNone(other.sections("P1", "T1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
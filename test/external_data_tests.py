@@ -0,0 +1,62 @@
+import json
+import random
+import unittest
+
+from asana_random_one_on_one.external_data import (
+    COMPACT_PREFIX,
+    EXTERNAL_DATA_LIMIT,
+    check_external_data_size,
+    decode_external_data,
+    encode_external_data,
+)
+from asana_random_one_on_one.match_history import history_pointer
+
+
+def generate_match_data(members, seed=0):
+    rng = random.Random(seed)
+    ids = [str(rng.randrange(10**15, 10**16)) for _ in range(members)]
+    data = {}
+    for m_id1, m_id2 in zip(ids[::2], ids[1::2]):
+        data[m_id1] = m_id2
+        data[m_id2] = m_id1
+    data["unmatched"] = ids[-1] if members % 2 else ""
+    return data
+
+
+class TestExternalData(unittest.TestCase):
+    def test_round_trip(self):
+        for data in [
+            {},
+            {"A": "B", "B": "A", "unmatched": ""},
+            # C got matched again since, B's match is from an earlier week
+            {"A": "C", "C": "A", "B": "A", "D": "B", "unmatched": "E"},
+            {"A": "B", "B": "A"},
+            # Names when using names as ids, and ids that only look like numbers
+            {"Alice": "007", "007": "Alice", "12": "Bob", "unmatched": "12"},
+            generate_match_data(101),
+        ]:
+            encoded = encode_external_data(data)
+            self.assertTrue(encoded.startswith(COMPACT_PREFIX))
+            self.assertEqual(decode_external_data(encoded), data)
+
+    def test_reads_legacy_json(self):
+        data = {"A": "B", "B": "A", "unmatched": "C"}
+        self.assertEqual(decode_external_data(json.dumps(data)), data)
+
+    def test_history_pointer_stays_json(self):
+        pointer = history_pointer(12, "abc")
+        self.assertEqual(encode_external_data(pointer), json.dumps(pointer))
+        self.assertEqual(decode_external_data(encode_external_data(pointer)), pointer)
+
+    def test_large_projects_fit(self):
+        data = generate_match_data(2001)
+        encoded = encode_external_data(data)
+        self.assertGreater(len(json.dumps(data)), EXTERNAL_DATA_LIMIT)
+        self.assertLess(len(encoded), EXTERNAL_DATA_LIMIT)
+        check_external_data_size(encoded, "P")
+        with self.assertRaises(Exception):
+            check_external_data_size("x" * (EXTERNAL_DATA_LIMIT + 1), "P")
+
+
+if __name__ == "__main__":
+    unittest.main()
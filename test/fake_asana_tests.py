@@ -0,0 +1,91 @@
+import unittest
+
+from asana_random_one_on_one.benchmark import run_benchmark
+from asana_random_one_on_one.fake_asana import (
+    FakeAsana,
+    FakeAsanaServer,
+    generate_workspace,
+    project_fields,
+)
+
+
+class TestProjectFields(unittest.TestCase):
+    def test_keeps_requested_fields(self):
+        task = {
+            "gid": "1",
+            "name": "Task",
+            "notes": "Long notes",
+            "assignee": {"gid": "2", "name": "Someone", "email": "x"},
+            "custom_fields": [{"name": "Team", "enum_value": {"name": "A"}}],
+        }
+        self.assertEqual(
+            project_fields(task, ["name", "assignee.name", "custom_fields.name"]),
+            {
+                "gid": "1",
+                "name": "Task",
+                "assignee": {"gid": "2", "name": "Someone"},
+                "custom_fields": [{"name": "Team"}],
+            },
+        )
+        self.assertEqual(project_fields(task, None), task)
+
+
+class TestFakeAsanaServer(unittest.TestCase):
+    def test_paginates_section_tasks(self):
+        asana = FakeAsana()
+        project_gid = asana.create_project()
+        section = asana.create_section(project_gid, "Members")
+        for i in range(7):
+            task = asana.create_task({"name": str(i)})
+            asana.add_project(
+                task["gid"], {"project": project_gid, "section": section["gid"]}
+            )
+        server = FakeAsanaServer(asana)
+
+        route, status, page = server.route(
+            "get",
+            "/sections/{}/tasks".format(section["gid"]),
+            {"limit": ["5"], "opt_fields": ["name"]},
+            {},
+        )
+        self.assertEqual([t["name"] for t in page["data"]], ["0", "1", "2", "3", "4"])
+        self.assertEqual(page["next_page"]["offset"], "5")
+
+        route, status, page = server.route(
+            "get",
+            "/sections/{}/tasks".format(section["gid"]),
+            {"limit": ["5"], "offset": ["5"]},
+            {},
+        )
+        self.assertEqual([t["name"] for t in page["data"]], ["5", "6"])
+        self.assertIsNone(page["next_page"])
+
+    def test_generated_workspace(self):
+        asana = generate_workspace(projects=3, members=(4, 4), bot_gid="bot")
+        self.assertEqual(len(asana.projects), 3)
+        bot_tasks = [
+            t
+            for t in asana.tasks.values()
+            if t["assignee"] and t["assignee"]["gid"] == "bot"
+        ]
+        self.assertEqual(len(bot_tasks), 3)
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_runs_all_projects(self):
+        report = run_benchmark(
+            projects=3,
+            members=(4, 6),
+            throttle_every=7,
+            requests_per_minute=100000,
+        )
+        self.assertEqual(
+            report["requests_per_route"]["POST /workspaces/{gid}/tasks"], 3
+        )
+        self.assertEqual(report["requests_per_route"]["GET /tasks"], 1)
+        self.assertGreater(report["throttled"], 0)
+        self.assertEqual(report["requests"], sum(report["requests_per_route"].values()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import asana_random_one_on_one.asana_random_one_on_one as oneonone
+from asana_random_one_on_one.fake_asana import generate_workspace
+
+
+def member_id(m):
+    return m["id"]
+
+
+def assignee_gid(m):
+    """Member id of a member task, as used by the bot"""
+    return m["assignee"]["gid"]
+
+
+def get_custom_field(member, name, default=None):
+    return member[name] if member.get(name) else default
+
+
+def today(day):
+    """Patches the date Config takes the week from, e.g. with mock.patch as a context manager"""
+
+    class _datetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return cls.combine(day, datetime.min.time())
+
+    return mock.patch("asana_random_one_on_one.config.datetime", _datetime)
+
+
+class FakeAsanaTestCase(unittest.TestCase):
+    """Runs main against a FakeAsanaServer of a generated workspace"""
+
+    # Arguments of generate_workspace
+    workspace = {}
+    # Whether main runs for the workspace's first project or for all projects of the bot
+    single_project = True
+
+    def setUp(self):
+        # The fake server is plain http on localhost
+        os.environ.setdefault("OAUTHLIB_INSECURE_TRANSPORT", "1")
+        self.asana = generate_workspace(**self.workspace)
+        self.project_gid = next(iter(self.asana.projects))
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        """:return: Path of a file in the test's temporary directory"""
+        return os.path.join(self.directory.name, name)
+
+    def main_options(self):
+        """:return: Options every main of the test runs with"""
+        return {}
+
+    def _main(self, server, **options):
+        options = dict(self.main_options(), **options)
+        if self.single_project:
+            options.setdefault("project_gid", self.project_gid)
+        oneonone.main(
+            "pat",
+            self.asana.workspace_gid,
+            base_url=server.base_url,
+            requests_per_minute=100000,
+            **options
+        )
+
+    def _weekly_tasks(self):
+        return [t for t in self.asana.tasks.values() if "weeks Random 1:1" in t["name"]]
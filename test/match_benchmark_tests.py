@@ -0,0 +1,80 @@
+import unittest
+
+from asana_random_one_on_one.construct_matches import GREEDY
+from asana_random_one_on_one.match_benchmark import (
+    Scenario,
+    generate_population,
+    regressions,
+    run_scenario,
+    run_suite,
+)
+
+
+class TestMatchBenchmark(unittest.TestCase):
+    def test_generate_population(self):
+        scenario = Scenario("s", 50, 3, 0.2, 0.2, 0.5, False, (GREEDY,))
+        members, previous_matches = generate_population(scenario)
+        self.assertEqual(len(members), 50)
+        self.assertEqual(len(previous_matches), 24)
+        for m_id1, m_id2 in previous_matches.items():
+            self.assertEqual(previous_matches[m_id2], m_id1)
+        self.assertEqual(generate_population(scenario), (members, previous_matches))
+
+    def test_adversarial_scenario_breaks_up_matches(self):
+        scenario = Scenario("s", 100, 0, 0, 0, 0, True, (GREEDY,))
+        result = run_scenario(scenario, GREEDY, measure_memory=False)
+        self.assertEqual(result["matches"], 50)
+        self.assertGreater(result["break_up_attempts"], 0)
+        self.assertGreater(result["checks"], 100)
+
+    def test_run_suite(self):
+        scenarios = [
+            Scenario("small", 20, 2, 0.1, 0.1, 1.0, False, (GREEDY,)),
+            Scenario("large", 1000, 2, 0.1, 0.1, 1.0, False, (GREEDY,)),
+        ]
+        results = run_suite(scenarios, max_size=100)
+        self.assertEqual(list(results), ["small/greedy"])
+        self.assertIn("peak_memory", results["small/greedy"])
+        # Repeated runs give the same counters
+        once = run_suite(scenarios, max_size=100, measure_memory=False, repeats=1)
+        del once["small/greedy"]["time"], results["small/greedy"]["time"]
+        del results["small/greedy"]["peak_memory"]
+        self.assertEqual(once, results)
+
+    def test_regressions(self):
+        baseline = {
+            "a/greedy": {"time": 1.0, "checks": 100, "invalid_matches": 0},
+            "b/greedy": {
+                "time": 0.001,
+                "checks": 100,
+                "break_up_attempts": 10,
+                "invalid_matches": 0,
+            },
+        }
+        results = {
+            "a/greedy": {"time": 2.5, "checks": 100, "invalid_matches": 0},
+            # Slower but within the slack
+            "b/greedy": {
+                "time": 0.01,
+                "checks": 200,
+                "break_up_attempts": 12,
+                "invalid_matches": 1,
+            },
+            "c/greedy": {"time": 100, "checks": 100, "invalid_matches": 0},
+        }
+        self.assertEqual(
+            regressions(results, baseline),
+            [
+                "b/greedy checks: 200 (baseline 100)",
+                "b/greedy break_up_attempts: 12 (baseline 10)",
+                "b/greedy invalid_matches: 1 (baseline 0)",
+            ],
+        )
+        self.assertEqual(
+            regressions(results, baseline, check_time=True)[0],
+            "a/greedy time: 2.5 (baseline 1.0)",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from asana_random_one_on_one.match_history import (
+    MatchHistoryStore,
+    history_pointer,
+    parse_history_pointer,
+)
+
+
+class TestMatchHistoryStore(unittest.TestCase):
+    def setUp(self):
+        self.store = MatchHistoryStore(":memory:")
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_match_data_has_latest_match_of_every_member(self):
+        self.store.import_match_data(
+            "P", 1, {"A": "B", "B": "A", "C": "D", "D": "C", "unmatched": "E"}
+        )
+        self.store.record_week("P", 2, [("A", "C"), ("E", "B")], "D")
+        self.store.record_week("Other", 3, [("A", "B")], None)
+
+        expected_data = {
+            "A": "C",
+            "C": "A",
+            "B": "E",
+            "E": "B",
+            "D": "C",
+            "unmatched": "D",
+        }
+        self.assertEqual(self.store.match_data("P"), expected_data)
+        self.assertEqual(self.store.match_data("Unknown"), {})
+
+    def test_pair_history(self):
+        self.store.record_week("P", 1, [("A", "B")], None)
+        self.store.record_week("P", 2, [("A", "C")], "B")
+        self.store.record_week("P", 5, [("B", "A")], "C")
+
+        history = self.store.pair_history("P")
+        self.assertEqual(history.last_met("A", "B"), 5)
+        self.assertEqual(history.last_met("C", "A"), 2)
+        self.assertIsNone(history.last_met("B", "C"))
+        self.assertIsNone(self.store.pair_history("P", since_week=3).last_met("A", "C"))
+
+    def test_checksum_is_kept_for_each_week(self):
+        checksum = self.store.record_week("P", 1, [("A", "B")], None)
+        self.assertEqual(self.store.checksum("P", 1), checksum)
+        self.assertIsNone(self.store.checksum("P", 2))
+        self.assertNotEqual(checksum, self.store.record_week("P", 2, [("A", "B")], "C"))
+
+    def test_replacing_a_week(self):
+        self.store.record_week("P", 1, [("A", "B")], "C")
+        self.store.record_week("P", 2, [("A", "C")], "B")
+        checksum = self.store.record_week("P", 2, [("B", "C")], "A", replace=True)
+
+        self.assertEqual(self.store.checksum("P", 2), checksum)
+        self.assertEqual(
+            self.store.match_data("P"),
+            {"A": "B", "B": "C", "C": "B", "unmatched": "A"},
+        )
+        self.assertEqual(
+            self.store.match_data("P", before_week=2),
+            {"A": "B", "B": "A", "unmatched": "C"},
+        )
+
+    def test_stores_from_before_week_key_get_migrated_by_project(self):
+        self.assertFalse(self.store.is_legacy("P"))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "history.db")
+            store = MatchHistoryStore(path)
+            store.record_week("P", 10, [("A", "B")], "C")
+            store.record_week("P", 11, [("A", "C")], "B")
+            store.record_week("Q", 11, [("A", "B")], None)
+            store.close()
+            # The version of a store from before week_key
+            connection = sqlite3.connect(path)
+            connection.execute("PRAGMA user_version = 0")
+            connection.close()
+
+            store = MatchHistoryStore(path)
+            self.assertTrue(store.is_legacy("P"))
+            checksum = store.checksum("P", 11)
+            store.migrate("P", 1)
+            self.assertFalse(store.is_legacy("P"))
+            self.assertTrue(store.is_legacy("Q"))
+            self.assertEqual(store.checksum("P", 12), checksum)
+            self.assertEqual(store.pair_history("P").last_met("A", "B"), 11)
+            self.assertEqual(store.match_data("P", before_week=12)["A"], "B")
+            store.close()
+
+            # Migrated once
+            store = MatchHistoryStore(path)
+            self.assertFalse(store.is_legacy("P"))
+            store.close()
+
+    def test_history_pointer(self):
+        self.assertEqual(parse_history_pointer(history_pointer(3, "abc")), (3, "abc"))
+        self.assertIsNone(parse_history_pointer({"A": "B", "unmatched": ""}))
+
+
+if __name__ == "__main__":
+    unittest.main()
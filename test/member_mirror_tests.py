@@ -0,0 +1,124 @@
+import os
+import tempfile
+import unittest
+
+from asana_random_one_on_one.client import Client
+from asana_random_one_on_one.fake_asana import FakeAsanaServer, generate_workspace
+from asana_random_one_on_one.member_mirror import MemberMirror, sync_members_tasks
+from asana_random_one_on_one.projections import MEMBER_TASKS
+
+
+class TestMemberMirror(unittest.TestCase):
+    def setUp(self):
+        self.asana = generate_workspace(projects=1, members=(8, 8), seed=3)
+        self.project_gid = next(iter(self.asana.projects))
+        self.members_section = self.asana.projects[self.project_gid]["sections"][1]
+        directory = tempfile.mkdtemp()
+        self.mirror = MemberMirror(os.path.join(directory, "members.db"))
+        self.addCleanup(self.mirror.close)
+
+    def member_gids(self):
+        return list(self.asana.sections[self.members_section]["tasks"])
+
+    def sync(self, server):
+        client = Client(base_url=server.base_url, max_retries=0)
+        return sync_members_tasks(
+            client,
+            self.mirror,
+            self.project_gid,
+            self.members_section,
+            MEMBER_TASKS.opt_fields,
+        )
+
+    def test_first_sync_fetches_the_whole_section(self):
+        with FakeAsanaServer(self.asana) as server:
+            tasks = self.sync(server)
+        self.assertEqual([t["gid"] for t in tasks], self.member_gids())
+        self.assertEqual(self.mirror.full_syncs, 1)
+        self.assertEqual(
+            self.mirror.sync_token(self.project_gid),
+            (self.members_section, self.asana.sync_token()),
+        )
+        self.assertEqual(len(self.mirror.members(self.project_gid)), 8)
+
+    def test_only_fetches_changed_tasks(self):
+        gids = self.member_gids()
+        with FakeAsanaServer(self.asana) as server:
+            self.sync(server)
+            self.asana.update_task(gids[0], {"name": "Renamed"})
+            self.asana.update_task(
+                gids[1],
+                {
+                    "assignee": dict(
+                        self.asana.tasks[gids[1]]["assignee"],
+                        vacation_dates={"start_date": "2019-01-01", "end_date": None},
+                    )
+                },
+            )
+            self.asana.remove_project(gids[2], self.project_gid)
+            new_member = self.asana.create_task(
+                {"name": "New", "assignee": "u100", "projects": [self.project_gid]}
+            )
+            self.asana.remove_project(new_member["gid"], self.project_gid)
+            self.asana.add_project(
+                new_member["gid"],
+                {"project": self.project_gid, "section": self.members_section},
+            )
+            server.request_counts.clear()
+            tasks = self.sync(server)
+
+        by_gid = {t["gid"]: t for t in tasks}
+        self.assertEqual(list(by_gid), self.member_gids())
+        self.assertEqual(by_gid[gids[0]]["name"], "Renamed")
+        self.assertEqual(
+            by_gid[gids[1]]["assignee"]["vacation_dates"]["start_date"], "2019-01-01"
+        )
+        self.assertNotIn(gids[2], by_gid)
+        self.assertIn(new_member["gid"], by_gid)
+        self.assertEqual(self.mirror.incremental_syncs, 1)
+        # The two changed tasks and the new one
+        self.assertEqual(server.request_counts[("GET", "/tasks/{gid}")], 3)
+        self.assertEqual(server.request_counts[("GET", "/sections/{gid}/tasks")], 1)
+        self.assertEqual(
+            sorted(self.mirror.members(self.project_gid)), sorted(self.member_gids())
+        )
+
+    def test_picks_up_vacations_without_events(self):
+        gids = self.member_gids()
+        with FakeAsanaServer(self.asana) as server:
+            self.sync(server)
+            # Vacations are set on the user, the project gets no event
+            self.asana.tasks[gids[0]]["assignee"]["vacation_dates"] = {
+                "start_date": "2020-02-02",
+                "end_date": None,
+            }
+            server.request_counts.clear()
+            tasks = self.sync(server)
+        self.assertEqual(
+            tasks[0]["assignee"]["vacation_dates"]["start_date"], "2020-02-02"
+        )
+        self.assertEqual(server.request_counts[("GET", "/tasks/{gid}")], 0)
+        self.assertEqual(
+            self.mirror.members(self.project_gid)[gids[0]]["assignee"][
+                "vacation_dates"
+            ]["start_date"],
+            "2020-02-02",
+        )
+
+    def test_full_resync_when_the_sync_token_expired(self):
+        gids = self.member_gids()
+        with FakeAsanaServer(self.asana) as server:
+            self.sync(server)
+            self.asana.update_task(gids[0], {"name": "Renamed"})
+            self.asana.expire_sync_tokens()
+            tasks = self.sync(server)
+        self.assertEqual(tasks[0]["name"], "Renamed")
+        self.assertEqual(self.mirror.full_syncs, 2)
+        self.assertEqual(self.mirror.incremental_syncs, 0)
+        self.assertEqual(
+            self.mirror.sync_token(self.project_gid)[1], self.asana.sync_token()
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+
+from asana_random_one_on_one.member_pool import MemberPool
+
+
+class TestMemberPool(unittest.TestCase):
+    def test_take_and_pop(self):
+        pool = MemberPool(5)
+        self.assertEqual(len(pool), 5)
+        pool.take(4)
+        pool.take(1)
+        self.assertNotIn(4, pool)
+        self.assertIn(3, pool)
+        self.assertEqual(pool.mask, 0b01101)
+        # Members are popped from the highest available index down
+        self.assertEqual([pool.pop(), pool.pop(), pool.pop()], [3, 2, 0])
+        self.assertEqual(len(pool), 0)
+        self.assertEqual(pool.mask, 0)
+        with self.assertRaises(Exception):
+            pool.pop()
+
+    def test_take_twice(self):
+        pool = MemberPool(3)
+        pool.take(1)
+        with self.assertRaises(Exception):
+            pool.take(1)
+        self.assertEqual(len(pool), 2)
+
+    def test_mask_follows_the_taken_members(self):
+        pool = MemberPool(20)
+        for index in [17, 0, 8, 9, 19]:
+            pool.take(index)
+            self.assertEqual(
+                pool.mask, sum(1 << i for i in range(20) if i in pool), index
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
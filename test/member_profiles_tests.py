@@ -0,0 +1,59 @@
+import unittest
+
+from asana_random_one_on_one.member_profiles import (
+    PREFERENCE_NONE,
+    PREFERENCE_OTHER_TEAMS,
+    NO_TEAM_CODE,
+    compile_member_profiles,
+)
+from test.helpers import get_custom_field, member_id
+
+
+class TestMemberProfiles(unittest.TestCase):
+    def test_compile_interns_teams_and_preferences(self):
+        members = [
+            {
+                "id": "A",
+                "Team": "T1",
+                "Match Preference": "Only match with other teams",
+            },
+            {"id": "B", "Team": "T1"},
+            {"id": "C", "Team": "None (default)"},
+        ]
+        a, b, c = compile_member_profiles(members, member_id, get_custom_field)
+
+        self.assertEqual([a.index, b.index, c.index], [0, 1, 2])
+        self.assertEqual(a.member_id, "A")
+        self.assertIs(a.member, members[0])
+        self.assertEqual(a.team, b.team)
+        self.assertNotEqual(a.team, NO_TEAM_CODE)
+        self.assertEqual(c.team, NO_TEAM_CODE)
+        self.assertEqual(a.preference, PREFERENCE_OTHER_TEAMS)
+        self.assertEqual(b.preference, PREFERENCE_NONE)
+
+    def test_compile_keeps_profiles_and_reindexes_them(self):
+        profiles = compile_member_profiles(
+            [{"id": "A"}, {"id": "B"}], member_id, get_custom_field
+        )
+        recompiled = compile_member_profiles(profiles[1:], member_id, get_custom_field)
+        self.assertIs(recompiled[0], profiles[1])
+        self.assertEqual(recompiled[0].index, 0)
+
+    def test_frequency(self):
+        members = [
+            {"id": "A"},
+            {"id": "B", "Frequency": "Every 2 weeks"},
+            {"id": "C", "Frequency": "Never"},
+            {"id": "D", "Frequency": "Unknown"},
+        ]
+        a, b, c, d = compile_member_profiles(members, member_id, get_custom_field)
+
+        self.assertTrue(a.participates(1))
+        self.assertTrue(b.participates(4))
+        self.assertFalse(b.participates(5))
+        self.assertFalse(c.participates(4))
+        self.assertFalse(d.participates(4))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+from datetime import date
+
+from asana_random_one_on_one.asana_random_one_on_one import get_custom_field_value
+from asana_random_one_on_one.member_profiles import compile_member_profiles
+from asana_random_one_on_one.member_table import NO_DAY, MemberTable, day_number
+from test.helpers import assignee_gid
+
+
+def create_member_task(gid, completed=False, vacation=(None, None), **fields):
+    return {
+        "name": "Member {}".format(gid),
+        "completed": completed,
+        "assignee": {
+            "gid": gid,
+            "name": gid,
+            "vacation_dates": {"start_date": vacation[0], "end_date": vacation[1]},
+        },
+        "custom_fields": [
+            {"name": name, "enum_value": {"name": value} if value else None}
+            for name, value in fields.items()
+        ],
+    }
+
+
+class TestMemberTable(unittest.TestCase):
+    def test_day_number(self):
+        self.assertEqual(day_number("2024-03-01"), date(2024, 3, 1).toordinal())
+        self.assertEqual(day_number(None), NO_DAY)
+
+    def test_available_members(self):
+        today = date(2024, 3, 4).toordinal()  # A Monday
+        friday = date(2024, 3, 8).toordinal()
+        tasks = [
+            create_member_task("A"),
+            create_member_task("B", completed=True),
+            {"name": "Unassigned", "assignee": None},
+            # Away for the whole week, and for good
+            create_member_task("C", vacation=("2024-03-01", "2024-03-11")),
+            create_member_task("D", vacation=("2024-03-01", None)),
+            # Back during the week, or away from next week on
+            create_member_task("E", vacation=("2024-03-01", "2024-03-06")),
+            create_member_task("F", vacation=("2024-03-11", None)),
+        ]
+        table = MemberTable(tasks[:3], today, friday)
+        table.extend(tasks[3:])
+
+        self.assertEqual(
+            [m["name"] for m in table], ["Member A", "Member E", "Member F"]
+        )
+        self.assertEqual(len(MemberTable(tasks)), 5)
+
+    def test_participating_members(self):
+        tasks = [
+            create_member_task("A"),
+            create_member_task("B", Frequency="Every 2 weeks"),
+            create_member_task("C", Frequency="Never"),
+            create_member_task("D", Frequency="Every 2 weeks"),
+        ]
+        odd_week = MemberTable(tasks, number_of_weeks=3)
+        self.assertEqual(
+            [p.member_id for p in odd_week.profiles(assignee_gid, participating=True)],
+            ["A"],
+        )
+        even_week = MemberTable(tasks, number_of_weeks=4)
+        self.assertEqual(
+            [
+                (p.member_id, p.index)
+                for p in even_week.profiles(assignee_gid, participating=True)
+            ],
+            [("A", 0), ("B", 1), ("D", 3)],
+        )
+        self.assertEqual(len(even_week.profiles(assignee_gid)), 4)
+
+    def test_profiles_are_the_compiled_profiles(self):
+        tasks = [
+            create_member_task("A", Team="Blue", Frequency="Every 2 weeks"),
+            create_member_task(
+                "B", Team="Red", **{"Match Preference": "Only match with same team"}
+            ),
+            create_member_task("C", Team=None, Frequency="Never"),
+            create_member_task(
+                "D", **{"Match Preference": "Only match with other teams"}
+            ),
+        ]
+        table = MemberTable(tasks).select([3, 2, 1, 0])
+        compiled = compile_member_profiles(
+            tasks[::-1], assignee_gid, get_custom_field_value
+        )
+
+        def fields(p):
+            return (p.member, p.index, p.member_id, p.team, p.preference, p.frequency)
+
+        self.assertEqual(
+            [fields(p) for p in table.profiles(assignee_gid)],
+            [fields(p) for p in compiled],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
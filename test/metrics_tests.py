@@ -0,0 +1,150 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from asana_random_one_on_one.client import Client
+from asana_random_one_on_one.fake_asana import FakeAsana, FakeAsanaServer
+from asana_random_one_on_one.metrics import (
+    FETCH,
+    RunMetrics,
+    endpoint,
+    in_current_context,
+)
+
+
+class TestRunMetrics(unittest.TestCase):
+    def test_endpoint(self):
+        self.assertEqual(endpoint("get", "/tasks/123"), "GET /tasks/{gid}")
+        self.assertEqual(
+            endpoint("post", "/tasks/123/subtasks?limit=5"),
+            "POST /tasks/{gid}/subtasks",
+        )
+        self.assertEqual(endpoint("post", "/batch"), "POST /batch")
+
+    def test_records_requests_per_endpoint_and_project(self):
+        metrics = RunMetrics()
+        metrics.record_request("get", "/tasks", 0.01, 100)
+        with metrics.project("P1"):
+            metrics.record_request("get", "/tasks/1", 0.2, 50)
+            metrics.record_request("get", "/tasks/2", 20, 0, error=True)
+            # Worker threads only know the project through the wrapped function
+            thread = threading.Thread(
+                target=in_current_context(metrics.record_request),
+                args=("post", "/tasks/1/subtasks", 0.01),
+            )
+            thread.start()
+            thread.join()
+            metrics.record_phase(FETCH, 1.5)
+        worker = threading.Thread(
+            target=metrics.in_project("P2", metrics.record_request),
+            args=("get", "/tasks/3", 0.01),
+        )
+        worker.start()
+        worker.join()
+
+        summary = metrics.to_dict()
+        self.assertEqual(summary["requests"], 5)
+        tasks = summary["endpoints"]["GET /tasks/{gid}"]
+        self.assertEqual((tasks["count"], tasks["errors"], tasks["bytes"]), (3, 1, 50))
+        self.assertEqual(tasks["latency_buckets"]["0.05"], 1)
+        self.assertEqual(tasks["latency_buckets"]["0.25"], 1)
+        self.assertEqual(tasks["latency_buckets"]["+Inf"], 1)
+        self.assertEqual(
+            sorted(summary["projects"]["P1"]["endpoints"]),
+            ["GET /tasks/{gid}", "POST /tasks/{gid}/subtasks"],
+        )
+        self.assertEqual(summary["projects"]["P1"]["phases"], {FETCH: 1.5})
+        self.assertEqual(
+            list(summary["projects"]["P2"]["endpoints"]), ["GET /tasks/{gid}"]
+        )
+        self.assertEqual(summary["phases"], {FETCH: 1.5})
+
+    def test_prometheus(self):
+        metrics = RunMetrics()
+        metrics.record_request("get", "/tasks/1", 0.2, 50)
+        metrics.record_request("get", "/tasks/1", 0.01, 50)
+        text = metrics.to_prometheus()
+        self.assertIn(
+            'random_one_on_one_requests_total{endpoint="GET /tasks/{gid}"} 2', text
+        )
+        self.assertIn(
+            'random_one_on_one_request_duration_seconds_bucket{endpoint="GET /tasks/{gid}",le="0.1"} 1',
+            text,
+        )
+        self.assertIn(
+            'random_one_on_one_request_duration_seconds_bucket{endpoint="GET /tasks/{gid}",le="+Inf"} 2',
+            text,
+        )
+
+    def test_records_reads_per_call_site(self):
+        metrics = RunMetrics()
+        with metrics.call_site("member_tasks"):
+            metrics.record_request("get", "/sections/1/tasks", 0.01, 100)
+            with metrics.call_site("sections"):
+                metrics.record_request("get", "/projects/1/sections", 0.01, 20)
+            # Writes made while reading don't count
+            metrics.record_request("post", "/tasks/1/stories", 0.01, 10)
+            metrics.record_request("get", "/sections/1/tasks", 0.01, 50)
+        metrics.record_request("get", "/tasks/1", 0.01, 50)
+
+        call_sites = metrics.to_dict()["call_sites"]
+        self.assertEqual(sorted(call_sites), ["member_tasks", "sections"])
+        self.assertEqual(
+            (call_sites["member_tasks"]["count"], call_sites["member_tasks"]["bytes"]),
+            (2, 150),
+        )
+        self.assertIn(
+            'random_one_on_one_call_site_response_bytes_total{call_site="sections"} 20',
+            metrics.to_prometheus(),
+        )
+
+    def test_write(self):
+        metrics = RunMetrics()
+        metrics.record_request("get", "/tasks/1", 0.2, 50)
+        with tempfile.TemporaryDirectory() as directory:
+            metrics.write(os.path.join(directory, "metrics.json"))
+            metrics.write(os.path.join(directory, "metrics.prom"))
+            with open(os.path.join(directory, "metrics.json")) as f:
+                self.assertEqual(json.load(f)["requests"], 1)
+            with open(os.path.join(directory, "metrics.prom")) as f:
+                self.assertTrue(f.read().startswith("# TYPE"))
+
+
+class TestClientMetrics(unittest.TestCase):
+    def test_records_responses(self):
+        asana = FakeAsana()
+        task = asana.create_task({"name": "Task"})
+        metrics = RunMetrics()
+        with FakeAsanaServer(asana) as server:
+            client = Client(metrics=metrics, base_url=server.base_url, max_retries=0)
+            with metrics.project("P"):
+                client.tasks.find_by_id(task["gid"])
+                with self.assertRaises(Exception):
+                    client.tasks.find_by_id("404")
+
+        stats = metrics.to_dict()["projects"]["P"]["endpoints"]["GET /tasks/{gid}"]
+        self.assertEqual(stats["count"], 2)
+        self.assertEqual(stats["errors"], 1)
+        self.assertGreater(stats["bytes"], 0)
+
+    def test_projected_reads_are_smaller(self):
+        asana = FakeAsana()
+        task = asana.create_task({"name": "Task", "notes": "Notes " * 100})
+        metrics = RunMetrics()
+        with FakeAsanaServer(asana) as server:
+            client = Client(metrics=metrics, base_url=server.base_url, max_retries=0)
+            with metrics.call_site("full"):
+                client.tasks.find_by_id(task["gid"])
+            with metrics.call_site("projected"):
+                client.tasks.find_by_id(task["gid"], opt_fields=["name"])
+
+        call_sites = metrics.to_dict()["call_sites"]
+        self.assertLess(
+            call_sites["projected"]["bytes"] * 10, call_sites["full"]["bytes"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
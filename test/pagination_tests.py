@@ -0,0 +1,60 @@
+import itertools
+import unittest
+
+from asana_random_one_on_one.client import Client
+from asana_random_one_on_one.fake_asana import FakeAsana, FakeAsanaServer
+from asana_random_one_on_one.metrics import RunMetrics
+from asana_random_one_on_one.pagination import stream_collection
+
+
+class TestStreamCollection(unittest.TestCase):
+    def setUp(self):
+        self.asana = FakeAsana()
+        project_gid = self.asana.create_project()
+        self.section_gid = self.asana.create_section(project_gid, "Members")["gid"]
+        for i in range(25):
+            task = self.asana.create_task({"name": "Member {}".format(i)})
+            self.asana.add_project(
+                task["gid"], {"project": project_gid, "section": self.section_gid}
+            )
+        self.path = "/sections/{}/tasks".format(self.section_gid)
+
+    def test_streams_every_page(self):
+        metrics = RunMetrics()
+        with FakeAsanaServer(self.asana) as server:
+            client = Client(metrics=metrics, base_url=server.base_url, max_retries=0)
+            with metrics.project("P"):
+                tasks = list(
+                    stream_collection(
+                        client, self.path, {}, page_size=10, opt_fields=["name"]
+                    )
+                )
+        self.assertEqual(
+            [t["name"] for t in tasks], ["Member {}".format(i) for i in range(25)]
+        )
+        self.assertEqual(tasks[0], {"gid": tasks[0]["gid"], "name": "Member 0"})
+        self.assertEqual(server.request_counts[("GET", "/sections/{gid}/tasks")], 3)
+        # Prefetched pages are attributed to the project of the caller
+        self.assertEqual(
+            metrics.to_dict()["projects"]["P"]["endpoints"][
+                "GET /sections/{gid}/tasks"
+            ]["count"],
+            3,
+        )
+
+    def test_fetches_one_page_ahead(self):
+        with FakeAsanaServer(self.asana) as server:
+            client = Client(base_url=server.base_url, max_retries=0)
+            tasks = stream_collection(client, self.path, {}, page_size=5)
+            first = list(itertools.islice(tasks, 3))
+            tasks.close()
+        self.assertEqual(len(first), 3)
+        self.assertEqual(server.request_counts[("GET", "/sections/{gid}/tasks")], 2)
+
+    def test_page_size_is_limited(self):
+        with self.assertRaises(Exception):
+            next(stream_collection(Client(), self.path, {}, page_size=101))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+from datetime import date, timedelta
+
+from asana_random_one_on_one.pair_history import PairHistory, week_index, week_key
+
+
+class TestPairHistory(unittest.TestCase):
+    def test_week_key_follows_iso_weeks(self):
+        monday = date(2026, 10, 12)
+        self.assertEqual(week_key(monday), week_key(monday + timedelta(days=6)))
+        self.assertEqual(week_key(monday) + 1, week_key(monday + timedelta(days=7)))
+        # The Frequency weeks run Tuesday to Monday
+        self.assertEqual(week_index(monday) + 1, week_index(monday + timedelta(days=1)))
+
+        day = date(2019, 1, 1)
+        previous = day.isocalendar()[:2]
+        while day < date(2027, 1, 1):
+            day += timedelta(days=1)
+            iso_week = day.isocalendar()[:2]
+            self.assertEqual(
+                week_key(day) - week_key(day - timedelta(days=1)),
+                int(iso_week != previous),
+                day,
+            )
+            previous = iso_week
+
+    def test_last_met_is_symmetric(self):
+        history = PairHistory()
+        history.record(3, [("A", "B")])
+        history.record(1, [("B", "A")])
+
+        self.assertEqual(history.last_met("A", "B"), 3)
+        self.assertEqual(history.last_met("B", "A"), 3)
+        self.assertIsNone(history.last_met("A", "C"))
+
+    def test_copied_forward_matches_keep_the_week_they_were_made(self):
+        weekly_match_data = [
+            (12, {"A": "C", "C": "A", "B": "D", "D": "B", "unmatched": ""}),
+            (10, {"A": "B", "B": "A", "C": "D", "D": "C", "unmatched": "E"}),
+            (11, {"A": "B", "B": "A", "C": "E", "E": "C", "D": "C"}),
+        ]
+        history = PairHistory.from_weekly_match_data(weekly_match_data)
+
+        self.assertEqual(history.last_met("A", "B"), 10)
+        self.assertEqual(history.last_met("C", "D"), 10)
+        self.assertEqual(history.last_met("C", "E"), 11)
+        self.assertEqual(history.last_met("A", "C"), 12)
+        self.assertEqual(history.last_met("B", "D"), 12)
+        self.assertIsNone(history.last_met("A", "unmatched"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+
+from asana_random_one_on_one.plan import DONE, PLANNED, Plan, ProjectPlan
+
+
+def create_project_plan(project_gid="P"):
+    return ProjectPlan(
+        project_gid,
+        "[1] weeks Random 1:1",
+        {"section": "S"},
+        {"A": "B", "B": "A"},
+        {"A": "B", "B": "A", "C": "D", "D": "C"},
+        [
+            [{"gid": "A", "name": "a"}, {"gid": "B", "name": "b"}],
+            [{"gid": "C", "name": "c"}, {"gid": "D", "name": "d"}],
+        ],
+        {"gid": "E", "name": "e"},
+        [["A", "B"], ["C", "D"]],
+        "E",
+        task_gid="T",
+    )
+
+
+class TestPlan(unittest.TestCase):
+    def test_members_tasks_pair_up_like_the_plan(self):
+        project_plan = create_project_plan()
+        tasks = project_plan.members_tasks()
+        # create_one_on_one_tasks pairs up members from the end
+        self.assertEqual(
+            [tasks.pop()["assignee"]["gid"] for _ in range(4)], ["A", "B", "C", "D"]
+        )
+        self.assertEqual(project_plan.unmatched_member_task()["assignee"]["gid"], "E")
+
+    def test_save_and_load(self):
+        plan = Plan(1, 100, errors={"T2": "Missing sections"})
+        plan.add(create_project_plan("P1"))
+        done = create_project_plan("P2")
+        done.weekly_task_gid = "W"
+        done.status = DONE
+        plan.add(done)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "plan.json")
+            plan.save(path)
+            loaded = Plan.load(path)
+
+        self.assertEqual(loaded.to_dict(), plan.to_dict())
+        self.assertEqual([p.project_gid for p in loaded.pending()], ["P1"])
+        self.assertEqual(loaded.projects["P1"].status, PLANNED)
+        self.assertEqual(loaded.projects["P2"].weekly_task_gid, "W")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+import unittest
+from collections import Counter
+from datetime import date, datetime
+
+from asana_random_one_on_one.client import Client
+from asana_random_one_on_one.fake_asana import FakeAsanaServer
+from asana_random_one_on_one.pair_history import week_key
+from asana_random_one_on_one.plan import DONE
+from asana_random_one_on_one.write_journal import (
+    COMPLETED,
+    FAILED,
+    WriteJournal,
+    subtask_key,
+)
+from test.helpers import FakeAsanaTestCase, today
+
+
+class TestWriteJournal(FakeAsanaTestCase):
+    workspace = dict(
+        projects=1, members=(10, 10), bot_gid="bot", task_name="1:1", seed=1
+    )
+
+    def setUp(self):
+        super(TestWriteJournal, self).setUp()
+        self.journal_path = self.path("journal.db")
+
+    def main_options(self):
+        return {"journal_path": self.journal_path}
+
+    def _fail_subtasks_after(self, count):
+        """Makes the fake Asana fail to create subtasks once count of them got created"""
+        create_task = self.asana.create_task
+        created = Counter()
+
+        def failing_create_task(data, parent=None):
+            if parent is not None:
+                created["subtasks"] += 1
+                if created["subtasks"] > count:
+                    raise KeyError("unavailable")
+            return create_task(data, parent)
+
+        self.asana.create_task = failing_create_task
+        return lambda: setattr(self.asana, "create_task", create_task)
+
+    def _one_on_one_writes(self):
+        weekly_tasks = self._weekly_tasks()
+        self.assertEqual(len(weekly_tasks), 1)
+        writes = []
+        parents = [weekly_tasks[0]["gid"]]
+        while parents:
+            for subtask in self.asana.subtasks(parents.pop()):
+                writes.append(
+                    (
+                        subtask["parent"]["gid"],
+                        subtask["name"],
+                        (subtask["assignee"] or {}).get("gid"),
+                    )
+                )
+                parents.append(subtask["gid"])
+        return writes
+
+    def _resumes_after_failed_writes(self, **options):
+        with FakeAsanaServer(self.asana) as server:
+            restore = self._fail_subtasks_after(4)
+            with self.assertRaises(Exception):
+                self._main(server, **options)
+            restore()
+            partial = self._one_on_one_writes()
+
+            self._main(server, **options)
+            writes = self._one_on_one_writes()
+
+        journal = WriteJournal(self.journal_path, week_key(datetime.now().date()))
+        project_plan = journal.project_plan(self.project_gid)
+        journal.close()
+        self.assertEqual(project_plan.status, DONE)
+        self.assertTrue(set(partial) < set(writes))
+        # No duplicates, each one on one task has a subtask for each of its members
+        self.assertEqual(len(writes), len(set(writes)))
+        self.assertEqual(
+            len([w for w in writes if w[1].startswith("Random 1:1")]),
+            len(project_plan.pairs),
+        )
+        self.assertEqual(
+            len(writes),
+            len(project_plan.pairs) * 3 + (1 if project_plan.unmatched else 0),
+        )
+
+        # Everything got created, a third run doesn't write anything
+        with FakeAsanaServer(self.asana) as server:
+            self._main(server, **options)
+            self.assertEqual(
+                {method for method, route in server.request_counts}, {"GET"}
+            )
+
+    def test_resumes_after_failed_writes(self):
+        self._resumes_after_failed_writes()
+
+    def test_resumes_after_failed_batch_writes(self):
+        self._resumes_after_failed_writes(use_batch_api=True)
+
+    def test_resumes_on_the_next_day_of_the_same_iso_week(self):
+        with FakeAsanaServer(self.asana) as server:
+            restore = self._fail_subtasks_after(4)
+            with today(date(2026, 10, 12)), self.assertRaises(Exception):
+                self._main(server)
+            restore()
+            partial = self._one_on_one_writes()
+
+            with today(date(2026, 10, 13)):
+                self._main(server)
+            writes = self._one_on_one_writes()
+
+        journal = WriteJournal(self.journal_path, week_key(date(2026, 10, 13)))
+        project_plan = journal.project_plan(self.project_gid)
+        journal.close()
+        self.assertEqual(project_plan.status, DONE)
+        self.assertTrue(set(partial) < set(writes))
+        self.assertEqual(
+            len(writes),
+            len(project_plan.pairs) * 3 + (1 if project_plan.unmatched else 0),
+        )
+
+    def test_write_records_the_outcome(self):
+        with FakeAsanaServer(self.asana) as server:
+            client = Client(base_url=server.base_url, max_retries=0)
+            parent = self.asana.create_task({"name": "Weekly"})["gid"]
+            data = {"name": "Random 1:1 for A : B", "assignee": "u1"}
+            journal = WriteJournal(self.journal_path, 10)
+            key = subtask_key(parent, data)
+
+            def add_subtask():
+                return client.tasks.add_subtask(parent, data)
+
+            def broken():
+                raise Exception("Server error")
+
+            with self.assertRaises(Exception):
+                journal.write(client, key, broken, parent, data)
+            self.assertEqual(journal.entry(key), (FAILED, None))
+
+            gid = journal.write(client, key, add_subtask, parent, data)["gid"]
+            self.assertEqual(journal.entry(key), (COMPLETED, gid))
+            self.assertEqual(
+                journal.write(client, key, broken, parent, data), {"gid": gid}
+            )
+
+            # A run died after sending the write, the next run finds the existing subtask instead
+            # of creating it again
+            journal.intend(key)
+            journal.close()
+            journal = WriteJournal(self.journal_path, 10)
+            self.assertEqual(
+                journal.write(client, key, broken, parent, data), {"gid": gid}
+            )
+            self.assertEqual(len(self.asana.subtasks(parent)), 1)
+
+            journal.week = 10 + 4
+            journal.prune()
+            self.assertIsNone(journal.entry(key))
+            journal.close()
+
+
+if __name__ == "__main__":
+    unittest.main()